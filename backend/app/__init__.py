@@ -3,13 +3,14 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from dotenv import load_dotenv
+from .database import RoutingSession
 import os
 import logging
 import google.generativeai as genai
 # from google.generativeai.types import HarmCategory, HarmBlockThreshold # Optional, only if using specific safety settings types
 
 # Initialize extensions without binding them to an app yet
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession}) # Sends read_only() work to the replica bind, if any
 cors = CORS()
 
 def create_app():
@@ -29,6 +30,73 @@ def create_app():
     app.config['EXCHANGE_RATE_API_KEY'] = os.getenv('EXCHANGE_RATE_API_KEY', 'your-exchange-rate-api-key')
     app.config['EXCHANGE_RATE_API_URL'] = "https://v6.exchangerate-api.com/v6/"
     app.config['GEMINI_API_KEY'] = os.getenv('GEMINI_API_KEY', 'your-gemini-api-key')
+    # Exchange rate cache: how long a fetched rate is reused (seconds, 0 = never expire) and how many pairs are kept
+    app.config['EXCHANGE_RATE_CACHE_TTL'] = int(os.getenv('EXCHANGE_RATE_CACHE_TTL', 3600))
+    app.config['EXCHANGE_RATE_CACHE_MAXSIZE'] = int(os.getenv('EXCHANGE_RATE_CACHE_MAXSIZE', 512))
+    # 'table' fetches /latest/<base> once and derives every pair locally; 'pair' calls /pair/<from>/<to> per pair
+    app.config['EXCHANGE_RATE_MODE'] = os.getenv('EXCHANGE_RATE_MODE', 'table').lower()
+    app.config['EXCHANGE_RATE_BASE_CURRENCY'] = os.getenv('EXCHANGE_RATE_BASE_CURRENCY', 'USD').upper()
+    # Answer range totals from the daily/monthly rollup table (the default summary source); false sums the
+    # ledger with SUM ... GROUP BY instead, e.g. to check rollups that are suspected to have drifted
+    app.config['ROLLUPS_ENABLED'] = os.getenv('ROLLUPS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Summary cache (keyed by per-user ledger version): max entries and a TTL so converted totals follow rate changes
+    app.config['SUMMARY_CACHE_MAXSIZE'] = int(os.getenv('SUMMARY_CACHE_MAXSIZE', 1024))
+    app.config['SUMMARY_CACHE_TTL'] = int(os.getenv('SUMMARY_CACHE_TTL', 300))
+    # NumPy analytics engine (transaction breakdowns): at most this many users' columnar ledgers stay resident per process
+    app.config['ANALYTICS_FRAME_CACHE_SIZE'] = int(os.getenv('ANALYTICS_FRAME_CACHE_SIZE', 8))
+    # Opt-in: answer range totals from a per-user in-memory prefix-sum index (built from the rollups) ahead of the
+    # rollup table, for processes that serve many totals per user; and how many users' indexes stay resident
+    app.config['RANGE_INDEX_ENABLED'] = os.getenv('RANGE_INDEX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    app.config['RANGE_INDEX_MAX_USERS'] = int(os.getenv('RANGE_INDEX_MAX_USERS', 256))
+    # Rows inserted (and committed) per chunk by the bulk transaction import endpoint
+    app.config['IMPORT_CHUNK_SIZE'] = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+    # Chat history write-behind: bounded queue size, entries per group commit and max wait before a commit (ms)
+    app.config['CHAT_HISTORY_WRITE_BEHIND'] = os.getenv('CHAT_HISTORY_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+    app.config['CHAT_HISTORY_QUEUE_SIZE'] = int(os.getenv('CHAT_HISTORY_QUEUE_SIZE', 1000))
+    app.config['CHAT_HISTORY_BATCH_SIZE'] = int(os.getenv('CHAT_HISTORY_BATCH_SIZE', 50))
+    app.config['CHAT_HISTORY_FLUSH_MS'] = int(os.getenv('CHAT_HISTORY_FLUSH_MS', 200))
+    # Chat history retention: entries older than this many days are moved to the compressed archive table,
+    # this many per transaction; incremental VACUUM then releases up to this many free pages (0 = all)
+    app.config['CHAT_HISTORY_RETENTION_DAYS'] = int(os.getenv('CHAT_HISTORY_RETENTION_DAYS', 90))
+    app.config['CHAT_ARCHIVE_BATCH_SIZE'] = int(os.getenv('CHAT_ARCHIVE_BATCH_SIZE', 5000))
+    app.config['SQLITE_INCREMENTAL_VACUUM_PAGES'] = int(os.getenv('SQLITE_INCREMENTAL_VACUUM_PAGES', 0))
+    # Per-user Gemini chat sessions kept in memory: max sessions (LRU), idle expiry (s, 0 = never),
+    # user turns kept per session, and how long a second concurrent message from the same user waits (s)
+    app.config['CHAT_SESSION_MAX'] = int(os.getenv('CHAT_SESSION_MAX', 1000))
+    app.config['CHAT_SESSION_IDLE_TTL'] = int(os.getenv('CHAT_SESSION_IDLE_TTL', 1800))
+    app.config['CHAT_SESSION_MAX_TURNS'] = int(os.getenv('CHAT_SESSION_MAX_TURNS', 20))
+    app.config['CHAT_SESSION_LOCK_TIMEOUT'] = int(os.getenv('CHAT_SESSION_LOCK_TIMEOUT', 60))
+    # Estimated prompt tokens of history loaded when a session is rebuilt from chat history (e.g. on another worker)
+    app.config['CHAT_SESSION_TOKEN_BUDGET'] = int(os.getenv('CHAT_SESSION_TOKEN_BUDGET', 8000))
+    # Threads for running independent (read-only) tool calls of one model turn concurrently; 1 runs them in turn
+    app.config['AI_TOOL_WORKERS'] = int(os.getenv('AI_TOOL_WORKERS', 4))
+    # Agent loop limits per chat message: tool call rounds, and a wall-clock budget (s, 0 = none) shared by the model
+    # requests, the tools and their HTTP calls; when either runs out the assistant returns a partial answer
+    app.config['AI_MAX_TOOL_ROUNDS'] = int(os.getenv('AI_MAX_TOOL_ROUNDS', 5))
+    app.config['AI_TURN_BUDGET_SECONDS'] = float(os.getenv('AI_TURN_BUDGET_SECONDS', 30))
+    # IANA timezone (e.g. 'Africa/Addis_Ababa') for the date/time context given to the assistant; empty = server local time
+    app.config['APP_TIMEZONE'] = os.getenv('APP_TIMEZONE', '')
+    # SQLite profile, applied to every new connection: WAL lets readers proceed during writes, synchronous=NORMAL
+    # only fsyncs at checkpoints, plus mmap/page cache sizes, a lock wait (ms) and in-memory temp tables
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', -64000)) # Negative = KiB (about 64 MB)
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_TEMP_STORE'] = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+    # Connection pool per process (each gunicorn worker gets its own): size, overflow, wait (s) and recycle age (s)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    # Optional read replica: SELECTs inside read_only() go here; writes and everything else use the primary.
+    # Reads stay on the primary for a few seconds after a write so users see their own changes despite replica lag.
+    app.config['DATABASE_REPLICA_URL'] = os.getenv('DATABASE_REPLICA_URL')
+    app.config['DATABASE_REPLICA_STICKY_SECONDS'] = float(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 5))
+    app.config['DATABASE_REPLICA_RETRY_SECONDS'] = float(os.getenv('DATABASE_REPLICA_RETRY_SECONDS', 30))
+    from .database import build_engine_options, build_binds, init_engines
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = build_binds(app.config)
 
 
     # Initialize extensions with the app instance
@@ -66,10 +134,35 @@ def create_app():
     # Import models so that SQLAlchemy knows about them when creating tables
     from . import models
 
+    # Apply the SQLite PRAGMA profile to every new connection (and log what was applied)
+    init_engines(app)
+
+    # Apply cache limits to process-wide service caches
+    from .services.exchange_service import init_rate_cache
+    from .services.summary_cache_service import init_summary_cache
+    from .services.analytics_service import init_analytics
+    from .services.range_index_service import init_range_index
+    from .services.chat_history_service import init_chat_history_writer
+    from .services.chat_session_service import init_chat_sessions
+    from .services.tool_executor_service import init_tool_executor
+    from .services.ai_service import init_ai
+    init_rate_cache(app)
+    init_summary_cache(app)
+    init_analytics(app)
+    init_range_index(app)
+    init_chat_history_writer(app)
+    init_chat_sessions(app)
+    init_tool_executor(app)
+    init_ai(app) # Builds the Gemini models and tool protos once per process
+
     # Import and register blueprints for routes
     from .routes import register_routes
     register_routes(app)
 
+    # Register maintenance CLI commands (e.g. `flask --app run rebuild-rollups`)
+    from .commands import register_commands
+    register_commands(app)
+
     # Note: db.create_all() is called in run.py within the app_context
     # If you prefer calling it here, uncomment the following block:
     # with app.app_context():
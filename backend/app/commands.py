@@ -0,0 +1,59 @@
+# app/commands.py
+# Maintenance commands registered on the Flask CLI, e.g. `flask --app run rebuild-rollups`
+import click
+from . import db
+from .database import REPLICA_BIND
+from .services.rollup_service import rebuild_rollups
+from .services.chat_archive_service import archive_chat_history
+from .migrations import MIGRATIONS, get_applied_versions, run_migrations
+
+
+def register_commands(app):
+    """Registers maintenance CLI commands with the Flask application."""
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild rollups for this user.')
+    def rebuild_rollups_command(user_id):
+        """Recomputes the daily/monthly transaction rollup table from the ledger."""
+        count = rebuild_rollups(user_id)
+        click.echo(f"Rebuilt {count} rollup rows.")
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Applies pending schema migrations to the configured database."""
+        applied = run_migrations()
+        click.echo(f"Applied migrations: {applied}" if applied else "Database schema is up to date.")
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """Lists schema migrations and whether each has been applied."""
+        applied = get_applied_versions()
+        for version, description, _ in MIGRATIONS:
+            click.echo(f"[{'x' if version in applied else ' '}] {version}: {description}")
+
+    @app.cli.command('archive-chat-history')
+    @click.option('--older-than-days', type=int, default=None, help='Retention age (defaults to CHAT_HISTORY_RETENTION_DAYS).')
+    def archive_chat_history_command(older_than_days):
+        """Moves old chat history into the compressed archive and releases freed space (run from cron)."""
+        report = archive_chat_history(older_than_days)
+        click.echo(f"Archived {report['archived']} entries older than {report['cutoff']} into {report['archive_days']} day(s); "
+                   f"compression {report['compression_ratio']}x, {report['freed_pages']} page(s) released.")
+
+    @app.cli.command('sync-replica')
+    def sync_replica_command():
+        """Copies the primary SQLite database into the replica bind (for trying read routing locally)."""
+        engines = db.engines
+        replica = engines.get(REPLICA_BIND)
+        if replica is None:
+            raise click.ClickException("No replica configured. Set DATABASE_REPLICA_URL.")
+        if db.engine.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+            raise click.ClickException("sync-replica only copies SQLite files; use your database's own replication.")
+
+        source = db.engine.raw_connection()
+        target = replica.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection) # Online, consistent copy
+        finally:
+            target.close()
+            source.close()
+        click.echo(f"Copied {db.engine.url.database} to {replica.url.database}.")
@@ -0,0 +1,337 @@
+# app/database.py
+# Engine tuning applied from create_app: connection pool options and, for SQLite, per-connection PRAGMAs.
+# PRAGMAs like synchronous and cache_size only last for one connection, so they are set from a "connect" event hook
+# on every new pooled connection rather than once at startup.
+# Also routes read-only work to an optional replica bind (see RoutingSession and read_only()), keeping each client
+# on the primary for a short read-your-writes window after its own writes.
+# db is not imported here: this module is imported by app/__init__.py before db exists.
+import os
+import time
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event, Select
+from sqlalchemy.engine import make_url
+from flask import request
+from flask_sqlalchemy.session import Session
+
+# Bind key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+# Cookie carrying the time of a client's last write to its next requests (on any worker)
+LAST_WRITE_COOKIE = 'db_last_write'
+
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+SQLITE_TEMP_STORES = ('DEFAULT', 'FILE', 'MEMORY')
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def build_engine_options(config, uri: str = None) -> dict:
+    """
+    Returns engine options (pool settings) for a database URI (the primary SQLALCHEMY_DATABASE_URI by default).
+    Pools are per process; engines passed to init_engines() are reset in forked children.
+    """
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    if _is_sqlite_memory(url):
+        return {} # In-memory SQLite uses a single shared connection; pool sizing does not apply
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+    if url.get_backend_name() != 'sqlite':
+        # Server databases drop idle connections; recycle them and check before use
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+        options['pool_pre_ping'] = True
+    return options
+
+
+def get_sqlite_pragmas(config) -> dict:
+    """Validates the configured SQLite profile and returns it as {pragma: value}."""
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    temp_store = config['SQLITE_TEMP_STORE'].upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Invalid SQLITE_JOURNAL_MODE '{journal_mode}'. Must be one of {', '.join(SQLITE_JOURNAL_MODES)}.")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS '{synchronous}'. Must be one of {', '.join(SQLITE_SYNCHRONOUS_MODES)}.")
+    if temp_store not in SQLITE_TEMP_STORES:
+        raise ValueError(f"Invalid SQLITE_TEMP_STORE '{temp_store}'. Must be one of {', '.join(SQLITE_TEMP_STORES)}.")
+
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'busy_timeout': int(config['SQLITE_BUSY_TIMEOUT_MS']),
+        'cache_size': int(config['SQLITE_CACHE_SIZE']), # Negative values are KiB, positive values are pages
+        'mmap_size': int(config['SQLITE_MMAP_SIZE']),
+        'temp_store': temp_store,
+    }
+
+
+def _install_sqlite_pragmas(engine, pragmas: dict, name: str) -> None:
+    """
+    Registers a connect hook that applies the PRAGMAs to every new DB-API connection of the engine.
+    The first connection also reads the profile back and logs it, so the log shows what SQLite actually accepted.
+    """
+    # busy_timeout goes first so that switching journal_mode waits on a locked database instead of failing
+    ordered = sorted(pragmas.items(), key=lambda item: item[0] != 'busy_timeout')
+    logged = threading.Event()
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for key, value in ordered:
+                cursor.execute(f"PRAGMA {key}={value}")
+            if not logged.is_set():
+                logged.set()
+                applied = {}
+                for key in pragmas:
+                    cursor.execute(f"PRAGMA {key}")
+                    applied[key] = cursor.fetchone()[0]
+                logging.info(f"SQLite profile for engine '{name}' ({engine.url.database}): "
+                             + ", ".join(f"{key}={value}" for key, value in applied.items()))
+        finally:
+            cursor.close()
+
+
+def build_binds(config) -> dict:
+    """Returns SQLALCHEMY_BINDS with the read replica (DATABASE_REPLICA_URL) and its pool options, if configured."""
+    replica_uri = config.get('DATABASE_REPLICA_URL')
+    if not replica_uri:
+        return {}
+    return {REPLICA_BIND: {'url': replica_uri, **build_engine_options(config, replica_uri)}}
+
+
+class _RoutingState:
+    """Process-wide replica health, read-your-writes window length and per-bind query counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sticky_seconds = 5.0 # A client's reads stay on the primary this long after it committed writes
+        self.retry_seconds = 30.0 # A failing replica is skipped this long before it is tried again
+        self.replica_down_until = 0.0
+        self.queries = {} # bind name -> statements executed
+        self.replica_reads = 0 # Statements routed to the replica
+        self.primary_fallbacks = 0 # Read-only statements sent to the primary (replica missing, down, or sticky)
+        self.replica_errors = 0
+
+    def replica_usable(self) -> bool:
+        return time.monotonic() >= self.replica_down_until and time.time() - _last_write_at.get() >= self.sticky_seconds
+
+    def count(self, counter: str, name: str = None) -> None:
+        with self.lock:
+            if name is None:
+                setattr(self, counter, getattr(self, counter) + 1)
+            else:
+                self.queries[name] = self.queries.get(name, 0) + 1
+
+
+_routing = _RoutingState()
+_read_only = ContextVar('db_read_only', default=False)
+# Wall-clock time of the current client's last write; loaded from its cookie at the start of each request
+# (outside a request it is the current thread's own last write)
+_last_write_at = ContextVar('db_last_write_at', default=float('-inf'))
+
+# Engines set up by init_engines(), held weakly so engines of discarded apps can still be garbage collected
+_engines = weakref.WeakSet()
+
+
+def _reset_inherited_pools() -> None:
+    # Pooled connections must not be shared with forked (e.g. gunicorn --preload) workers
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    # Registered once per process: hooks can never be removed, so a per-app registration would pile up
+    os.register_at_fork(after_in_child=_reset_inherited_pools)
+
+
+@contextmanager
+def read_only():
+    """
+    Marks the enclosed database work as read-only so SELECTs may be served by the replica bind.
+    Usable as `with read_only():` or as a decorator (`@read_only()`). Writes inside it still go to the primary.
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def note_write() -> None:
+    """
+    Starts the read-your-writes window for the current client, or for the current thread outside a request.
+    Called on every commit that wrote; code that queues a write for another thread calls it too.
+    """
+    _last_write_at.set(time.time())
+
+
+def _load_client_write() -> None:
+    # A request only sees its own client's writes, never those of an earlier request served by this thread
+    _last_write_at.set(_client_write_cookie())
+
+
+def _save_client_write(response):
+    written_at = _last_write_at.get()
+    if written_at > _client_write_cookie():
+        response.set_cookie(LAST_WRITE_COOKIE, repr(written_at), max_age=max(1, int(_routing.sticky_seconds) + 1),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def _client_write_cookie() -> float:
+    try:
+        written_at = float(request.cookies.get(LAST_WRITE_COOKIE, '-inf'))
+    except ValueError:
+        return float('-inf')
+    return written_at if written_at <= time.time() else float('-inf') # A future time would pin the client forever
+
+
+class RoutingSession(Session):
+    """
+    db.session class that sends SELECTs issued inside read_only() to the replica bind and everything else to
+    the primary. Falls back to the primary when no replica is configured, the replica recently failed,
+    this session has pending or flushed writes, or the current client wrote within the sticky window.
+
+    The window is per client: a commit that wrote stamps the request, and a cookie carries the stamp to the
+    client's next requests on any worker (worker clocks are assumed to agree). It does not cover the same
+    user on another browser or device, nor writes made after the response started (streamed replies); writes
+    outside a request, like the chat history writer's batches, only pin the thread that made them.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _read_only.get() and self._is_plain_read(clause):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None and _routing.replica_usable():
+                _routing.count('replica_reads')
+                return replica
+            _routing.count('primary_fallbacks')
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _is_plain_read(self, clause) -> bool:
+        if self._flushing or self.info.get('wrote') or self.new or self.dirty or self.deleted:
+            return False # Read-your-writes: this session's own changes only exist on the primary
+        return clause is None or isinstance(clause, Select)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement_wrote(orm_execute_state):
+    # Statements run with session.execute() (e.g. a bulk insert()) never flush, so after_flush misses them
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_primary_write(session):
+    if session.info.pop('wrote', False):
+        note_write()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _clear_session_wrote(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('wrote', None)
+
+
+def get_db_routing_stats() -> dict:
+    """Returns per-bind statement counts and read routing counters."""
+    with _routing.lock:
+        return {
+            'queries': dict(_routing.queries),
+            'replica_reads': _routing.replica_reads,
+            'primary_fallbacks': _routing.primary_fallbacks,
+            'replica_errors': _routing.replica_errors,
+            'replica_available': time.monotonic() >= _routing.replica_down_until
+        }
+
+
+def _install_query_counter(engine, name: str) -> None:
+    """Counts statements executed on an engine; a connection failure on the replica takes it out of rotation."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        _routing.count('queries', name)
+
+    if name == REPLICA_BIND:
+        @event.listens_for(engine, 'handle_error')
+        def _replica_failed(context):
+            # The failing statement still raises; later reads go to the primary until the retry delay passes
+            _routing.count('replica_errors')
+            _routing.replica_down_until = time.monotonic() + _routing.retry_seconds
+            logging.warning(f"Read replica failed ({context.original_exception}); routing reads to the primary for {_routing.retry_seconds}s")
+
+
+def _is_write(statement: str, context) -> bool:
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        return True
+    # text() and exec_driver_sql() statements are not compiled constructs, so check the SQL itself
+    return statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE')
+
+
+def _install_write_tracker(engine) -> None:
+    """
+    Starts the read-your-writes window when a transaction that ran INSERT/UPDATE/DELETE commits on the engine.
+    Catches writes that bypass db.session, like the chat history writer's engine.begin() batches.
+    """
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _mark_connection_wrote(conn, cursor, statement, parameters, context, executemany):
+        if _is_write(statement, context):
+            conn.info['wrote'] = True
+
+    @event.listens_for(engine, 'commit')
+    def _record_connection_write(conn):
+        # conn.info belongs to the pooled DB-API connection, so the flag is cleared on every commit and rollback
+        if conn.info.pop('wrote', False):
+            note_write()
+
+    @event.listens_for(engine, 'rollback')
+    def _clear_connection_wrote(conn):
+        conn.info.pop('wrote', None)
+
+
+def init_engines(app) -> None:
+    """
+    Applies the SQLite profile to every SQLite engine of the app, installs per-bind query counters and
+    write tracking (for the replica's read-your-writes window) and registers the engines for the fork reset.
+    With a replica configured, also loads and saves each client's last write time around every request.
+    Opens no connections: the applied SQLite profile is logged when the first connection is made.
+    """
+    pragmas = get_sqlite_pragmas(app.config)
+    _routing.sticky_seconds = app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 0)
+    _routing.retry_seconds = app.config.get('DATABASE_REPLICA_RETRY_SECONDS', 30)
+    db = app.extensions['sqlalchemy']
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            name = bind_key or 'default'
+            _engines.add(engine)
+            _install_query_counter(engine, name)
+            if bind_key != REPLICA_BIND:
+                _install_write_tracker(engine)
+            if engine.dialect.name != 'sqlite':
+                logging.info(f"Database engine '{name}' ({engine.dialect.name}): pool={engine.pool.status()}")
+                continue
+            if _is_sqlite_memory(engine.url):
+                # WAL and mmap do not apply to in-memory databases
+                _install_sqlite_pragmas(engine, {k: v for k, v in pragmas.items() if k not in ('journal_mode', 'mmap_size')}, name)
+            else:
+                _install_sqlite_pragmas(engine, pragmas, name)
+            logging.info(f"Database engine '{name}' (sqlite): pool={engine.pool.status()}")
+
+        if REPLICA_BIND in db.engines:
+            app.before_request(_load_client_write)
+            app.after_request(_save_client_write)
@@ -0,0 +1,92 @@
+# app/migrations.py
+# Lightweight, versioned schema migrations for existing databases.
+# db.create_all() only creates missing tables; it never adds indexes or columns to tables that already exist.
+# Each migration runs once, in order, inside its own transaction, and is recorded in the schema_migration table.
+# Migrations must be idempotent so they are also safe on fresh databases that create_all() already built.
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+from . import db
+from .models import Transaction, ChatHistory, SchemaMigration, TransactionRollup, LedgerVersion
+from .services.rollup_service import rebuild_rollup_rows
+from .services.summary_cache_service import bump_ledger_version
+
+
+def _create_indexes(conn, table, names):
+    """Creates the named indexes declared on a model's table if they do not exist yet."""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _add_composite_indexes(conn):
+    _create_indexes(conn, Transaction.__table__, {'ix_transaction_user_type_date', 'ix_transaction_user_date'})
+    _create_indexes(conn, ChatHistory.__table__, {'ix_chat_history_user_timestamp'})
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text("ANALYZE")) # Refresh planner statistics so the new indexes get used
+
+
+def _backfill_transaction_rollups(conn):
+    # Rollups written since they were introduced do not cover older transactions, so every user's rollups are
+    # recomputed from the ledger once; the version bump drops summaries other workers cached from the old rollups
+    TransactionRollup.__table__.create(bind=conn, checkfirst=True)
+    LedgerVersion.__table__.create(bind=conn, checkfirst=True)
+    count = rebuild_rollup_rows(conn)
+    bump_ledger_version(connection=conn)
+    logging.info(f"Backfilled {count} transaction rollup rows from the ledger")
+
+
+def _enable_incremental_vacuum(conn):
+    # auto_vacuum can only be changed on an existing SQLite database by rebuilding it with VACUUM.
+    # Afterwards, pages freed by chat history archival can be returned with PRAGMA incremental_vacuum.
+    if conn.dialect.name != 'sqlite':
+        return
+    if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2: # 2 = INCREMENTAL
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM") # Must run before anything else writes on this connection (no open transaction)
+
+
+def _add_chat_history_tool_parts(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns(ChatHistory.__tablename__)}
+    if 'tool_parts' not in columns:
+        conn.execute(text("ALTER TABLE chat_history ADD COLUMN tool_parts TEXT"))
+
+
+# (version, description, function(connection)) - append new migrations at the end, never renumber
+MIGRATIONS = [
+    (1, 'Composite indexes for transaction and chat history queries', _add_composite_indexes),
+    (2, 'Backfill transaction rollups from the ledger', _backfill_transaction_rollups),
+    (3, 'SQLite incremental auto-vacuum for chat history archival', _enable_incremental_vacuum),
+    (4, 'Tool call/response parts on chat history for session rehydration', _add_chat_history_tool_parts),
+]
+
+
+def get_applied_versions() -> set:
+    """Returns the set of migration versions already applied to the database."""
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    return {version for (version,) in db.session.query(SchemaMigration.version).all()}
+
+
+def run_migrations() -> list:
+    """Applies pending migrations in order. Returns the versions that were applied."""
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+    applied = get_applied_versions()
+    db.session.remove() # Do not hold a read transaction open while migrations write
+
+    newly_applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logging.info(f"Applying schema migration {version}: {description}")
+        with db.engine.begin() as conn:
+            migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        newly_applied.append(version)
+
+    if newly_applied:
+        logging.info(f"Applied schema migrations: {newly_applied}")
+    return newly_applied
@@ -28,6 +28,14 @@ class Transaction(db.Model):
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     description = db.Column(db.String(200))
 
+    # Composite indexes (existing databases get them through app/migrations.py):
+    # - covering index for per-type range totals (SUM(amount) ... GROUP BY currency never touches the table)
+    # - per-user date ordering for recent transactions, exports and listings
+    __table_args__ = (
+        db.Index('ix_transaction_user_type_date', 'user_id', 'type', 'date', 'currency', 'amount'),
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+    )
+
     # REMOVE the explicit relationship definition here:
     # user = db.relationship('User', backref=db.backref('transaction', lazy=True))
     # The 'user' property will be created automatically by the backref on the User model
@@ -42,10 +50,92 @@ class ChatHistory(db.Model):
     message = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # JSON list of the tool call/response messages exchanged during this turn, so sessions can be rebuilt in any worker
+    tool_parts = db.Column(db.Text, nullable=True)
+
+    # Per-user history in time order (existing databases get it through app/migrations.py)
+    __table_args__ = (
+        db.Index('ix_chat_history_user_timestamp', 'user_id', 'timestamp'),
+    )
 
     # REMOVE the explicit relationship definition here:
     # user = db.relationship('User', backref=db.backref('chat_entry', lazy=True))
     # The 'user' property will be created automatically by the backref on the User model
 
     def __repr__(self):
-        return f"<ChatHistory {self.id} user:{self.user_id} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}>"
\ No newline at end of file
+        return f"<ChatHistory {self.id} user:{self.user_id} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}>"
+
+# Cold storage for chat history past the retention age: one row per user per day, holding that day's
+# entries as zlib-compressed JSON (see app/services/chat_archive_service.py)
+class ChatHistoryArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False) # UTC day of the archived entries
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    first_timestamp = db.Column(db.DateTime, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False) # zlib(JSON list of {id, message, response, tool_parts, timestamp})
+    raw_bytes = db.Column(db.Integer, nullable=False, default=0) # Uncompressed payload size, for compression stats
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_chat_history_archive_user_day'),
+    )
+
+    def __repr__(self):
+        return f"<ChatHistoryArchive user:{self.user_id} {self.day} ({self.entry_count} entries)>"
+
+# Per-user ledger version, bumped by every write to the user's transactions.
+# Cached summaries are keyed by it, so a write anywhere (any worker) invalidates them.
+class LedgerVersion(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<LedgerVersion user:{self.user_id} v{self.version}>"
+
+# Pre-aggregated transaction totals per user, type and currency for one day or one month.
+# Kept in step with Transaction by the financial service so range totals can sum a few rollup rows instead of the ledger.
+class TransactionRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(10), nullable=False) # 'income' or 'expense'
+    currency = db.Column(db.String(3), nullable=False)
+    period = db.Column(db.String(5), nullable=False) # 'day' or 'month'
+    period_start = db.Column(db.Date, nullable=False) # The day itself, or the first day of the month
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    tx_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period', 'type', 'currency', 'period_start', name='uq_transaction_rollup_key'),
+        db.Index('ix_transaction_rollup_range', 'user_id', 'period', 'period_start'),
+    )
+
+    def __repr__(self):
+        return f"<TransactionRollup user:{self.user_id} {self.period} {self.period_start} {self.type} {self.total} {self.currency}>"
+
+# Daily snapshot of a fetched exchange rate: 1 unit of base = rate units of quote
+class ExchangeRate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    base = db.Column(db.String(3), nullable=False)
+    quote = db.Column(db.String(3), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # One snapshot per pair per day; the unique index also serves (base, quote, date) lookups
+    __table_args__ = (
+        db.UniqueConstraint('base', 'quote', 'date', name='uq_exchange_rate_base_quote_date'),
+    )
+
+    def __repr__(self):
+        return f"<ExchangeRate {self.base}/{self.quote} {self.rate} on {self.date}>"
+
+# One row per applied schema migration (see app/migrations.py)
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchemaMigration {self.version}: {self.description}>"
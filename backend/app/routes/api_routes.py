@@ -1,15 +1,28 @@
 # app/routes/api_routes.py
-from flask import request, jsonify, send_file, url_for, Blueprint, current_app
+from flask import request, jsonify, send_file, url_for, Blueprint, current_app, Response, stream_with_context
 import logging
 import os
 import io # Needed for BytesIO
+import csv # For CSV parse errors raised by bulk imports
+import json # For Server-Sent Event payloads
 from datetime import datetime
 
 # Import necessary components from the app package and services
 from .. import db # Need db for ChatHistory session operations
+from ..database import get_db_routing_stats # Per-bind query counters for the metrics endpoint
 from ..models import ChatHistory, Transaction # Need models for querying
-from ..services.ai_service import handle_ai_query # AI handler service
-from ..services.financial_service import generate_pdf_report, generate_csv_data # Financial service functions
+from ..services.ai_service import handle_ai_query, stream_ai_query, ingest_statement, get_ai_stats # AI handler service
+from ..services.financial_service import generate_pdf_report, generate_csv_data, list_transactions # Financial service functions
+from ..services.exchange_service import get_rate_cache_stats, validate_currency_code # Cache counters for the metrics endpoint, statement currency checks
+from ..services.summary_cache_service import get_summary_cache_stats
+from ..services.analytics_service import get_frame_cache_stats
+from ..services.range_index_service import get_range_index_stats
+from ..services.import_service import import_transactions, iter_csv_records, iter_ndjson_records, open_text_stream
+from ..services.chat_history_service import record_chat, get_chat_history_writer_stats, get_chat_history_page
+from ..services.pagination_service import parse_page_size
+from ..services.chat_archive_service import get_archived_chat_history
+from ..services.chat_session_service import get_chat_session_stats
+from ..services.tool_executor_service import get_tool_executor_stats
 
 # Create a Blueprint named 'api' with a URL prefix /api
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -31,50 +44,119 @@ def chat_endpoint():
     logging.info(f"Received chat message from user {user_id}: {user_message}")
 
     # Call the AI service function to get the response
-    ai_response = handle_ai_query(user_id, user_message)
-
-    # Store chat history
-    try:
-        chat_entry = ChatHistory(
-            user_id=user_id,
-            message=user_message,
-            response=ai_response
-        )
-        db.session.add(chat_entry)
-        db.session.commit()
-        logging.info(f"Chat history stored for user {user_id}")
-    except Exception as e:
-        logging.error(f"Error storing chat history for user {user_id}: {str(e)}", exc_info=True)
-        # Log the error but don't necessarily fail the request
+    if data.get('mode') == 'ingest':
+        # Pasted statement/receipt list: parse every transaction in one model call and bulk insert
+        default_currency = str(data.get('default_currency') or 'USD').strip().upper()
+        currency_error = validate_currency_code(default_currency)
+        if currency_error:
+            return jsonify({'error': currency_error}), 400
+        ai_response = ingest_statement(user_id, user_message, default_currency)
+        # Store chat history (queued for the background writer; the response does not wait on the commit)
+        record_chat(user_id, user_message, ai_response)
+    else:
+        # Stores the exchange itself, tool calls included, so other workers can continue the conversation
+        ai_response = handle_ai_query(user_id, user_message)
 
     # Return the AI response to the frontend
     return jsonify({'response': ai_response})
 
+@api.route('/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    """
+    Streams the assistant's answer as Server-Sent Events: `text` events carry answer chunks as the model produces
+    them, `status` events report tool calls, and a final `done` event carries the complete (stored) response.
+    """
+    user_id = 1 # Assuming single user for now
+
+    data = request.get_json()
+
+    if not data or 'message' not in data:
+        return jsonify({'error': 'No message provided'}), 400
+
+    user_message = data.get('message', '').strip()
+    if not user_message:
+        return jsonify({'response': "Please type a message to the assistant."})
+
+    logging.info(f"Received streaming chat message from user {user_id}: {user_message}")
+
+    def generate():
+        for event, payload in stream_ai_query(user_id, user_message):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    # stream_with_context keeps the app/request context (config, db session) alive while the body is sent
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Stop nginx from buffering the stream
+    })
+
 @api.route('/chat-history', methods=['GET'])
 def get_chat_history_endpoint():
-    """Retrieves recent chat history for the user."""
+    """
+    Retrieves the user's most recent chat history, one page at a time (newest page first, entries in
+    chronological order). Pass ?before=<next_cursor> to fetch the previous page.
+    """
     user_id = 1 # Assuming single user for now
+    limit = parse_page_size(request.args.get('limit'))
+    if isinstance(limit, str):
+        return jsonify({'error': limit}), 400
+
     try:
-        # Get the last 50 chat messages, ordered chronologically for display
-        history = ChatHistory.query.filter_by(user_id=user_id)\
-            .order_by(ChatHistory.timestamp.asc())\
-            .limit(50)\
-            .all()
-
-        # Format the history for JSON response
-        formatted_history = [{
-            'message': entry.message,
-            'response': entry.response,
-            'timestamp': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        } for entry in history]
-
-        logging.info(f"Retrieved {len(formatted_history)} chat history entries for user {user_id}")
-        return jsonify({'history': formatted_history})
+        page = get_chat_history_page(user_id, limit, request.args.get('before'))
+        if isinstance(page, str):
+            return jsonify({'error': page}), 400
+
+        logging.info(f"Retrieved {len(page['history'])} chat history entries for user {user_id}")
+        return jsonify(page)
 
     except Exception as e:
         logging.error(f"Error retrieving chat history for user {user_id}: {str(e)}", exc_info=True)
         return jsonify({'error': 'Could not retrieve chat history'}), 500
 
+
+@api.route('/chat-history/archive', methods=['GET'])
+def get_archived_chat_history_endpoint():
+    """Retrieves archived (older than the retention age) chat history for ?start_date=&end_date= (YYYY-MM-DD)."""
+    user_id = 1 # Assuming single user for now
+    try:
+        result = get_archived_chat_history(user_id, request.args.get('start_date'), request.args.get('end_date'))
+        if isinstance(result, str):
+            return jsonify({'error': result}), 400
+        return jsonify(result)
+
+    except Exception as e:
+        logging.error(f"Error retrieving archived chat history for user {user_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Could not retrieve archived chat history'}), 500
+
+
+@api.route('/transactions', methods=['GET'])
+def list_transactions_endpoint():
+    """
+    Lists transactions newest first with keyset pagination. Optional filters: type, category, currency,
+    start_date and end_date (YYYY-MM-DD, inclusive). Pass ?cursor=<next_cursor> for the next page.
+    """
+    user_id = 1 # Assuming single user for now
+    limit = parse_page_size(request.args.get('limit'))
+    if isinstance(limit, str):
+        return jsonify({'error': limit}), 400
+
+    try:
+        page = list_transactions(
+            user_id, limit,
+            cursor=request.args.get('cursor'),
+            type=request.args.get('type'),
+            category=request.args.get('category'),
+            currency=request.args.get('currency'),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date')
+        )
+        if isinstance(page, str):
+            return jsonify({'error': page}), 400
+        return jsonify(page)
+
+    except Exception as e:
+        logging.error(f"Error listing transactions for user {user_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Could not list transactions'}), 500
+
 @api.route('/reports/pdf/<filename>')
 def download_pdf_report_file(filename: str):
     """Serves a previously generated PDF report file."""
@@ -171,4 +253,55 @@ def get_csv_report_endpoint():
     except Exception as e:
         # Catch exceptions raised by the generate_csv_data service function
         logging.error(f"Error generating or sending CSV for user {user_id}: {str(e)}", exc_info=True)
-        return jsonify({"error": "Failed to generate CSV report due to an internal error."}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to generate CSV report due to an internal error."}), 500
+
+
+@api.route('/transactions/import', methods=['POST'])
+def import_transactions_endpoint():
+    """
+    Bulk-imports transactions streamed in the request body as CSV (the columns the CSV export produces)
+    or NDJSON (one JSON object per line). Invalid rows are reported without aborting the import.
+    """
+    user_id = 1 # Assuming single user for now
+
+    # Pick the parser from ?format=csv|ndjson, falling back to the Content-Type header
+    import_format = (request.args.get('format') or '').lower()
+    if not import_format:
+        content_type = (request.mimetype or '').lower()
+        if content_type in ('text/csv', 'application/csv'):
+            import_format = 'csv'
+        elif content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines'):
+            import_format = 'ndjson'
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({'error': "Unsupported import format. Send text/csv or application/x-ndjson (or use ?format=csv|ndjson)."}), 415
+
+    try:
+        # Read the body as a stream so large files are never held in memory at once
+        text_stream = open_text_stream(request.stream)
+        records = iter_csv_records(text_stream) if import_format == 'csv' else iter_ndjson_records(text_stream)
+        report = import_transactions(user_id, records, chunk_size=current_app.config.get('IMPORT_CHUNK_SIZE', 1000))
+    except (UnicodeDecodeError, csv.Error) as e:
+        logging.warning(f"Rejected malformed {import_format} import for user {user_id}: {str(e)}")
+        return jsonify({'error': f"Could not read the uploaded {import_format.upper()} data: {str(e)}"}), 400
+    except Exception as e:
+        logging.error(f"Error importing transactions for user {user_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to import transactions due to an internal error.'}), 500
+
+    status_code = 200 if report['inserted'] or not report['rejected'] else 400
+    return jsonify(report), status_code
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics_endpoint():
+    """Exposes in-process cache and performance counters for monitoring."""
+    return jsonify({
+        'exchange_rate_cache': get_rate_cache_stats(),
+        'summary_cache': get_summary_cache_stats(),
+        'ledger_frames': get_frame_cache_stats(),
+        'range_indexes': get_range_index_stats(),
+        'chat_history_writer': get_chat_history_writer_stats(),
+        'chat_sessions': get_chat_session_stats(),
+        'tool_executor': get_tool_executor_stats(),
+        'ai_turns': get_ai_stats(),
+        'database': get_db_routing_stats()
+    })
@@ -1,26 +1,40 @@
 # app/services/ai_service.py
 import google.generativeai as genai
+from google.generativeai import protos
+from google.generativeai.types import content_types, generation_types
 import logging
 import google.api_core.exceptions
+import json
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from functools import partial
 from flask import current_app # Access config and potentially app context
 
 # Import the financial helper functions (services) that the AI can call
-from .exchange_service import get_exchange_rate
-from .datetime_service import get_current_datetime
+from .exchange_service import get_exchange_rate, get_exchange_rate_on
+from .datetime_service import get_current_datetime, format_time_context
 # Note: We import the service functions, NOT the Flask route functions
-from .financial_service import add_transaction, get_total_by_type, generate_pdf_report # generate_csv_data is not a tool
+from .financial_service import add_transaction, add_transactions, get_total_by_type, get_financial_overview, generate_pdf_report # generate_csv_data is not a tool
+from .analytics_service import get_transaction_breakdown
+from .import_service import import_transactions
+from .chat_session_service import chat_session, load_session_history
+from .chat_history_service import record_chat, get_latest_chat_timestamp
+from .tool_executor_service import run_tool_calls
+from .deadline_service import remaining_time, deadline_expired
 
 
 # Tool declarations - Define the interface for the AI model
 TOOL_DECLARATIONS = [
     {
         'name': 'get_exchange_rate',
-        'description': 'Get the current exchange rate between two currencies (e.g., USD to EUR). Uses 3-letter currency codes.',
+        'description': 'Get the exchange rate between two currencies (e.g., USD to EUR), either current or on a past date. Uses 3-letter currency codes.',
         'parameters': {
             'type': 'object',
             'properties': {
                 'from_currency': {'type': 'string', 'description': 'The 3-letter currency code to convert from (e.g., USD). Must be uppercase.'},
-                'to_currency': {'type': 'string', 'description': 'The 3-letter currency code to convert to (e.g., EUR). Must be uppercase.'}
+                'to_currency': {'type': 'string', 'description': 'The 3-letter currency code to convert to (e.g., EUR). Must be uppercase.'},
+                'date': {'type': 'string', 'description': 'Optional: Date in YYYY-MM-DD format to get a historical rate for. Omit for the current rate.'}
             },
             'required': ['from_currency', 'to_currency']
         }
@@ -42,6 +56,33 @@ TOOL_DECLARATIONS = [
             'required': ['amount', 'currency', 'category', 'type', 'description']
         }
     },
+    {
+        'name': 'add_transactions',
+        'description': 'Add several financial transactions in one call (e.g., "I spent 20 on coffee, 45 on gas and 120 on groceries"). Use this instead of multiple add_transaction calls whenever the user mentions more than one transaction. All are saved together, or none if any is invalid.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'transactions': {
+                    'type': 'array',
+                    'description': 'The transactions to add. Each item has the same fields as add_transaction.',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'amount': {'type': 'number', 'description': 'The amount of the transaction. Should be a positive number.'},
+                            'currency': {'type': 'string', 'description': 'The 3-letter currency code (e.g., USD, ETB). Must be uppercase.'},
+                            'category': {'type': 'string', 'description': 'Category of the transaction (e.g., Salary, Groceries, Utilities).'},
+                            'type': {'type': 'string', 'description': "Type of transaction: 'income' or 'expense'."},
+                            'description': {'type': 'string', 'description': 'A brief description of the transaction.'},
+                            'date': {'type': 'string', 'description': 'Optional: Date in YYYY-MM-DD format. Defaults to today.'},
+                            'time': {'type': 'string', 'description': 'Optional: Time in HH:MM format. Defaults to now.'}
+                        },
+                        'required': ['amount', 'currency', 'category', 'type', 'description']
+                    }
+                }
+            },
+            'required': ['transactions']
+        }
+    },
     {
         'name': 'get_financial_summary',
         'description': 'Calculate total income or expenses for a user within a specified date range (inclusive). Optionally converts the total to a target currency (defaults to USD).',
@@ -56,6 +97,33 @@ TOOL_DECLARATIONS = [
             'required': ['transaction_type', 'start_date', 'end_date']
         }
     },
+    {
+        'name': 'get_financial_overview',
+        'description': 'Get total income, total expenses and net balance together for a date range (inclusive), converted to a target currency, with per-currency breakdowns. Prefer this over two get_financial_summary calls when the user asks about both income and expenses, their balance, or an overall summary.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'start_date': {'type': 'string', 'description': 'Optional: The start date for the period in YYYY-MM-DD format. Omit for all time (from the first recorded transaction).'},
+                'end_date': {'type': 'string', 'description': 'Optional: The end date for the period in YYYY-MM-DD format. Defaults to today.'},
+                'target_currency': {'type': 'string', 'description': 'Optional: The 3-letter currency code to convert the totals to (e.g., ETB, USD). Defaults to USD. Must be uppercase.'}
+            }
+        }
+    },
+    {
+        'name': 'get_transaction_breakdown',
+        'description': 'Break down income or expenses for a date range (inclusive) by category (e.g., where did my money go) or by month (e.g., monthly spending trend), converted to a target currency.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'transaction_type': {'type': 'string', 'description': "The type of transactions to break down: 'income' or 'expense'."},
+                'start_date': {'type': 'string', 'description': 'The start date for the period in YYYY-MM-DD format.'},
+                'end_date': {'type': 'string', 'description': 'The end date for the period in YYYY-MM-DD format.'},
+                'group_by': {'type': 'string', 'description': "Optional: 'category' (default) or 'month'."},
+                'target_currency': {'type': 'string', 'description': 'Optional: The 3-letter currency code to convert amounts to. Defaults to USD. Must be uppercase.'}
+            },
+            'required': ['transaction_type', 'start_date', 'end_date']
+        }
+    },
     {
         'name': 'generate_pdf_report',
         'description': 'Generate a PDF financial report summarizing recent transactions and overall balance. The report includes an all-time summary in USD and recent transactions.',
@@ -66,7 +134,7 @@ TOOL_DECLARATIONS = [
     },
     {
         'name': 'get_current_datetime',
-        'description': 'Get the current date and time information (YYYY-MM-DD HH:MM, day of the week, timezone). Use this BEFORE calling other tools if their parameters like date/time or date ranges depend on the current time (e.g., "today", "yesterday", "last month", defaulting add_transaction date/time).',
+        'description': 'Get the current date and time information (YYYY-MM-DD HH:MM, day of the week, timezone). Every user message already starts with a [Context] line carrying this information; only call this tool if that line is missing.',
         'parameters': {
             'type': 'object',
             'properties': {}
@@ -120,9 +188,9 @@ SYSTEM_INSTRUCTION = (
     "If the user provides information that allows you to perform a tool action, confirm the action *after* it's done based on the tool's result."
 
     "CRITICAL INSTRUCTION FOR CURRENT DATE/TIME QUERIES AND DEFAULTS: "
-    "When users ask about the current date, time, or day of the week, ALWAYS use the `get_current_datetime()` function. "
-    "This function provides accurate current date and time information. Use this information directly in your response to the user. "
-    "Additionally, whenever a tool requires the current date or time (e.g., defaulting date/time for `add_transaction` when not specified), or when calculating relative dates (e.g., 'yesterday', 'last month', 'past 30 days' for `get_financial_summary` or `add_transaction`), you MUST first call the `get_current_datetime()` tool to get the accurate current information *before* determining the parameter values for the other tool. State the date range you've calculated for summaries if it was based on relative terms."
+    "Every user message starts with a '[Context]' line giving the current date, day of the week, time and the user's timezone. It is accurate; treat it as the current date and time. "
+    "When users ask about the current date, time, or day of the week, answer directly from the context line. "
+    "Additionally, whenever a tool requires the current date or time (e.g., defaulting date/time for `add_transaction` when not specified), or when calculating relative dates (e.g., 'yesterday', 'last month', 'past 30 days' for `get_financial_summary` or `add_transaction`), use the context line and call the other tool straight away. Do NOT call `get_current_datetime()` when the context line is present; it is only a fallback for messages without one. State the date range you've calculated for summaries if it was based on relative terms."
 
     "CRITICAL INSTRUCTION FOR CURRENCY CODES (Exchange Rates & Transactions): "
     "When a user query involves country names, specific currencies by name, or common currency understanding (e.g., 'dollars' usually means USD, 'pounds' usually GBP, 'euro' is EUR, 'Birr' usually ETB), "
@@ -131,14 +199,14 @@ SYSTEM_INSTRUCTION = (
 
     "DATE AND TIME HANDLING (Transactions & Summaries): "
     "Tool functions require dates in YYYY-MM-DD format and times in HH:MM format. "
-    "You MUST autonomously convert all natural language date and time references into these precise formats. Do not ask the user for reformatting if your inference is sound. Use `get_current_datetime` (call it first!) to get the current date/time if needed for calculations or defaults."
+    "You MUST autonomously convert all natural language date and time references into these precise formats. Do not ask the user for reformatting if your inference is sound. Use the current date/time from the context line if needed for calculations or defaults."
 
     "General Natural Language Dates: For terms like 'today', 'yesterday', 'last Tuesday', 'next Monday', 'tomorrow', specific dates like 'January 5th' or 'May 10 2023', you must calculate the exact YYYY-MM-DD date. If a year isn't specified for a date like 'March 15th', assume the current year unless context implies otherwise (e.g., 'last March 15th' would refer to the previous year's March 15th). Combine date and time if both are given (e.g., 'yesterday at 3pm')."
 
     "Specific Instructions for `get_financial_summary` Date Ranges: "
-    "  - Before calculating date ranges for `get_financial_summary` based on relative terms (e.g., 'last 12 months', 'this month', 'year to date'), ALWAYS call `get_current_datetime` first to get the current date as a reference. "
+    "  - Before calculating date ranges for `get_financial_summary` based on relative terms (e.g., 'last 12 months', 'this month', 'year to date'), use the current date from the context line as the reference. "
     "  - For queries about 'all time' totals (e.g., 'what is my total income ever?', 'summary all time'): "
-    "    Use a start date of '2000-01-01' and an end date of today's date (obtained using `get_current_datetime`). "
+    "    Use a start date of '2000-01-01' and an end date of today's date (from the context line). "
     "  - For ranges specified by months and years (e.g., 'income in January 2023', 'summary for Feb 2024', 'January 2000 to February 2025'): "
     "    The `start_date` is the *first day* of the starting month/year. The `end_date` is the *last day* of the ending month/year. You must correctly determine the last day, accounting for leap years. "
     "  - For ranges specified only by years (e.g., 'income from 2020 to 2022', 'expenses during 2021-2023'): "
@@ -146,23 +214,26 @@ SYSTEM_INSTRUCTION = (
     "  - If a single year is mentioned (e.g., 'income in 2021', 'expenses for 2023'): "
     "    The `start_date` is 'YYYY-01-01' and `end_date` is 'YYYY-12-31' for that year. "
     "  - For specific dates or relative ranges like 'last month', 'this month', 'this year', 'past 30 days', 'since last Tuesday': "
-    "    Calculate the precise `start_date` and `end_date` (YYYY-MM-DD) based on the current date (obtained from `get_current_datetime`). "
-    "  - For 'last 12 months' or 'past year': `end_date` should be today's date (obtained from `get_current_datetime`). `start_date` should be the date exactly one year prior to today's date plus one day, to make the period inclusive of a full 365/366 days ending on today's date (e.g., if today is 2025-05-29, the range is 2024-05-30 to 2025-05-29, or more simply, calculate start_date as one year prior to today and end_date as today, ensuring the tool handles inclusivity correctly. A common interpretation is that 'last 12 months' ending today, May 29th 2025, would span from May 29th, 2024 to May 29th, 2025). Default to using the start date as the same day-month one year prior, and end date as today. For example, if today is 2025-05-29, the period is 2024-05-29 to 2025-05-29." # Standardized this definition
+    "    Calculate the precise `start_date` and `end_date` (YYYY-MM-DD) based on the current date (from the context line). "
+    "  - For 'last 12 months' or 'past year': `end_date` should be today's date (from the context line). `start_date` should be the date exactly one year prior to today's date plus one day, to make the period inclusive of a full 365/366 days ending on today's date (e.g., if today is 2025-05-29, the range is 2024-05-30 to 2025-05-29, or more simply, calculate start_date as one year prior to today and end_date as today, ensuring the tool handles inclusivity correctly. A common interpretation is that 'last 12 months' ending today, May 29th 2025, would span from May 29th, 2024 to May 29th, 2025). Default to using the start date as the same day-month one year prior, and end date as today. For example, if today is 2025-05-29, the period is 2024-05-29 to 2025-05-29." # Standardized this definition
     "  When providing the summary, if the user used a relative term like 'last 12 months' or 'this month', state the actual date range you calculated and used (e.g., 'For the period from YYYY-MM-DD to YYYY-MM-DD, your income was...')."
     "Always provide both `start_date` and `end_date` in YYYY-MM-DD format to the `get_financial_summary` tool."
 
     "Specific Instructions for `add_transaction` Date and Time: "
-    "  - Before determining date/time for `add_transaction` based on relative terms or defaults, call `get_current_datetime` if the current time is relevant. "
+    "  - Before determining date/time for `add_transaction` based on relative terms or defaults, take the current date/time from the context line. "
     "  - If no date is specified by the user, default the `date` parameter to today's date (YYYY-MM-DD). "
     "  - If no time is specified, default the `time` parameter to the current time (HH:MM). "
     "  - If natural language like 'yesterday at 3pm' or 'Jan 5th 9am' is used, parse and convert to YYYY-MM-DD and HH:MM format."
 
     "TOOL PARAMETER REQUIREMENTS (reiteration & specifics): "
-    "  - `get_exchange_rate`: `from_currency`, `to_currency` (both 3-letter uppercase ISO codes). "
+    "  - `get_exchange_rate`: `from_currency`, `to_currency` (both 3-letter uppercase ISO codes). `date` (optional YYYY-MM-DD) for a historical rate. "
     "  - `add_transaction`: `amount` (number, always positive), `currency` (3-letter uppercase), `category` (string), `type` ('income' or 'expense'), `description` (string). `date` (optional YYYY-MM-DD), `time` (optional HH:MM). See inference and clarification rules above for category/description. "
+    "  - `add_transactions`: `transactions` (array of objects with the same fields as `add_transaction`). When the user mentions two or more transactions in one message, make ONE `add_transactions` call instead of several `add_transaction` calls. "
     "  - `get_financial_summary`: `transaction_type` ('income' or 'expense'), `start_date` (YYYY-MM-DD), `end_date` (YYYY-MM-DD). `target_currency` (optional 3-letter uppercase, defaults to USD). "
+    "  - `get_financial_overview`: `start_date`, `end_date` (both optional YYYY-MM-DD; omit `start_date` for all time), `target_currency` (optional 3-letter uppercase, defaults to USD). Use it for balance/net questions or when both income and expenses are asked for, instead of calling `get_financial_summary` twice. "
+    "  - `get_transaction_breakdown`: `transaction_type` ('income' or 'expense'), `start_date`, `end_date` (YYYY-MM-DD). `group_by` (optional 'category' or 'month'), `target_currency` (optional, defaults to USD). Use it for 'where did my money go', top categories, or month-by-month trends. "
     "  - `generate_pdf_report`: No parameters. "
-    "  - `get_current_datetime`: No parameters. Use proactively as instructed above."
+    "  - `get_current_datetime`: No parameters. Fallback only, for a message without the date/time context line."
 
     "RESPONSE GUIDELINES: "
     "1. After successfully calling a tool, present the results from the function return value in a clear, human-readable sentence or summary. Always state currency explicitly. "
@@ -174,196 +245,582 @@ SYSTEM_INSTRUCTION = (
     "7. If the user asks a simple non-financial question (like 'hello', 'how are you'), respond appropriately and casually without trying to call a financial tool."
 )
 
-def handle_ai_query(user_id: int, query_text: str) -> str:
+# Structured-output schema for statement ingestion: the model returns a JSON list of transactions
+STATEMENT_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'date': {'type': 'string', 'description': 'Transaction date in YYYY-MM-DD format.'},
+            'time': {'type': 'string', 'description': 'Transaction time in HH:MM format, if shown.', 'nullable': True},
+            'amount': {'type': 'number', 'description': 'Positive amount.'},
+            'currency': {'type': 'string', 'description': '3-letter uppercase ISO currency code.'},
+            'type': {'type': 'string', 'enum': ['income', 'expense']},
+            'category': {'type': 'string', 'description': 'Short category, e.g. Groceries, Salary, Transport.'},
+            'description': {'type': 'string', 'description': 'Brief description (merchant or payee).'}
+        },
+        'required': ['date', 'amount', 'currency', 'type', 'category', 'description']
+    }
+}
+
+STATEMENT_INSTRUCTION = (
+    "You extract financial transactions from pasted bank statements, receipt lists or notes. "
+    "Return every transaction as one item of the JSON list and nothing else. "
+    "Money leaving the account (purchases, payments, fees, withdrawals) is an 'expense'; money coming in (salary, refunds, deposits, transfers in) is 'income'. "
+    "Amounts are always positive. Use 3-letter uppercase ISO currency codes, inferring them from symbols or context ('$' -> USD, 'Birr' -> ETB) and falling back to the default currency given. "
+    "Dates must be YYYY-MM-DD; resolve partial or relative dates against the current date given. "
+    "Skip balances, totals, headers and any line that is not a transaction."
+)
+
+# Model configuration shared by every chat request
+CHAT_MODEL_NAME = 'gemini-1.5-flash-latest'
+CHAT_GENERATION_CONFIG = {
+    'temperature': 0.1,  # Lower temperature for more precise responses
+    'top_p': 0.8,
+    'top_k': 40
+}
+
+# Static dispatch table: tool name -> function(user_id, **model_args). Built once at import time.
+TOOL_FUNCTIONS = {
+    # Historical rates are answered from stored daily snapshots when a date is given
+    'get_exchange_rate': lambda user_id, date=None, **args: get_exchange_rate_on(on_date=date, **args) if date else get_exchange_rate(**args),
+    'add_transaction': lambda user_id, **args: add_transaction(user_id=user_id, **args),
+    'add_transactions': lambda user_id, **args: add_transactions(user_id=user_id, **args),
+    'get_financial_summary': lambda user_id, **args: get_total_by_type(user_id=user_id, **args),
+    'get_financial_overview': lambda user_id, **args: get_financial_overview(user_id=user_id, **args),
+    'get_transaction_breakdown': lambda user_id, **args: get_transaction_breakdown(user_id=user_id, **args),
+    'generate_pdf_report': lambda user_id: generate_pdf_report(user_id=user_id),
+    'get_current_datetime': lambda user_id: get_current_datetime() # Does not require user_id
+}
+
+# Tools that only read (or call external APIs) and may run concurrently when the model requests several at once.
+# Writes and the PDF report (timestamped filename) run alone, in the order the model asked for them.
+PARALLEL_SAFE_TOOLS = frozenset({
+    'get_exchange_rate',
+    'get_financial_summary',
+    'get_financial_overview',
+    'get_transaction_breakdown',
+    'get_current_datetime'
+})
+
+# Tool arguments holding a date or time the model resolved itself, e.g. from 'yesterday' or 'last month'
+# (used when counting saved datetime round trips)
+DATE_ARGUMENTS = frozenset({'date', 'time', 'start_date', 'end_date'})
+
+# Process-wide chat turn counters (see get_ai_stats)
+_turn_stats = {
+    'turns': 0, 'llm_round_trips': 0, 'saved_round_trips': 0, 'datetime_fallbacks': 0,
+    'tool_rounds': 0, 'round_limit_hits': 0, 'budget_exhausted': 0
+}
+
+# Agent loop limits: a model request is only made with at least this much of the turn's budget left (its timeout
+# is the time left), and when the loop stops early the model answers with function calling turned off
+MIN_MODEL_SECONDS = 2.0
+NO_FUNCTION_CALLS = {'function_calling_config': {'mode': 'NONE'}}
+_turn_stats_lock = threading.Lock()
+
+# Process-wide model registry, filled once by init_ai() from create_app().
+# The SDK converts tool declarations and generation config to protos when a model is constructed,
+# so reusing the models means requests no longer pay for that conversion (or for building a model).
+_chat_model = None
+_statement_model = None
+
+
+def init_ai(app):
+    """Builds the chat and statement models once per process (only when AI is enabled)."""
+    global _chat_model, _statement_model
+    if not app.config.get('AI_ENABLED'):
+        return
+    _chat_model = _build_chat_model()
+    _statement_model = _build_statement_model()
+    logging.info(f"AI model registry initialised: {CHAT_MODEL_NAME} with {len(TOOL_DECLARATIONS)} tools")
+
+
+def _build_chat_model():
+    # Pre-converted FunctionLibrary: send_message() then reuses the cached Tool protos
+    tools = content_types.to_function_library([{'function_declarations': TOOL_DECLARATIONS}])
+    return genai.GenerativeModel(
+        model_name=CHAT_MODEL_NAME,
+        system_instruction=SYSTEM_INSTRUCTION,
+        safety_settings=SAFETY_SETTINGS or None, # Only if they were successfully configured
+        tools=tools,
+        generation_config=CHAT_GENERATION_CONFIG
+    )
+
+
+def _build_statement_model():
+    return genai.GenerativeModel(
+        model_name=CHAT_MODEL_NAME,
+        system_instruction=STATEMENT_INSTRUCTION,
+        safety_settings=SAFETY_SETTINGS or None,
+        generation_config=genai.GenerationConfig(
+            response_mime_type='application/json',
+            response_schema=STATEMENT_SCHEMA,
+            temperature=0.0
+        )
+    )
+
+
+def _count_turn(counter: str) -> None:
+    with _turn_stats_lock:
+        _turn_stats[counter] += 1
+
+
+def get_ai_stats() -> dict:
     """
-    Processes a user's chat query using the Gemini model, handling tool calls.
+    Returns chat turn counters: model round trips made, get_current_datetime round trips saved by sending the
+    date/time context with each message, and turns where the model still called the tool.
+    """
+    with _turn_stats_lock:
+        return dict(_turn_stats)
+
+
+def get_chat_model():
+    """Returns the shared chat model, building it on first use if init_ai() has not run."""
+    global _chat_model
+    if _chat_model is None:
+        _chat_model = _build_chat_model()
+    return _chat_model
+
+
+def get_statement_model():
+    """Returns the shared statement-ingestion model, building it on first use if init_ai() has not run."""
+    global _statement_model
+    if _statement_model is None:
+        _statement_model = _build_statement_model()
+    return _statement_model
+
+def ingest_statement(user_id: int, statement_text: str, default_currency: str = 'USD') -> str:
+    """
+    Parses a pasted statement into transactions with ONE structured-output model call and bulk-inserts them
+    through the batch write path (instead of one chat round trip per line).
+    default_currency must already be validated by the caller (see validate_currency_code).
+    Returns a summary string for the user.
     """
-    # Check if AI is enabled via app configuration
     if not current_app.config.get('AI_ENABLED'):
         logging.warning("AI Assistant is disabled by configuration.")
         return "AI Assistant is not available: API key not configured."
 
+    default_currency = (default_currency or 'USD').strip().upper()
+
     try:
-        # The genai.configure(api_key=...) was done in __init__.py
-        # We just need to instantiate the model here.
-        model_init_args = {
-            'model_name': 'gemini-1.5-flash-latest',
-            'system_instruction': SYSTEM_INSTRUCTION,
-        }
-        # Only add safety settings if they were successfully configured
-        if SAFETY_SETTINGS:
-             model_init_args['safety_settings'] = SAFETY_SETTINGS
-
-        model = genai.GenerativeModel(**model_init_args)
-
-        # Define the mapping from tool names (as declared to the AI) to the actual functions
-        available_functions = {
-            'get_exchange_rate': get_exchange_rate,
-            # Use lambda to pass user_id to functions that require it
-            'add_transaction': lambda **args_inner: add_transaction(user_id=user_id, **args_inner),
-            'get_financial_summary': lambda **args_inner: get_total_by_type(user_id=user_id, **args_inner),
-            'generate_pdf_report': lambda: generate_pdf_report(user_id=user_id), # Pass user_id
-            'get_current_datetime': get_current_datetime # Does not require user_id
-        }
+        model = get_statement_model()
+        current_datetime = get_current_datetime()
+        prompt = (
+            f"Current date: {current_datetime.get('date')}. Default currency: {default_currency}.\n"
+            f"Statement:\n{statement_text}"
+        )
+        response = model.generate_content(prompt)
+        parsed = json.loads(response.text)
+        if not isinstance(parsed, list):
+            raise ValueError("Model output is not a list of transactions.")
+    except google.api_core.exceptions.GoogleAPIError as e:
+        logging.error(f"Google API Error during statement ingestion for user {user_id}: {str(e)}", exc_info=True)
+        if isinstance(e, google.api_core.exceptions.ResourceExhausted):
+            return "AI Assistant Error: My capabilities are currently exhausted. Please try again in a few minutes."
+        return f"An API error occurred while reading your statement: {str(e)}"
+    except Exception as e:
+        logging.error(f"Could not parse statement for user {user_id}: {str(e)}", exc_info=True)
+        return "I couldn't read any transactions from that statement. Please check the text and try again."
+
+    if not parsed:
+        return "I didn't find any transactions in that text."
+
+    logging.info(f"Statement ingestion parsed {len(parsed)} transactions for user {user_id}")
+    report = import_transactions(
+        user_id,
+        ((position, item if isinstance(item, dict) else "Not a transaction object.") for position, item in enumerate(parsed, start=1)),
+        chunk_size=current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    )
+
+    summary = f"Imported {report['inserted']} of {len(parsed)} transactions from your statement."
+    if report['rejected']:
+        skipped = "; ".join(f"#{error['line']}: {error['error']}" for error in report['errors'][:5])
+        summary += f" {report['rejected']} could not be added ({skipped})."
+    return summary
+
+def _uses_date_arguments(args) -> bool:
+    """True if tool call arguments (nested add_transactions items included) set a date or time."""
+    if isinstance(args, dict):
+        return any((key in DATE_ARGUMENTS and bool(value)) or _uses_date_arguments(value) for key, value in args.items())
+    if isinstance(args, list):
+        return any(_uses_date_arguments(item) for item in args)
+    return False
+
+def _to_plain(value):
+    """Recursively converts proto map/repeated containers from function call args into dicts and lists."""
+    if isinstance(value, Mapping):
+        return {key: _to_plain(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [_to_plain(item) for item in value]
+    return value
+
+def handle_ai_query(user_id: int, query_text: str) -> str:
+    """
+    Processes a user's chat query using the Gemini model, handling tool calls.
+    The exchange, including any tool call/response messages, is stored in chat history so that
+    whichever worker handles the user's next message can rebuild the conversation.
+    """
+    return _drain(_chat_turn(user_id, query_text))
 
-        # Get or create chat history for this user
-        # Store chat history in a dictionary keyed by user_id
-        if not hasattr(handle_ai_query, 'chat_histories'):
-            handle_ai_query.chat_histories = {}
-        
-        # Get existing chat or create new one
-        if user_id not in handle_ai_query.chat_histories:
-            handle_ai_query.chat_histories[user_id] = model.start_chat(history=[])
-        
-        chat = handle_ai_query.chat_histories[user_id]
 
-        logging.info(f"User {user_id} query sent to Gemini: {query_text}")
+def stream_ai_query(user_id: int, query_text: str):
+    """
+    Streaming variant of handle_ai_query for Server-Sent Events. Yields (event, data) pairs:
+    ('text', {'text': chunk}) as the model's answer arrives, ('status', {...}) around each tool call, and finally
+    ('done', {'response': final_text}) with the same text handle_ai_query would return and store.
+    """
+    final_text = yield from _chat_turn(user_id, query_text, stream=True)
+    yield 'done', {'response': final_text}
+
 
-        # Step 1: Send the user query to the model for analysis and potential tool call
+def _drain(events):
+    """Runs an event generator to completion and returns its return value."""
+    while True:
         try:
-            # First get current datetime to help with date calculations
-            current_datetime = get_current_datetime()
-            logging.info(f"Current datetime for user {user_id}: {current_datetime}")
-            
-            # Send the query with tools
-            response = chat.send_message(
-                query_text,
-                tools=[{'function_declarations': TOOL_DECLARATIONS}],
-                generation_config={
-                    'temperature': 0.1,  # Lower temperature for more precise responses
-                    'top_p': 0.8,
-                    'top_k': 40
-                }
-            )
-            
-            # Check for empty or invalid response
-            if not response or not response.parts:
-                logging.warning(f"Gemini response has no parts or is empty. Response: {response}")
-                if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason != 0:
-                    logging.error(f"Gemini blocked prompt: {response.prompt_feedback}")
-                    return "I'm sorry, I cannot process that request due to safety concerns."
-                if response and (not hasattr(response, 'candidates') or not response.candidates or not hasattr(response.candidates[0], 'content') or not response.candidates[0].content.parts):
-                    logging.error("Gemini response has candidates but no content parts.")
-                    return "I received an empty response from the AI. Could you please try again or rephrase?"
-                return "I couldn't get a valid response from the AI. Please try again."
-
-            final_text = ""
-            tool_calls = []
-
-            # Process the model's initial response
-            for part in response.parts:
-                if part.function_call:
-                    tool_calls.append(part.function_call)
-                # Only accumulate text parts that are not tool code
-                if hasattr(part, 'text') and part.text and not part.text.strip().startswith('```tool_code'):
-                    final_text += part.text
-
-            # Step 2: If tool calls are present, execute them
-            if tool_calls:
-                tool_responses = []
-                for fc in tool_calls:
-                    func_name = fc.name
-                    args = {key: value for key, value in fc.args.items()}
-                    logging.info(f"AI requested function call: {func_name} with args: {args} for user {user_id}")
-
-                    if func_name in available_functions:
-                        try:
-                            # Execute the function using the mapping
-                            function_result = available_functions[func_name](**args)
-                            logging.info(f"Function {func_name} execution result: {function_result} for user {user_id}")
-
-                            # Prepare the tool response for the model
-                            tool_response_content = {"result": function_result}
-
-                            # Special handling for PDF generation response
-                            if func_name == 'generate_pdf_report' and isinstance(function_result, str):
-                                tool_response_content = {"result": f"PDF report generated successfully. Filename: {function_result}"}
-
-                            tool_responses.append({
-                                "function_response": {
-                                    "name": func_name,
-                                    "response": tool_response_content
-                                }
-                            })
-
-                        except Exception as e:
-                            logging.error(f"Error executing function {func_name} locally for user {user_id}: {str(e)}", exc_info=True)
-                            tool_responses.append({
-                                "function_response": {
-                                    "name": func_name,
-                                    "response": {"error": f"Execution error: {str(e)}"}
-                                }
-                            })
-                    else:
-                        logging.error(f"Unknown function requested by AI for user {user_id}: {func_name}")
-                        tool_responses.append({
-                            "function_response": {
-                                "name": func_name,
-                                "response": {"error": f"Unknown function: {func_name}"}
-                            }
-                        })
-
-                # Step 3: Send the tool results back to the model for the final response
-                if tool_responses:
-                    logging.info(f"Sending tool responses back to AI for user {user_id}: {tool_responses}")
-                    try:
-                        response = chat.send_message(
-                            tool_responses,
-                            generation_config={
-                                'temperature': 0.1,  # Lower temperature for more precise responses
-                                'top_p': 0.8,
-                                'top_k': 40
-                            }
-                        )
-                        final_text = ""
-                        if response and response.parts:
-                            for part in response.parts:
-                                if hasattr(part, 'text') and part.text and not part.text.strip().startswith('```tool_code'):
-                                    final_text += part.text
-                        else:
-                            logging.warning(f"AI response after tool execution has no parts or is empty for user {user_id}. Response: {response}")
-                            if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason != 0:
-                                return "I'm sorry, I cannot provide a summary for that due to safety concerns after the action."
-                            final_text = "I executed the requested action, but I couldn't formulate a summary. Please check the relevant dashboard sections."
-
-                    except google.api_core.exceptions.GoogleAPIError as e:
-                        logging.error(f"Google API Error after tool execution during send_message for user {user_id}: {str(e)}", exc_info=True)
-                        if isinstance(e, google.api_core.exceptions.ResourceExhausted):
-                            return "AI Assistant Error: My capabilities are currently exhausted. Please try again in a few minutes."
-                        return f"An API error occurred while formulating the response after the action: {str(e)}"
-                    except Exception as e:
-                        logging.error(f"Unexpected error after tool execution during send_message for user {user_id}: {str(e)}", exc_info=True)
-                        final_text = f"An unexpected error occurred after executing the requested functions: {str(e)}"
-
-            # Step 4: Return the final text response to the user
-            if not final_text: # Fallback if AI gives no text response at any stage, even after tool calls
-                logging.warning(f"AI final response text is empty for user {user_id}. Tool calls attempted: {len(tool_calls)}")
-                if tool_calls: # If tools were attempted but no final text was generated after
-                    executed_func_names = ", ".join([tc['function_response']['name'] for tc in tool_responses if 'function_response' in tc])
-                    final_text = f"I attempted to execute the requested actions ({executed_func_names}), but I couldn't formulate a detailed summary. Please check the relevant dashboard sections."
-                elif query_text.strip().lower() in ["hey", "hi", "hello", "how are you", "what's up"]: # Simple greetings
-                    final_text = "Hello! I'm your financial assistant. How can I help you today?"
-                else: # Generic fallback for unhandled queries
-                    final_text = "I received your message, but I'm not sure how to help with that. Could you please rephrase or ask a specific financial question?"
-
-            logging.info(f"Final AI response to user {user_id}: {final_text}")
-            return final_text
+            next(events)
+        except StopIteration as stop:
+            return stop.value
 
-        except google.api_core.exceptions.GoogleAPIError as e:
-            logging.error(f"Google API Error during send_message: {str(e)}", exc_info=True)
-            if isinstance(e, google.api_core.exceptions.ResourceExhausted):
-                return "AI Assistant Error: My capabilities are currently exhausted. Please try again in a few minutes."
-            if isinstance(e, google.api_core.exceptions.PermissionDenied) or isinstance(e, google.api_core.exceptions.Unauthenticated):
-                return "AI Assistant Error: There seems to be an issue with the API key or permissions."
-            if isinstance(e, google.api_core.exceptions.InvalidArgument):
-                return f"AI Assistant Error: Invalid arguments provided to the AI model. Details: {str(e)}"
-            return f"An API error occurred while processing your request: {str(e)}"
-        except Exception as e:
-            logging.error(f"Unexpected error during initial send_message: {str(e)}", exc_info=True)
-            return f"An unexpected error occurred: {str(e)}"
 
+def _chat_turn(user_id: int, query_text: str, stream: bool = False):
+    """Generator behind handle_ai_query/stream_ai_query: yields progress events, returns the stored response."""
+    # Check if AI is enabled via app configuration
+    if not current_app.config.get('AI_ENABLED'):
+        logging.warning("AI Assistant is disabled by configuration.")
+        response = "AI Assistant is not available: API key not configured."
+        record_chat(user_id, query_text, response)
+        return response
+
+    try:
+        # Shared model with pre-converted tools and generation config (see init_ai)
+        model = get_chat_model()
+        max_turns = current_app.config.get('CHAT_SESSION_MAX_TURNS', 20)
+        token_budget = current_app.config.get('CHAT_SESSION_TOKEN_BUDGET', 8000)
+
+        # The user's session from the bounded store, held under their lock for the whole exchange.
+        # If another worker stored a newer turn than this session has seen, it is rebuilt from chat history
+        # (the newest stored turn is looked up once the lock is held).
+        with chat_session(
+            user_id,
+            lambda: model.start_chat(history=load_session_history(user_id, max_turns, token_budget)),
+            partial(get_latest_chat_timestamp, user_id)
+        ) as session:
+            turn_start = len(session.chat.history)
+            final_text = yield from _converse(user_id, session.chat, query_text, stream)
+            session.synced_at = record_chat(user_id, query_text, final_text, _turn_tool_parts(session.chat, turn_start))
+            return final_text
+
+    except TimeoutError:
+        logging.warning(f"Chat session for user {user_id} is busy; rejecting concurrent message")
+        response = "I'm still working on your previous message. Please wait a moment and try again."
     except Exception as e:
         # Catch any remaining unexpected errors during the overall process
         logging.error(f"General AI Query handling error for user {user_id}: {str(e)}", exc_info=True)
         # Provide a generic error message to the user
-        return "An unexpected error occurred while processing your request with the AI assistant."
\ No newline at end of file
+        response = "An unexpected error occurred while processing your request with the AI assistant."
+    record_chat(user_id, query_text, response)
+    return response
+
+
+def _turn_tool_parts(chat, turn_start: int) -> list:
+    """Returns this turn's tool call/response messages (as JSON-able dicts) from the chat history."""
+    try:
+        contents = chat.history[turn_start:]
+    except (generation_types.BrokenResponseError, generation_types.IncompleteIterationError):
+        return []
+    return [
+        type(content).to_dict(content) for content in contents
+        if any(part.function_call or part.function_response for part in content.parts)
+    ]
+
+
+def _is_answer_text(part) -> bool:
+    """True for text parts that belong in the answer (not tool code echoed by the model)."""
+    return bool(getattr(part, 'text', None)) and not part.text.strip().startswith('```tool_code')
+
+
+def _send(chat, content, stream: bool, deadline: float = None, **kwargs):
+    """
+    Sends a message on the chat session and returns the complete response. With stream=True the response is
+    requested incrementally and ('text', ...) events are yielded for answer text as each chunk arrives;
+    iterating every chunk also commits the exchange to the chat history.
+    The request timeout is the time left before deadline (if any); with less than MIN_MODEL_SECONDS left the
+    request is not made and DeadlineExceeded is raised, as if the model had not answered in time.
+    """
+    remaining = remaining_time(deadline)
+    if remaining is not None:
+        if remaining < MIN_MODEL_SECONDS:
+            raise google.api_core.exceptions.DeadlineExceeded(f"Only {remaining:.2f}s of the turn's time budget left for the model request")
+        kwargs['request_options'] = {'timeout': remaining}
+    _count_turn('llm_round_trips')
+    response = chat.send_message(content, stream=stream, **kwargs)
+    if stream:
+        for chunk in response:
+            candidates = chunk.candidates
+            for part in (candidates[0].content.parts if candidates else []):
+                if _is_answer_text(part):
+                    yield 'text', {'text': part.text}
+    return response
+
+
+def _tool_response(func_name: str, content: dict) -> dict:
+    """Builds the function_response message sent back to the model for one tool call."""
+    return {
+        "function_response": {
+            "name": func_name,
+            "response": content
+        }
+    }
+
+
+def _run_tool(user_id: int, func_name: str, args: dict) -> dict:
+    """Executes one tool call and returns its function_response message for the model (errors included)."""
+    if func_name not in TOOL_FUNCTIONS:
+        logging.error(f"Unknown function requested by AI for user {user_id}: {func_name}")
+        return _tool_response(func_name, {"error": f"Unknown function: {func_name}"})
+
+    try:
+        # Execute the function using the static dispatch table
+        function_result = TOOL_FUNCTIONS[func_name](user_id, **args)
+        logging.info(f"Function {func_name} execution result: {function_result} for user {user_id}")
+
+        # Prepare the tool response for the model
+        tool_response_content = {"result": function_result}
+
+        # Special handling for PDF generation response
+        if func_name == 'generate_pdf_report' and isinstance(function_result, str):
+            tool_response_content = {"result": f"PDF report generated successfully. Filename: {function_result}"}
+
+        return _tool_response(func_name, tool_response_content)
+
+    except Exception as e:
+        logging.error(f"Error executing function {func_name} locally for user {user_id}: {str(e)}", exc_info=True)
+        return _tool_response(func_name, {"error": f"Execution error: {str(e)}"})
+
+
+def _converse(user_id: int, chat, query_text: str, stream: bool = False):
+    """
+    Runs one user message through the chat session as a bounded agent loop: requested tool calls are executed
+    and their results sent back until the model answers with text, for at most AI_MAX_TOOL_ROUNDS rounds and
+    within the AI_TURN_BUDGET_SECONDS wall-clock budget (passed on to tools, HTTP calls and the model requests).
+    Generator: yields ('text', ...) events while streaming and ('status', ...) events around tool calls;
+    returns the final response text, a partial answer if the limits were reached.
+    However the turn ends, function calls the model made are left answered in the chat history.
+    """
+    pending = [] # Responses to the model's latest function calls that it has not received yet
+    answer = None
+    try:
+        answer = yield from _agent_loop(user_id, chat, query_text, stream, pending)
+        return answer
+    finally:
+        if pending:
+            try:
+                _close_turn(chat, pending, answer or "(This answer was interrupted.)")
+            except Exception as e:
+                logging.error(f"Could not close the interrupted turn for user {user_id}: {str(e)}", exc_info=True)
+
+
+def _agent_loop(user_id: int, chat, query_text: str, stream: bool, pending: list):
+    """
+    The loop behind _converse. pending holds the response to every function call of the current round from
+    the moment the model asks for it (an error until the call has run) until the model receives it.
+    """
+    logging.info(f"User {user_id} query sent to Gemini: {query_text}")
+    max_rounds = current_app.config.get('AI_MAX_TOOL_ROUNDS', 5)
+    budget = current_app.config.get('AI_TURN_BUDGET_SECONDS', 30)
+    deadline = time.monotonic() + budget if budget else None
+
+    # Step 1: Send the user query to the model for analysis and potential tool call
+    try:
+        # Current date/weekday/timezone go in with the message, so the model does not have to call
+        # get_current_datetime (one extra model round trip) before resolving 'yesterday' or 'last month'
+        current_datetime = get_current_datetime()
+        logging.info(f"Current datetime for user {user_id}: {current_datetime}")
+        time_context = format_time_context(current_datetime)
+        _count_turn('turns')
+
+        # Send the query (tools and generation config come from the shared model)
+        response = yield from _send(chat, [time_context, query_text] if time_context else query_text, stream, deadline)
+
+        # Check for empty or invalid response
+        if not response or not response.parts:
+            logging.warning(f"Gemini response has no parts or is empty. Response: {response}")
+            if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason != 0:
+                logging.error(f"Gemini blocked prompt: {response.prompt_feedback}")
+                return "I'm sorry, I cannot process that request due to safety concerns."
+            if response and (not hasattr(response, 'candidates') or not response.candidates or not hasattr(response.candidates[0], 'content') or not response.candidates[0].content.parts):
+                logging.error("Gemini response has candidates but no content parts.")
+                return "I received an empty response from the AI. Could you please try again or rephrase?"
+            return "I couldn't get a valid response from the AI. Please try again."
+
+        # Process the model's initial response
+        final_text, tool_calls = _read_response(response)
+        executed = [] # Names of the tools that ran to completion this turn
+        rounds = 0
+
+        # Step 2: Execute tool calls round after round until the model answers with text
+        while tool_calls:
+            calls = []
+            for fc in tool_calls:
+                func_name = fc.name
+                args = _to_plain(fc.args) # Nested arrays/objects arrive as proto containers
+                logging.info(f"AI requested function call: {func_name} with args: {args} for user {user_id}")
+                calls.append((func_name, args))
+            pending[:] = [_tool_response(func_name, {"error": "Not executed: the turn ended first."}) for func_name, _ in calls]
+
+            if rounds == 0:
+                tool_names = {func_name for func_name, _ in calls}
+                if 'get_current_datetime' in tool_names:
+                    _count_turn('datetime_fallbacks')
+                elif time_context and any(_uses_date_arguments(args) for _, args in calls):
+                    # Dates resolved straight away: the old flow needed a get_current_datetime round trip first
+                    _count_turn('saved_round_trips')
+                    logging.info(f"Time context saved a get_current_datetime round trip for user {user_id}")
+
+            if rounds >= max_rounds or deadline_expired(deadline):
+                reason = 'time budget exhausted' if deadline_expired(deadline) else f'limit of {max_rounds} tool rounds reached'
+                logging.warning(f"Stopping tool loop for user {user_id}: {reason}; skipped {[name for name, _ in calls]}")
+                _count_turn('round_limit_hits' if rounds >= max_rounds else 'budget_exhausted')
+                pending[:] = [_tool_response(func_name, {"error": f"Not executed: {reason}."}) for func_name, _ in calls]
+                return (yield from _wrap_up(user_id, chat, pending, final_text, executed, deadline, stream))
+
+            rounds += 1
+            _count_turn('tool_rounds')
+            for func_name, _ in calls:
+                yield 'status', {'tool': func_name, 'state': 'running'}
+
+            # Independent read-only calls run concurrently; responses go back to the model in the order it asked
+            for index, tool_response in run_tool_calls([
+                (partial(_run_tool, user_id, func_name, args), func_name in PARALLEL_SAFE_TOOLS)
+                for func_name, args in calls
+            ], deadline):
+                if isinstance(tool_response, TimeoutError):
+                    tool_response = _tool_response(calls[index][0], {"error": f"Not completed: {str(tool_response)}."})
+                else:
+                    executed.append(calls[index][0])
+                pending[index] = tool_response
+                state = 'error' if 'error' in tool_response['function_response']['response'] else 'done'
+                yield 'status', {'tool': calls[index][0], 'state': state}
+
+            if deadline_expired(deadline):
+                logging.warning(f"Time budget exhausted for user {user_id} after {rounds} tool round(s)")
+                _count_turn('budget_exhausted')
+                return (yield from _wrap_up(user_id, chat, pending, final_text, executed, deadline, stream))
+
+            # Step 3: Send the tool results back to the model (it may answer or ask for more tools)
+            logging.info(f"Sending tool responses back to AI for user {user_id}: {pending}")
+            try:
+                response = yield from _send(chat, list(pending), stream, deadline)
+                pending.clear() # Delivered: the model's calls are answered in the history
+                if response and response.parts:
+                    final_text, tool_calls = _read_response(response)
+                else:
+                    logging.warning(f"AI response after tool execution has no parts or is empty for user {user_id}. Response: {response}")
+                    if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason != 0:
+                        return "I'm sorry, I cannot provide a summary for that due to safety concerns after the action."
+                    final_text = "I executed the requested action, but I couldn't formulate a summary. Please check the relevant dashboard sections."
+                    tool_calls = []
+
+            except google.api_core.exceptions.GoogleAPIError as e:
+                logging.error(f"Google API Error after tool execution during send_message for user {user_id}: {str(e)}", exc_info=True)
+                if isinstance(e, google.api_core.exceptions.ResourceExhausted):
+                    return "AI Assistant Error: My capabilities are currently exhausted. Please try again in a few minutes."
+                if isinstance(e, google.api_core.exceptions.DeadlineExceeded):
+                    # The model did not answer within the budget: keep the tool results and return what we have
+                    _count_turn('budget_exhausted')
+                    return _partial_answer(final_text, executed)
+                return f"An API error occurred while formulating the response after the action: {str(e)}"
+            except Exception as e:
+                logging.error(f"Unexpected error after tool execution during send_message for user {user_id}: {str(e)}", exc_info=True)
+                final_text = f"An unexpected error occurred after executing the requested functions: {str(e)}"
+                tool_calls = []
+
+        # Step 4: Return the final text response to the user
+        if not final_text: # Fallback if AI gives no text response at any stage, even after tool calls
+            logging.warning(f"AI final response text is empty for user {user_id}. Tool rounds run: {rounds}")
+            if executed: # If tools were run but no final text was generated after
+                final_text = f"I attempted to execute the requested actions ({', '.join(executed)}), but I couldn't formulate a detailed summary. Please check the relevant dashboard sections."
+            elif query_text.strip().lower() in ["hey", "hi", "hello", "how are you", "what's up"]: # Simple greetings
+                final_text = "Hello! I'm your financial assistant. How can I help you today?"
+            else: # Generic fallback for unhandled queries
+                final_text = "I received your message, but I'm not sure how to help with that. Could you please rephrase or ask a specific financial question?"
+
+        logging.info(f"Final AI response to user {user_id} after {rounds} tool round(s): {final_text}")
+        return final_text
+
+    except google.api_core.exceptions.GoogleAPIError as e:
+        logging.error(f"Google API Error during send_message: {str(e)}", exc_info=True)
+        if isinstance(e, google.api_core.exceptions.ResourceExhausted):
+            return "AI Assistant Error: My capabilities are currently exhausted. Please try again in a few minutes."
+        if isinstance(e, google.api_core.exceptions.PermissionDenied) or isinstance(e, google.api_core.exceptions.Unauthenticated):
+            return "AI Assistant Error: There seems to be an issue with the API key or permissions."
+        if isinstance(e, google.api_core.exceptions.InvalidArgument):
+            return f"AI Assistant Error: Invalid arguments provided to the AI model. Details: {str(e)}"
+        if isinstance(e, google.api_core.exceptions.DeadlineExceeded):
+            return "AI Assistant Error: The AI took too long to respond. Please try again."
+        return f"An API error occurred while processing your request: {str(e)}"
+    except Exception as e:
+        logging.error(f"Unexpected error during initial send_message: {str(e)}", exc_info=True)
+        return f"An unexpected error occurred: {str(e)}"
+
+
+def _read_response(response) -> tuple[str, list]:
+    """Splits a model response into its answer text and its function calls."""
+    text = ""
+    tool_calls = []
+    for part in response.parts:
+        if part.function_call:
+            tool_calls.append(part.function_call)
+        # Only accumulate text parts that are not tool code
+        if _is_answer_text(part):
+            text += part.text
+    return text, tool_calls
+
+
+def _partial_answer(text: str, executed: list) -> str:
+    """The answer returned when a turn runs out of time: whatever the model said so far plus what was done."""
+    note = "I ran out of time before finishing this request"
+    if executed:
+        note += f" (completed: {', '.join(dict.fromkeys(executed))})"
+    note += ". Ask me again to pick up where I left off."
+    return f"{text}\n\n{note}" if text else note
+
+
+def _wrap_up(user_id: int, chat, pending: list, text: str, executed: list, deadline: float | None, stream: bool):
+    """
+    Ends a turn that hit the round limit or the time budget while the model still wanted tools.
+    With time left, the pending tool responses go back with function calling disabled, so the model answers from
+    what it has. Otherwise (or if that request fails) a partial answer is returned and _converse adds the responses
+    to the history locally, so the history stays a valid call/response sequence for the next message.
+    """
+    remaining = remaining_time(deadline)
+    if remaining is None or remaining >= MIN_MODEL_SECONDS:
+        try:
+            response = yield from _send(chat, list(pending), stream, deadline, tool_config=NO_FUNCTION_CALLS)
+            pending.clear()
+            answer, _ = _read_response(response) if response and response.parts else ("", [])
+            if answer:
+                return answer
+        except google.api_core.exceptions.GoogleAPIError as e:
+            logging.warning(f"Final model request failed for user {user_id}; returning a partial answer: {str(e)}")
+
+    partial_text = _partial_answer(text, executed)
+    logging.info(f"Partial AI response to user {user_id}: {partial_text}")
+    return partial_text
+
+
+def _close_turn(chat, tool_responses: list, partial_text: str) -> None:
+    """
+    Adds tool responses the model never received, then the partial answer, to the chat history, so the
+    model's last function calls are answered and the next message continues from a valid history.
+    """
+    try:
+        history = chat.history
+    except (generation_types.BrokenResponseError, generation_types.IncompleteIterationError):
+        chat.rewind() # Drop the failed request (a streamed response cut off by the timeout)
+        history = chat.history
+    chat.history = list(history) + [
+        protos.Content(role='user', parts=[protos.Part(tool_response) for tool_response in tool_responses]),
+        protos.Content(role='model', parts=[protos.Part(text=partial_text)])
+    ]
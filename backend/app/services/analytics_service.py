@@ -0,0 +1,176 @@
+# app/services/analytics_service.py
+import numpy as np
+import logging
+from datetime import datetime, date, timedelta
+
+from .. import db # Import the db instance
+from ..database import read_only # Routes read-only work to the replica bind
+from ..models import Transaction # Import models
+from .cache_service import TTLCache
+from .exchange_service import get_exchange_rates
+from .summary_cache_service import get_ledger_version, cached_summary
+
+TRANSACTION_TYPES = ('income', 'expense')
+
+# Rows fetched per round trip while loading a ledger into columns
+LOAD_BATCH_SIZE = 10000
+
+# Loaded frames keyed by (user_id, ledger version); frames for old versions age out of the LRU
+_frame_cache = TTLCache(maxsize=8, ttl=None, name='ledger_frames')
+
+
+class LedgerFrame:
+    """
+    Columnar, read-only snapshot of one user's transactions.
+    Each transaction is one position across parallel NumPy arrays; strings are stored as small integer codes.
+    """
+
+    def __init__(self, days, months, amounts, currency_codes, category_codes, type_codes, currencies, categories):
+        self.days = days # int64 proleptic ordinal day numbers (date.toordinal())
+        self.months = months # int32 month numbers (year * 12 + month - 1)
+        self.amounts = amounts # float64 amounts in the transaction currency
+        self.currency_codes = currency_codes # int16 index into self.currencies
+        self.category_codes = category_codes # int32 index into self.categories
+        self.type_codes = type_codes # int8 index into TRANSACTION_TYPES
+        self.currencies = currencies
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.days, self.months, self.amounts, self.currency_codes, self.category_codes, self.type_codes))
+
+    def mask(self, start_day: date | None, end_day: date | None, transaction_type: str = None):
+        """Boolean mask for transactions in [start_day, end_day) and, optionally, of one type."""
+        mask = np.ones(len(self), dtype=bool)
+        if start_day is not None:
+            mask &= self.days >= start_day.toordinal()
+        if end_day is not None:
+            mask &= self.days < end_day.toordinal()
+        if transaction_type:
+            mask &= self.type_codes == TRANSACTION_TYPES.index(transaction_type)
+        return mask
+
+    def converted_amounts(self, rates: dict):
+        """Amounts in the target currency: one gather of the per-currency rate vector and one multiply."""
+        rate_vector = np.array([rates[currency] for currency in self.currencies], dtype=np.float64)
+        return self.amounts * rate_vector[self.currency_codes]
+
+
+def init_analytics(app):
+    """Applies the configured number of resident ledger frames."""
+    _frame_cache.configure(maxsize=app.config.get('ANALYTICS_FRAME_CACHE_SIZE', 8))
+
+
+def get_frame_cache_stats() -> dict:
+    """Returns hit/miss/eviction counters for the resident ledger frames."""
+    return _frame_cache.stats()
+
+
+def load_ledger_frame(user_id: int) -> LedgerFrame:
+    """Returns the user's ledger as a LedgerFrame, loading it once per ledger version."""
+    version = get_ledger_version(user_id)
+    return _frame_cache.get_or_load((user_id, version), lambda: _load_frame(user_id))
+
+
+def _load_frame(user_id: int) -> LedgerFrame:
+    """Reads a user's transactions into NumPy columns, streaming rows from the database in batches."""
+    started = datetime.now()
+    query = db.session.query(
+        Transaction.date, Transaction.amount, Transaction.currency, Transaction.category, Transaction.type
+    ).filter(Transaction.user_id == user_id).execution_options(yield_per=LOAD_BATCH_SIZE)
+
+    days, months, amounts, currency_codes, category_codes, type_codes = [], [], [], [], [], []
+    currency_index, category_index = {}, {}
+    for tx_date, amount, currency, category, tx_type in query:
+        days.append(tx_date.toordinal())
+        months.append(tx_date.year * 12 + tx_date.month - 1)
+        amounts.append(amount)
+        currency_codes.append(currency_index.setdefault(currency.upper(), len(currency_index)))
+        category_codes.append(category_index.setdefault(category or 'Uncategorized', len(category_index)))
+        type_codes.append(TRANSACTION_TYPES.index(tx_type.lower()))
+
+    frame = LedgerFrame(
+        days=np.array(days, dtype=np.int64),
+        months=np.array(months, dtype=np.int32),
+        amounts=np.array(amounts, dtype=np.float64),
+        currency_codes=np.array(currency_codes, dtype=np.int16),
+        category_codes=np.array(category_codes, dtype=np.int32),
+        type_codes=np.array(type_codes, dtype=np.int8),
+        currencies=list(currency_index),
+        categories=list(category_index)
+    )
+    logging.info(f"Loaded ledger frame for user {user_id}: {len(frame)} rows, {frame.nbytes} bytes in {(datetime.now() - started).total_seconds():.3f}s")
+    return frame
+
+
+@read_only()
+def get_transaction_breakdown(user_id: int, transaction_type: str, start_date: str, end_date: str, group_by: str = 'category', target_currency: str = 'USD') -> dict | str:
+    """
+    Breaks down income or expenses for a date range (inclusive) by category or by month, in a target currency.
+    Computed with vectorized operations over the user's columnar ledger.
+    """
+    return cached_summary(
+        user_id, ('breakdown', transaction_type.lower(), start_date, end_date, (group_by or 'category').lower(), target_currency.upper()),
+        lambda: _compute_transaction_breakdown(user_id, transaction_type, start_date, end_date, group_by, target_currency)
+    )
+
+
+def _compute_transaction_breakdown(user_id: int, transaction_type: str, start_date: str, end_date: str, group_by: str, target_currency: str) -> dict | str:
+    """Computes get_transaction_breakdown without the summary cache."""
+    try:
+        transaction_type = transaction_type.lower()
+        if transaction_type not in TRANSACTION_TYPES:
+            return "Invalid transaction type. Must be 'income' or 'expense'."
+        group_by = (group_by or 'category').lower()
+        if group_by not in ('category', 'month'):
+            return "Invalid grouping. Must be 'category' or 'month'."
+
+        start_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_day = datetime.strptime(end_date, "%Y-%m-%d").date() + timedelta(days=1) # Inclusive end date
+        target_currency = target_currency.upper()
+
+        frame = load_ledger_frame(user_id)
+        mask = frame.mask(start_day, end_day, transaction_type)
+        if not mask.any():
+            return {'transaction_type': transaction_type, 'start_date': start_date, 'end_date': end_date,
+                    'currency': target_currency, 'total': 0.0, 'groups': []}
+
+        used_currencies = {frame.currencies[code] for code in np.unique(frame.currency_codes[mask])}
+        rates = get_exchange_rates(used_currencies - {target_currency}, target_currency) if used_currencies - {target_currency} else {}
+        if isinstance(rates, str):
+            return f"Could not calculate the breakdown in {target_currency} because currency conversion failed. (Exchange service message: {rates})"
+        rates[target_currency] = 1.0
+        rates = {currency: rates.get(currency, 0.0) for currency in frame.currencies} # Unused currencies do not matter
+        converted = frame.converted_amounts(rates)[mask]
+
+        if group_by == 'category':
+            sums = np.bincount(frame.category_codes[mask], weights=converted, minlength=len(frame.categories))
+            groups = [{'category': frame.categories[i], 'total': round(float(sums[i]), 2)} for i in np.flatnonzero(sums)]
+            groups.sort(key=lambda group: group['total'], reverse=True)
+        else:
+            months = frame.months[mask]
+            first_month = int(months.min())
+            sums = np.bincount(months - first_month, weights=converted)
+            groups = [
+                {'month': f"{(first_month + i) // 12:04d}-{(first_month + i) % 12 + 1:02d}", 'total': round(float(total), 2)}
+                for i, total in enumerate(sums)
+            ]
+
+        return {
+            'transaction_type': transaction_type,
+            'start_date': start_date,
+            'end_date': end_date,
+            'currency': target_currency,
+            'total': round(float(converted.sum()), 2),
+            'groups': groups
+        }
+
+    except ValueError as e:
+        logging.error(f"Date parsing error in get_transaction_breakdown for user {user_id}: {str(e)}")
+        return "Invalid date format. Please use YYYY-MM-DD for start and end dates."
+    except Exception as e:
+        logging.error(f"Error in get_transaction_breakdown for user {user_id}: {str(e)}", exc_info=True)
+        return f"An error occurred while calculating the breakdown: {str(e)}"
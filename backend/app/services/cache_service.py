@@ -0,0 +1,151 @@
+# app/services/cache_service.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """Tracks a single in-progress load so concurrent callers can wait on it."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe, process-wide LRU cache with an optional time-to-live per entry.
+    Concurrent misses for the same key are collapsed into a single load (single-flight).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, name: str = "cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at or None, value)
+        self._inflight = {} # key -> _InFlight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0 # Misses that waited on another caller's load instead of loading themselves
+
+    def configure(self, maxsize: int | None = None, ttl: float | None = None):
+        """
+        Updates size/TTL limits, evicting entries if the cache is now over capacity.
+        A limit passed as None is left unchanged; ttl=0 disables expiry.
+        """
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl or None
+            self._evict_overflow()
+
+    def _evict_overflow(self):
+        # Caller must hold the lock
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, key):
+        # Caller must hold the lock. Returns (found, value) and updates counters.
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key) # Mark as most recently used
+                self.hits += 1
+                return True, value
+            # Expired entry: drop it and treat as a miss
+            del self._data[key]
+            self.expirations += 1
+        self.misses += 1
+        return False, None
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if missing/expired."""
+        with self._lock:
+            found, value = self._lookup(key)
+        return value if found else default
+
+    def set(self, key, value, ttl: float | None = None):
+        """Stores a value, using the cache-wide TTL unless one is given explicitly."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict_overflow()
+
+    def pop(self, key, default=None):
+        """Removes a key from the cache and returns its value."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def clear(self):
+        """Drops every cached entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, should_cache=None):
+        """
+        Returns the cached value for key, calling loader() on a miss.
+        Only one caller runs loader() for a given key at a time; others wait for its result.
+        should_cache(value) can reject results (e.g. error messages) from being stored.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            flight = self._inflight.get(key)
+            if flight is not None:
+                is_leader = False
+                self.coalesced += 1
+            else:
+                is_leader = True
+                flight = _InFlight()
+                self._inflight[key] = flight
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            if should_cache is None or should_cache(flight.value):
+                self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the cache counters suitable for JSON output."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced_misses': self.coalesced,
+                'inflight': len(self._inflight),
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
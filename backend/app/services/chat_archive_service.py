@@ -0,0 +1,164 @@
+# app/services/chat_archive_service.py
+import json
+import zlib
+import logging
+import time as time_module
+from datetime import datetime, time, timedelta
+from flask import current_app # To access app.config
+
+from .. import db # Import the db instance
+from ..database import read_only # Routes read-only work to the replica bind
+from ..models import ChatHistory, ChatHistoryArchive # Import models
+
+# Archives are written once and read rarely, so favour ratio over speed
+ARCHIVE_COMPRESSION_LEVEL = 9
+
+# Longest date range one archive fetch may cover
+MAX_ARCHIVE_FETCH_DAYS = 31
+
+
+def _pack(entries: list) -> tuple[bytes, int]:
+    """Compresses a day's entries; returns (payload, uncompressed size)."""
+    raw = json.dumps(entries, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return zlib.compress(raw, ARCHIVE_COMPRESSION_LEVEL), len(raw)
+
+
+def _unpack(payload: bytes) -> list:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def archive_chat_history(older_than_days: int = None, batch_size: int = None) -> dict:
+    """
+    Moves chat history entries older than the retention age (whole UTC days) into ChatHistoryArchive,
+    one compressed row per user per day, then returns freed pages to the OS with an incremental VACUUM.
+    Works in batches, each moved and deleted in one transaction, so it can be interrupted and re-run safely.
+    Returns a summary report.
+    """
+    started = time_module.perf_counter()
+    if older_than_days is None:
+        older_than_days = current_app.config.get('CHAT_HISTORY_RETENTION_DAYS', 90)
+    batch_size = batch_size or current_app.config.get('CHAT_ARCHIVE_BATCH_SIZE', 5000)
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=older_than_days), time.min)
+
+    archived = 0
+    days_written = {} # (user_id, day) -> (uncompressed bytes, compressed bytes) of its archive row
+    while True:
+        entries = ChatHistory.query.filter(ChatHistory.timestamp < cutoff)\
+            .order_by(ChatHistory.user_id, ChatHistory.timestamp, ChatHistory.id)\
+            .limit(batch_size).all()
+        if not entries:
+            break
+
+        groups = {}
+        for entry in entries:
+            groups.setdefault((entry.user_id, entry.timestamp.date()), []).append({
+                'id': entry.id,
+                'message': entry.message,
+                'response': entry.response,
+                'tool_parts': entry.tool_parts, # JSON text of the turn's tool call/response messages, or None
+                'timestamp': entry.timestamp.isoformat()
+            })
+
+        try:
+            for (user_id, day), day_entries in groups.items():
+                archive = ChatHistoryArchive.query.filter_by(user_id=user_id, day=day).first()
+                if archive is None:
+                    archive = ChatHistoryArchive(user_id=user_id, day=day)
+                    db.session.add(archive)
+                else:
+                    # The day was split across batches (or runs): merge with what is already archived
+                    day_entries = _unpack(archive.payload) + day_entries
+                    day_entries.sort(key=lambda e: (e['timestamp'], e['id']))
+
+                archive.payload, archive.raw_bytes = _pack(day_entries)
+                archive.entry_count = len(day_entries)
+                archive.first_timestamp = datetime.fromisoformat(day_entries[0]['timestamp'])
+                archive.last_timestamp = datetime.fromisoformat(day_entries[-1]['timestamp'])
+                archive.archived_at = datetime.utcnow()
+                days_written[(user_id, day)] = (archive.raw_bytes, len(archive.payload))
+
+            ChatHistory.query.filter(ChatHistory.id.in_([entry.id for entry in entries])).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Chat history archival failed after {archived} entries: {str(e)}", exc_info=True)
+            raise
+
+        archived += len(entries)
+        db.session.expunge_all() # Archived entries no longer need to be tracked
+
+    raw_bytes = sum(raw for raw, _ in days_written.values())
+    compressed_bytes = sum(compressed for _, compressed in days_written.values())
+    freed_pages = reclaim_free_pages() if archived else 0
+    elapsed = time_module.perf_counter() - started
+    report = {
+        'archived': archived,
+        'archive_days': len(days_written),
+        'cutoff': cutoff.strftime('%Y-%m-%d'),
+        'compression_ratio': round(raw_bytes / compressed_bytes, 2) if compressed_bytes else None,
+        'freed_pages': freed_pages,
+        'elapsed_seconds': round(elapsed, 3)
+    }
+    logging.info(f"Archived {archived} chat history entries older than {report['cutoff']} into {len(days_written)} day(s) in {elapsed:.3f}s")
+    return report
+
+
+def reclaim_free_pages(max_pages: int = None) -> int:
+    """
+    Runs SQLite's incremental VACUUM to release free pages (e.g. left by archival) back to the filesystem.
+    Needs auto_vacuum=INCREMENTAL, which schema migration 3 enables. Returns the number of pages released.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return 0
+
+    max_pages = max_pages if max_pages is not None else current_app.config.get('SQLITE_INCREMENTAL_VACUUM_PAGES', 0)
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logging.warning("SQLite auto_vacuum is not INCREMENTAL; run `flask db-upgrade` to enable it. Free pages were not released.")
+            return 0
+        free_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        # 0 releases every free page. executescript() steps the pragma to completion; a plain execute()
+        # stops after the first step and only frees a single page.
+        cursor.executescript(f"PRAGMA incremental_vacuum({int(max_pages or 0)});")
+        free_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        cursor.close()
+    finally:
+        raw_connection.close()
+
+    logging.info(f"Incremental VACUUM released {free_before - free_after} free page(s)")
+    return free_before - free_after
+
+
+@read_only()
+def get_archived_chat_history(user_id: int, start_date: str, end_date: str) -> dict | str:
+    """Returns archived chat history entries for an inclusive UTC date range, decompressed, in chronological order."""
+    try:
+        start_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_day = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return "Invalid date format. Please use YYYY-MM-DD for start and end dates."
+    if end_day < start_day:
+        return "The end date must not be before the start date."
+    if (end_day - start_day).days >= MAX_ARCHIVE_FETCH_DAYS:
+        return f"Archived history can be fetched for at most {MAX_ARCHIVE_FETCH_DAYS} days at a time."
+
+    archives = ChatHistoryArchive.query.filter(
+        ChatHistoryArchive.user_id == user_id,
+        ChatHistoryArchive.day >= start_day,
+        ChatHistoryArchive.day <= end_day
+    ).order_by(ChatHistoryArchive.day).all()
+
+    history = []
+    for archive in archives:
+        for entry in _unpack(archive.payload):
+            history.append({
+                'id': entry['id'],
+                'message': entry['message'],
+                'response': entry['response'],
+                'tool_parts': json.loads(entry['tool_parts']) if entry.get('tool_parts') else None, # Absent from older archives
+                'timestamp': datetime.fromisoformat(entry['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            })
+    return {'start_date': start_date, 'end_date': end_date, 'history': history}
@@ -0,0 +1,253 @@
+# app/services/chat_history_service.py
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from datetime import datetime
+from flask import current_app # To access app.config
+from sqlalchemy import func
+
+from .. import db # Import the db instance
+from ..database import read_only, note_write # Replica routing and the read-your-writes window
+from ..models import ChatHistory # Import models
+from .pagination_service import keyset_page, decode_cursor
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind persistence for chat history.
+    Request threads put entries on a bounded in-process queue; one background thread drains it and
+    group-commits up to batch_size entries per transaction, at least every flush_interval seconds.
+    """
+
+    def __init__(self, maxsize: int = 1000, batch_size: int = 50, flush_interval: float = 0.2):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.app = None
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.sync_writes = 0 # Entries written on the request thread because the queue was full or disabled
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def configure(self, app, maxsize: int = None, batch_size: int = None, flush_interval: float = None):
+        """Binds the writer to an app (for its database) and applies size/interval limits."""
+        with self._lock:
+            self.app = app
+            if maxsize is not None and maxsize != self.maxsize and self._thread is None:
+                self.maxsize = maxsize
+                self._queue = queue.Queue(maxsize=maxsize)
+            if batch_size is not None:
+                self.batch_size = max(1, batch_size)
+            if flush_interval is not None:
+                self.flush_interval = max(0.001, flush_interval)
+
+    def submit(self, entry: dict) -> bool:
+        """Queues an entry for the background writer. Returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far has been written (or timeout). Returns True if drained."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0:
+                return True
+            time.sleep(0.005)
+        return self._queue.unfinished_tasks == 0
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drains the queue and stops the writer thread (registered with atexit)."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._stopping = True
+        thread.join(timeout)
+        if thread.is_alive():
+            logging.warning(f"Chat history writer did not drain within {timeout}s; {self._queue.qsize()} entries not written")
+        self._thread = None
+
+    def count_sync_write(self) -> None:
+        with self._lock:
+            self.sync_writes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_maxsize': self.maxsize,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'failed': self.failed,
+                'sync_writes': self.sync_writes,
+                'flushes': self.flushes,
+                'avg_batch_size': round(self.written / self.flushes, 1) if self.flushes else 0.0,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+                'max_flush_ms': round(self.max_flush_ms, 2)
+            }
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked worker (threads do not survive fork)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid() and self._pid is not None:
+                self._queue = queue.Queue(maxsize=self.maxsize) # Entries queued in the parent belong to the parent
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='chat-history-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+
+            # Group commit: keep collecting until the batch is full or the flush interval has passed
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and not self._stopping:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(ChatHistory.__table__.insert(), batch)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.written += len(batch)
+                self.flushes += 1
+                self.last_flush_ms = elapsed_ms
+                self._total_flush_ms += elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(batch)
+            logging.error(f"Chat history writer failed to store {len(batch)} entries: {str(e)}", exc_info=True)
+
+
+_writer = ChatHistoryWriter()
+atexit.register(_writer.stop)
+
+
+def init_chat_history_writer(app):
+    """Applies the configured queue size, batch size and flush interval to the chat history writer."""
+    _writer.configure(
+        app,
+        maxsize=app.config.get('CHAT_HISTORY_QUEUE_SIZE', 1000),
+        batch_size=app.config.get('CHAT_HISTORY_BATCH_SIZE', 50),
+        flush_interval=app.config.get('CHAT_HISTORY_FLUSH_MS', 200) / 1000
+    )
+
+
+def get_chat_history_writer_stats() -> dict:
+    """Returns queue depth, flush latency and throughput counters for the chat history writer."""
+    return _writer.stats()
+
+
+def flush_chat_history(timeout: float = 5.0) -> bool:
+    """Waits until every queued chat history entry has been written."""
+    return _writer.flush(timeout)
+
+
+def record_chat(user_id: int, message: str, response: str, tool_parts: list = None) -> datetime:
+    """
+    Stores a chat exchange, with the turn's tool call/response messages (JSON-able dicts) if any.
+    Normally queued for the background writer so the request does not wait on a commit;
+    written synchronously when write-behind is disabled or the queue is full.
+    Returns the entry's timestamp.
+    """
+    entry = {
+        'user_id': user_id,
+        'message': message,
+        'response': response,
+        'tool_parts': json.dumps(tool_parts, separators=(',', ':')) if tool_parts else None,
+        'timestamp': datetime.utcnow()
+    }
+
+    if current_app.config.get('CHAT_HISTORY_WRITE_BEHIND', True) and _writer.submit(entry):
+        note_write() # The writer thread commits it shortly: keep this client's reads on the primary meanwhile
+        return entry['timestamp']
+
+    try:
+        db.session.add(ChatHistory(**entry))
+        db.session.commit()
+        _writer.count_sync_write()
+        logging.info(f"Chat history stored synchronously for user {user_id}")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error storing chat history for user {user_id}: {str(e)}", exc_info=True)
+    return entry['timestamp']
+
+
+def get_latest_chat_timestamp(user_id: int) -> datetime | None:
+    """Returns the timestamp of the user's newest stored chat entry (one index lookup), or None."""
+    return db.session.query(func.max(ChatHistory.timestamp)).filter(ChatHistory.user_id == user_id).scalar()
+
+
+def get_recent_turns(user_id: int, limit: int) -> list:
+    """Returns the user's newest `limit` chat entries, newest first, read from the primary."""
+    return ChatHistory.query.filter(ChatHistory.user_id == user_id)\
+        .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())\
+        .limit(limit).all()
+
+
+@read_only()
+def get_chat_history_page(user_id: int, limit: int, before: str = None) -> dict | str:
+    """
+    Returns one page of a user's chat history: the newest `limit` entries older than the `before` cursor
+    (or the newest overall), in chronological order for display, plus the cursor for the next older page.
+    """
+    cursor = decode_cursor(before) if before else None
+    if isinstance(cursor, str):
+        return cursor
+
+    query = ChatHistory.query.filter(ChatHistory.user_id == user_id)
+    entries, next_cursor = keyset_page(query, ChatHistory.timestamp, ChatHistory.id, limit, cursor)
+    return {
+        'history': [{
+            'id': entry.id,
+            'message': entry.message,
+            'response': entry.response,
+            'timestamp': entry.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        } for entry in reversed(entries)],
+        'next_cursor': next_cursor
+    }
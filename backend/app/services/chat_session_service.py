@@ -0,0 +1,259 @@
+# app/services/chat_session_service.py
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from google.generativeai import protos
+from google.generativeai.types import generation_types
+
+from .chat_history_service import get_recent_turns
+
+# Rough token estimate for rehydrated history: serialized bytes per token (no API round trip)
+BYTES_PER_TOKEN = 4
+
+
+class _SessionEntry:
+    """
+    One user's chat session plus the lock that serializes that user's requests.
+    chat is None until the first request holding the lock builds it.
+    synced_at is the timestamp of the newest stored chat entry the session reflects; a newer stored entry
+    means another worker (or the statement importer) has moved the conversation on.
+    """
+
+    def __init__(self, chat=None, synced_at=None):
+        self.chat = chat
+        self.synced_at = synced_at
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class ChatSessionStore:
+    """
+    Process-wide store of per-user Gemini chat sessions.
+    Bounded by an LRU on the number of sessions and an idle TTL; each session's history is capped at the
+    last max_turns user turns. A per-user lock serializes concurrent requests for the same user (gthread
+    workers), while different users proceed in parallel.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float | None = 1800, max_turns: int = 20, lock_timeout: float = 60):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.lock_timeout = lock_timeout
+        self._sessions = OrderedDict() # user_id -> _SessionEntry, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.trimmed_messages = 0
+        self.stale_reloads = 0 # Sessions rebuilt because stored history had moved past them
+
+    def configure(self, max_sessions: int = None, idle_ttl: float | None = None, max_turns: int = None, lock_timeout: float = None):
+        """Updates the limits, evicting sessions if the store is now over capacity."""
+        with self._lock:
+            if max_sessions is not None:
+                self.max_sessions = max_sessions
+            self.idle_ttl = idle_ttl
+            if max_turns is not None:
+                self.max_turns = max_turns
+            if lock_timeout is not None:
+                self.lock_timeout = lock_timeout
+            self._evict()
+
+    @contextmanager
+    def session(self, user_id, factory, latest_turn_at=None):
+        """
+        Yields the user's session entry (.chat, .synced_at) while holding the user's lock, creating the chat
+        with factory() if it is missing, expired, or older than latest_turn_at (the newest stored entry's
+        timestamp, or a function returning it, called once the lock is held).
+        The history is trimmed to the turn cap when the block exits.
+        Raises TimeoutError if another request for the same user holds the lock for longer than lock_timeout.
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            entry = self._checkout(user_id)
+            if not entry.lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise TimeoutError(f"Chat session for user {user_id} is busy")
+            with self._lock:
+                if self._sessions.get(user_id) is entry:
+                    break # Locked entries are never evicted, so this one stays current until released
+            entry.lock.release() # Evicted or replaced while waiting for the lock; retry with the current entry
+        try:
+            self._refresh(entry, factory, latest_turn_at() if callable(latest_turn_at) else latest_turn_at)
+            yield entry
+        finally:
+            try:
+                if entry.chat is not None:
+                    self._trim(entry.chat)
+            finally:
+                entry.last_used = time.monotonic()
+                entry.lock.release()
+
+    def reset(self, user_id) -> None:
+        """Drops a user's session (the next message starts a fresh conversation)."""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def _checkout(self, user_id) -> _SessionEntry:
+        """Returns the user's entry, adding an empty one (built later under its lock) if there is none."""
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                entry = _SessionEntry()
+                self._sessions[user_id] = entry
+                self._evict()
+            else:
+                self._sessions.move_to_end(user_id)
+            return entry
+
+    def _refresh(self, entry, factory, latest_turn_at=None) -> None:
+        # Caller must hold entry.lock, so expiry, staleness and the rebuild are decided by one request at a time
+        reason = None
+        if entry.chat is not None and self._expired(entry):
+            reason = 'expirations'
+        elif entry.chat is not None and latest_turn_at is not None and (entry.synced_at is None or latest_turn_at > entry.synced_at):
+            reason = 'stale_reloads'
+        if entry.chat is not None and reason is None:
+            with self._lock:
+                self.hits += 1
+            entry.last_used = time.monotonic()
+            return
+
+        with self._lock:
+            self.misses += 1
+            if reason:
+                setattr(self, reason, getattr(self, reason) + 1)
+        # A failed build leaves no chat behind, so the next request builds again instead of reusing the old one.
+        # Built outside the store lock (the factory may read history from the database), under the user's lock.
+        entry.chat = None
+        entry.chat = factory()
+        entry.synced_at = latest_turn_at
+        entry.last_used = time.monotonic()
+
+    def _expired(self, entry) -> bool:
+        return bool(self.idle_ttl) and time.monotonic() - entry.last_used > self.idle_ttl
+
+    def _evict(self):
+        # Caller must hold the lock. Drops expired sessions, then least recently used ones over the limit.
+        # Sessions with a request in flight are skipped; the store may briefly exceed its limit instead.
+        for user_id, entry in list(self._sessions.items()):
+            if self._expired(entry) and not entry.lock.locked():
+                del self._sessions[user_id]
+                self.expirations += 1
+        for user_id, entry in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not entry.lock.locked():
+                del self._sessions[user_id]
+                self.evictions += 1
+
+    def _trim(self, chat) -> None:
+        """Keeps only the last max_turns user turns, cutting at a user text message so tool call/response pairs stay intact."""
+        try:
+            history = chat.history
+        except (generation_types.BrokenResponseError, generation_types.IncompleteIterationError):
+            chat.rewind() # Drop the broken last exchange rather than the whole session
+            history = chat.history
+
+        turn_starts = [
+            i for i, content in enumerate(history)
+            if content.role == 'user' and any(part.text for part in content.parts)
+        ]
+        if len(turn_starts) <= self.max_turns:
+            return
+        cut = turn_starts[-self.max_turns]
+        chat.history = history[cut:]
+        with self._lock:
+            self.trimmed_messages += cut
+
+    def stats(self) -> dict:
+        """Occupancy, hit/eviction counters and the approximate memory held by session histories."""
+        with self._lock:
+            entries = list(self._sessions.values())
+            stats = {
+                'sessions': len(entries),
+                'max_sessions': self.max_sessions,
+                'idle_ttl': self.idle_ttl,
+                'max_turns': self.max_turns,
+                'busy': sum(1 for entry in entries if entry.lock.locked()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'trimmed_messages': self.trimmed_messages,
+                'stale_reloads': self.stale_reloads
+            }
+        messages = history_bytes = 0
+        for entry in entries:
+            if entry.chat is None:
+                continue # Not built yet
+            history = entry.chat._history # Committed history only; reading .history can raise on a broken response
+            messages += len(history)
+            history_bytes += sum(type(content).pb(content).ByteSize() for content in history)
+        stats['history_messages'] = messages
+        stats['history_bytes'] = history_bytes
+        return stats
+
+
+def estimate_tokens(contents) -> int:
+    """Estimates the prompt tokens of history contents from their serialized size."""
+    return sum(type(content).pb(content).ByteSize() for content in contents) // BYTES_PER_TOKEN
+
+
+def build_session_history(turns, token_budget: int) -> list:
+    """
+    Rebuilds chat history contents from stored chat entries (newest first): for each turn the user message,
+    its tool call/response messages and the final answer. Keeps the newest whole turns that fit the token budget
+    and returns them in chronological order.
+    """
+    history = []
+    used = 0
+    for turn in turns:
+        contents = [protos.Content(role='user', parts=[protos.Part(text=turn.message)])]
+        if turn.tool_parts:
+            try:
+                contents += [protos.Content(part) for part in json.loads(turn.tool_parts)]
+            except (ValueError, TypeError) as e:
+                logging.warning(f"Skipping unreadable tool parts of chat entry {turn.id}: {str(e)}")
+        contents.append(protos.Content(role='model', parts=[protos.Part(text=turn.response or '(no response)')]))
+
+        cost = estimate_tokens(contents)
+        if used + cost > token_budget:
+            break
+        used += cost
+        history = contents + history
+    return history
+
+
+def load_session_history(user_id: int, max_turns: int, token_budget: int) -> list:
+    """Loads a user's recent conversation from chat history so any worker can continue it."""
+    started = time.perf_counter()
+    history = build_session_history(get_recent_turns(user_id, max_turns), token_budget)
+    logging.info(f"Rehydrated chat session for user {user_id}: {len(history)} messages (~{estimate_tokens(history)} tokens) in {time.perf_counter() - started:.3f}s")
+    return history
+
+
+_session_store = ChatSessionStore()
+
+
+def init_chat_sessions(app):
+    """Applies the configured session limits to the process-wide chat session store."""
+    _session_store.configure(
+        max_sessions=app.config.get('CHAT_SESSION_MAX', 1000),
+        idle_ttl=app.config.get('CHAT_SESSION_IDLE_TTL', 1800) or None, # 0 disables idle expiry
+        max_turns=app.config.get('CHAT_SESSION_MAX_TURNS', 20),
+        lock_timeout=app.config.get('CHAT_SESSION_LOCK_TIMEOUT', 60)
+    )
+
+
+def get_chat_session_stats() -> dict:
+    """Returns occupancy and memory figures for the chat session store."""
+    return _session_store.stats()
+
+
+def chat_session(user_id, factory, latest_turn_at=None):
+    """Context manager yielding the user's session entry under their lock (see ChatSessionStore.session)."""
+    return _session_store.session(user_id, factory, latest_turn_at)
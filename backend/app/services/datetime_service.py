@@ -1,20 +1,54 @@
 # app/services/datetime_service.py
 from datetime import datetime
+from zoneinfo import ZoneInfo
+from flask import current_app, has_app_context # To access app.config
 import logging
 
+def _aware_now() -> tuple[datetime, str]:
+    """Returns (the current time as an aware datetime, timezone name) for APP_TIMEZONE, or the server's local time."""
+    timezone_name = current_app.config.get('APP_TIMEZONE') if has_app_context() else None
+    if timezone_name:
+        return datetime.now(ZoneInfo(timezone_name)), timezone_name
+    dt = datetime.now().astimezone() # Server local time, with its zone abbreviation
+    return dt, dt.tzname()
+
+
+def now_in_app_timezone() -> datetime:
+    """
+    The current wall-clock time in the configured timezone (APP_TIMEZONE, or the server's local time), naive,
+    like the dates stored on transactions. Default dates then agree with the date the assistant is told.
+    """
+    try:
+        return _aware_now()[0].replace(tzinfo=None)
+    except Exception as e:
+        logging.error(f"Invalid APP_TIMEZONE, using server local time: {str(e)}")
+        return datetime.now()
+
+
 def get_current_datetime() -> dict:
     """
-    Get the current date and time using datetime.now().
+    Get the current date and time in the configured timezone (APP_TIMEZONE, or the server's local time).
     Returns a dictionary with date and time information suitable for AI tools.
     """
     try:
-        dt = datetime.now()
+        dt, timezone_name = _aware_now()
         return {
             'date': dt.strftime('%Y-%m-%d'),
             'time': dt.strftime('%H:%M'),
             'day_name': dt.strftime('%A'),
-            'timezone': 'Local' # Placeholder, replace with actual timezone logic if needed
+            'timezone': timezone_name,
+            'utc_offset': dt.strftime('%z')
         }
     except Exception as e:
         logging.error(f"Error getting current time: {str(e)}", exc_info=True)
-        return {"error": f"Error getting current time: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Error getting current time: {str(e)}"}
+
+
+def format_time_context(current_datetime: dict) -> str | None:
+    """Formats get_current_datetime() output as the context line sent with each chat message (None on error)."""
+    if 'error' in current_datetime:
+        return None
+    return (
+        f"[Context] Current date: {current_datetime['date']} ({current_datetime['day_name']}), "
+        f"time: {current_datetime['time']}, timezone: {current_datetime['timezone']} (UTC{current_datetime['utc_offset']})."
+    )
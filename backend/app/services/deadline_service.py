@@ -0,0 +1,43 @@
+# app/services/deadline_service.py
+# Per-request latency budget. A chat turn sets a wall-clock deadline around each tool call; tools and outbound
+# HTTP requests size their timeouts from the time left, so one slow dependency cannot hold the request past it.
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Shortest timeout handed to a blocking call, so an almost-spent budget still gets a well-formed request
+MIN_TIMEOUT_SECONDS = 0.5
+
+_deadline = ContextVar('request_deadline', default=None) # time.monotonic() value, or None for no budget
+
+
+@contextmanager
+def request_deadline(deadline: float | None):
+    """Runs the enclosed work under an absolute time.monotonic() deadline (None means no budget)."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time(deadline: float | None = None) -> float | None:
+    """Seconds left before deadline (the current request deadline by default), never negative; None without one."""
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def deadline_expired(deadline: float | None = None) -> bool:
+    """True once the deadline (the current request deadline by default) has passed."""
+    return remaining_time(deadline) == 0.0
+
+
+def budget_timeout(default: float) -> float:
+    """Timeout for a blocking call: default, capped at the time left in the current request budget."""
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    return max(min(default, remaining), MIN_TIMEOUT_SECONDS)
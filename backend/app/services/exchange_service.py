@@ -2,12 +2,221 @@
 import requests
 import logging
 from flask import current_app # To access app.config
+from datetime import datetime, date
+from .cache_service import TTLCache
+from .deadline_service import budget_timeout
+from .rate_history_service import record_rates, get_stored_rate, get_stored_rate_table
+
+# Process-wide cache of exchange rates keyed by (FROM, TO).
+# Limits are applied from app.config by init_rate_cache() when the app is created.
+_rate_cache = TTLCache(maxsize=512, ttl=3600, name='exchange_rates')
+
+
+def init_rate_cache(app):
+    """Applies the configured TTL and max size to the process-wide rate cache."""
+    _rate_cache.configure(
+        maxsize=app.config.get('EXCHANGE_RATE_CACHE_MAXSIZE', 512),
+        ttl=app.config.get('EXCHANGE_RATE_CACHE_TTL', 3600) # 0 disables expiry
+    )
+
+
+def get_rate_cache_stats() -> dict:
+    """Returns hit/miss/eviction counters for the exchange rate cache."""
+    return _rate_cache.stats()
+
+
+def clear_rate_cache():
+    """Drops all cached exchange rates (e.g. after changing API credentials)."""
+    _rate_cache.clear()
+
 
 def get_exchange_rate(from_currency: str, to_currency: str) -> float | str:
     """
-    Fetches the exchange rate between two currencies.
+    Fetches the exchange rate between two currencies, served from the rate cache when possible.
+    In 'table' mode the rate is derived locally from the cached base-currency rate table.
     Returns the rate as a float or an error message string.
     """
+    from_currency = from_currency.upper()
+    to_currency = to_currency.upper()
+
+    if from_currency == to_currency:
+        return 1.0
+
+    if current_app.config.get('EXCHANGE_RATE_MODE') == 'table':
+        rates = get_rate_table()
+        if isinstance(rates, str):
+            return rates # Error message from the table fetch
+        return _cross_rate(rates, from_currency, to_currency)
+
+    # Concurrent misses for the same pair share one upstream request; error strings are not cached
+    return _rate_cache.get_or_load(
+        (from_currency, to_currency),
+        lambda: _load_pair_rate(from_currency, to_currency),
+        should_cache=lambda rate: isinstance(rate, float)
+    )
+
+
+def get_exchange_rate_on(from_currency: str, to_currency: str, on_date) -> float | str:
+    """
+    Returns the exchange rate for a specific date (date object or YYYY-MM-DD string).
+    Answered from stored daily snapshots without network I/O when one exists;
+    otherwise falls back to the current rate.
+    """
+    if isinstance(on_date, str):
+        try:
+            on_date = datetime.strptime(on_date, "%Y-%m-%d").date()
+        except ValueError:
+            return "Invalid date format. Please use YYYY-MM-DD."
+    elif isinstance(on_date, datetime):
+        on_date = on_date.date()
+
+    rate = get_stored_rate(from_currency, to_currency, on_date)
+    if rate is not None:
+        return rate
+
+    if on_date < date.today():
+        logging.warning(f"No stored {from_currency.upper()}->{to_currency.upper()} rate on or before {on_date}; using the current rate instead.")
+    return get_exchange_rate(from_currency, to_currency)
+
+
+def get_exchange_rates(from_currencies, to_currency: str) -> dict | str:
+    """
+    Fetches rates from several currencies into one target currency.
+    In 'table' mode this costs at most one upstream request regardless of how many currencies are given.
+    Returns a dict of {FROM: rate} or the first error message string encountered.
+    """
+    to_currency = to_currency.upper()
+    rates = {}
+    for from_currency in {c.upper() for c in from_currencies}:
+        rate = get_exchange_rate(from_currency, to_currency)
+        if not isinstance(rate, float):
+            return rate
+        rates[from_currency] = rate
+    return rates
+
+
+def get_rate_table(base_currency: str = None) -> dict | str:
+    """
+    Returns the full {CURRENCY: rate} vector for a base currency from the /latest endpoint.
+    The table is cached like a single pair, so every cross rate shares one upstream request.
+    """
+    base_currency = (base_currency or current_app.config.get('EXCHANGE_RATE_BASE_CURRENCY', 'USD')).upper()
+    return _rate_cache.get_or_load(
+        ('table', base_currency),
+        lambda: _load_rate_table(base_currency),
+        should_cache=lambda table: isinstance(table, dict)
+    )
+
+
+def validate_currency_code(currency: str) -> str | None:
+    """
+    Returns an error message if currency is not a supported 3-letter code, or None if it is.
+    Supported codes are the ones in the base rate table; if that cannot be fetched, only the format is checked.
+    In 'pair' mode the table is never fetched: the stored snapshot is used, or just the format if there is none.
+    """
+    currency = (currency or '').strip().upper()
+    if len(currency) != 3 or not currency.isalpha():
+        return "Invalid currency code. Must be a 3-letter code (e.g., USD)."
+    if current_app.config.get('EXCHANGE_RATE_MODE') == 'pair':
+        rates = get_stored_rate_table(current_app.config.get('EXCHANGE_RATE_BASE_CURRENCY', 'USD'))
+    else:
+        rates = get_rate_table()
+    if isinstance(rates, dict) and currency not in rates:
+        return f"Currency code '{currency}' is not supported."
+    return None
+
+
+def _snapshot_max_age() -> float | None:
+    """Stored snapshots count as fresh for as long as an in-memory cache entry would."""
+    return current_app.config.get('EXCHANGE_RATE_CACHE_TTL') or None
+
+
+def _load_pair_rate(from_currency: str, to_currency: str) -> float | str:
+    """Resolves a pair rate from today's stored snapshot, then upstream, then any older snapshot."""
+    rate = get_stored_rate(from_currency, to_currency, max_age_seconds=_snapshot_max_age())
+    if rate is not None:
+        return rate
+
+    rate = _fetch_pair_rate(from_currency, to_currency)
+    if isinstance(rate, float):
+        record_rates(from_currency, {to_currency: rate})
+        return rate
+
+    # Upstream failed: keep conversions working from the most recent stored rate
+    stored_rate = get_stored_rate(from_currency, to_currency)
+    if stored_rate is not None:
+        logging.warning(f"Using stored {from_currency}->{to_currency} rate because the exchange rate API failed: {rate}")
+        return stored_rate
+    return rate
+
+
+def _load_rate_table(base_currency: str) -> dict | str:
+    """Resolves a base rate table from today's stored snapshot, then upstream, then any older snapshot."""
+    rates = get_stored_rate_table(base_currency, max_age_seconds=_snapshot_max_age())
+    if rates:
+        return rates
+
+    rates = _fetch_rate_table(base_currency)
+    if isinstance(rates, dict):
+        record_rates(base_currency, rates)
+        return rates
+
+    # Upstream failed: keep conversions working from the most recent stored table
+    stored_rates = get_stored_rate_table(base_currency)
+    if stored_rates:
+        logging.warning(f"Using stored {base_currency} rate table because the exchange rate API failed: {rates}")
+        return stored_rates
+    return rates
+
+
+def _cross_rate(rates: dict, from_currency: str, to_currency: str) -> float | str:
+    """Derives FROM->TO from a base rate table (base->FROM and base->TO)."""
+    from_rate = rates.get(from_currency)
+    to_rate = rates.get(to_currency)
+    if not from_rate or to_rate is None:
+        return f"One or both currency codes ('{from_currency}', '{to_currency}') are invalid or not supported."
+    return float(to_rate) / float(from_rate)
+
+
+def _fetch_rate_table(base_currency: str) -> dict | str:
+    """Requests the latest rates for a base currency from the exchange rate API."""
+    api_key = current_app.config.get('EXCHANGE_RATE_API_KEY')
+    api_url = current_app.config.get('EXCHANGE_RATE_API_URL')
+
+    if not current_app.config.get('EXCHANGE_RATE_API_ENABLED'):
+         logging.warning("Exchange rate service disabled by config.")
+         return "Exchange rate service is currently unavailable."
+
+    try:
+        url = f"{api_url}{api_key}/latest/{base_currency}"
+        response = requests.get(url, timeout=budget_timeout(10)) # Capped by the chat turn's remaining budget
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get('result') == 'success':
+            rates = {code.upper(): float(rate) for code, rate in data['conversion_rates'].items()}
+            logging.info(f"Fetched exchange rate table for {base_currency} ({len(rates)} currencies)")
+            return rates
+        else:
+            error_type = data.get('error-type', 'Unknown error')
+            logging.error(f"Exchange rate API responded with an error: {error_type} for base {base_currency}")
+            if error_type == 'unsupported-code':
+                return f"Base currency code '{base_currency}' is invalid or not supported."
+            return f"Could not fetch exchange rates: {error_type}"
+
+    except requests.Timeout:
+        logging.error("Exchange rate API request timed out.")
+        return "Exchange rate service timed out. Please try again."
+    except requests.RequestException as e:
+        logging.error(f"Exchange rate API error: {str(e)}", exc_info=True)
+        return f"Error fetching exchange rates: {str(e)}"
+    except Exception as e:
+        logging.error(f"An unexpected error occurred fetching exchange rate table: {str(e)}", exc_info=True)
+        return f"An unexpected error occurred with the exchange rate service."
+
+
+def _fetch_pair_rate(from_currency: str, to_currency: str) -> float | str:
+    """Requests a single pair rate from the exchange rate API."""
     api_key = current_app.config.get('EXCHANGE_RATE_API_KEY')
     api_url = current_app.config.get('EXCHANGE_RATE_API_URL')
 
@@ -16,13 +225,13 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> float | str:
          return "Exchange rate service is currently unavailable."
 
     try:
-        url = f"{api_url}{api_key}/pair/{from_currency.upper()}/{to_currency.upper()}"
-        response = requests.get(url, timeout=10)
+        url = f"{api_url}{api_key}/pair/{from_currency}/{to_currency}"
+        response = requests.get(url, timeout=budget_timeout(10)) # Capped by the chat turn's remaining budget
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         data = response.json()
 
         if data.get('result') == 'success':
-            return data['conversion_rate']
+            return float(data['conversion_rate'])
         else:
             error_type = data.get('error-type', 'Unknown error')
             logging.error(f"Exchange rate API responded with an error: {error_type} for {from_currency} to {to_currency}")
@@ -40,4 +249,4 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> float | str:
         return f"Error fetching exchange rate: {str(e)}"
     except Exception as e:
         logging.error(f"An unexpected error occurred fetching exchange rate: {str(e)}", exc_info=True)
-        return f"An unexpected error occurred with the exchange rate service."
\ No newline at end of file
+        return f"An unexpected error occurred with the exchange rate service."
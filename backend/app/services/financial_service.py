@@ -1,8 +1,17 @@
 # app/services/financial_service.py
 from .. import db # Import the db instance
 from ..models import Transaction, User # Import models
-from .exchange_service import get_exchange_rate # Import necessary services
-from datetime import datetime, timedelta
+from .exchange_service import get_exchange_rates # Import necessary services
+from .rollup_service import apply_to_rollups, sum_rollups
+from .rate_history_service import get_stored_rates # Historical rate snapshots for past months
+from .summary_cache_service import cached_summary, bump_ledger_version, get_ledger_version
+from .range_index_service import get_range_index, record_in_range_index
+from .pagination_service import keyset_page, decode_cursor
+from .datetime_service import now_in_app_timezone # "Today" in APP_TIMEZONE, the same day the assistant is told
+from ..database import read_only # Routes read-only work to the replica bind
+from flask import current_app # To access app.config
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, insert
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import csv
@@ -13,66 +22,158 @@ import logging
 def add_transaction(user_id: int, amount: float, currency: str, category: str, type: str, description: str, date: str = None, time: str = None) -> str:
     """Adds a new financial transaction to the database."""
     try:
-        # Get current datetime if no date/time provided for defaults
-        current_datetime = datetime.now()
-
-        # Parse date if provided
-        if date:
-            try:
-                # Ensure date is just the date part for combining
-                transaction_date = datetime.strptime(date, "%Y-%m-%d").date()
-            except ValueError:
-                return "Invalid date format. Please use YYYY-MM-DD."
-        else:
-            transaction_date = current_datetime.date()
-
-        # Parse time if provided
-        if time:
-            try:
-                # Ensure time is just the time part for combining
-                transaction_time = datetime.strptime(time, "%H:%M").time()
-            except ValueError:
-                return "Invalid time format. Please use HH:MM."
-        else:
-            transaction_time = current_datetime.time()
+        row = validate_transaction(user_id, amount, currency, category, type, description, date, time)
+        if isinstance(row, str):
+            return row # Validation error message
 
-        # Combine date and time
-        transaction_datetime = datetime.combine(transaction_date, transaction_time)
+        insert_transaction_batch(user_id, [row])
 
-        if type.lower() not in ['income', 'expense']:
-            return "Invalid transaction type. Must be 'income' or 'expense'."
+        # Format the response with date and time
+        formatted_datetime = row['date'].strftime("%Y-%m-%d %H:%M")
+        return f"{type.capitalize()} of {row['amount']:.2f} {row['currency']} for '{description}' added successfully at {formatted_datetime}."
 
-        if not currency or len(currency) != 3:
-            return "Invalid currency code. Must be a 3-letter code (e.g., USD)."
+    except Exception as e:
+        logging.error(f"Database error in add_transaction for user {user_id}: {str(e)}", exc_info=True)
+        return f"Failed to add transaction: {str(e)}"
 
-        # Ensure amount is positive; type dictates if it's added or subtracted later
-        amount = abs(float(amount))
 
-        transaction = Transaction(
-            user_id=user_id,
-            amount=amount, # Store as positive
-            currency=currency.upper(),
-            category=category,
-            type=type.lower(),
-            description=description,
-            date=transaction_datetime
-        )
-
-        db.session.add(transaction)
-        db.session.commit()
+def add_transactions(user_id: int, transactions: list) -> str:
+    """
+    Adds several transactions at once: all are validated first, then inserted in one DB transaction
+    with a single commit. Nothing is inserted if any item is invalid.
+    Each item has the same fields as add_transaction. Returns one compact summary string.
+    """
+    try:
+        if not transactions:
+            return "No transactions provided."
+
+        now = now_in_app_timezone() # One default timestamp for items without a date/time
+        rows, problems = [], []
+        for position, item in enumerate(transactions, start=1):
+            item = dict(item)
+            row = validate_transaction(
+                user_id, item.get('amount'), item.get('currency'), item.get('category'), item.get('type'),
+                item.get('description'), item.get('date'), item.get('time'), now=now
+            )
+            if isinstance(row, str):
+                problems.append(f"#{position}: {row}")
+            else:
+                rows.append(row)
 
-        # Format the response with date and time
-        formatted_datetime = transaction_datetime.strftime("%Y-%m-%d %H:%M")
-        return f"{type.capitalize()} of {amount:.2f} {currency.upper()} for '{description}' added successfully at {formatted_datetime}."
+        if problems:
+            return "No transactions were added because some were invalid. " + " ".join(problems)
+
+        insert_transaction_batch(user_id, rows)
+
+        # Compact confirmation: one short clause per item plus totals per type and currency
+        items = "; ".join(f"{row['type']} {row['amount']:.2f} {row['currency']} '{row['description']}' on {row['date'].strftime('%Y-%m-%d')}" for row in rows)
+        totals = {}
+        for row in rows:
+            key = (row['type'], row['currency'])
+            totals[key] = totals.get(key, 0.0) + row['amount']
+        totals_text = ", ".join(f"{tx_type} {amount:.2f} {currency}" for (tx_type, currency), amount in totals.items())
+        return f"Added {len(rows)} transactions: {items}. Totals: {totals_text}."
 
     except Exception as e:
-        logging.error(f"Database error in add_transaction for user {user_id}: {str(e)}", exc_info=True)
+        logging.error(f"Database error in add_transactions for user {user_id}: {str(e)}", exc_info=True)
+        return f"Failed to add transactions: {str(e)}"
+
+
+def validate_transaction(user_id: int, amount, currency: str, category: str, type: str, description: str, date: str = None, time: str = None, now: datetime = None) -> dict | str:
+    """
+    Validates and normalizes one transaction's fields.
+    Returns a row dict ready for insert_transaction_batch, or an error message string.
+    """
+    # Get current datetime if no date/time provided for defaults
+    current_datetime = now or now_in_app_timezone()
+
+    # Parse date if provided
+    if date:
+        try:
+            # Ensure date is just the date part for combining
+            transaction_date = datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            return "Invalid date format. Please use YYYY-MM-DD."
+    else:
+        transaction_date = current_datetime.date()
+
+    # Parse time if provided
+    if time:
+        try:
+            # Ensure time is just the time part for combining
+            transaction_time = datetime.strptime(time, "%H:%M").time()
+        except ValueError:
+            return "Invalid time format. Please use HH:MM."
+    else:
+        transaction_time = current_datetime.time()
+
+    # Combine date and time
+    transaction_datetime = datetime.combine(transaction_date, transaction_time)
+
+    if not type or type.lower() not in ['income', 'expense']:
+        return "Invalid transaction type. Must be 'income' or 'expense'."
+
+    if not currency or len(currency) != 3:
+        return "Invalid currency code. Must be a 3-letter code (e.g., USD)."
+
+    # Ensure amount is positive; type dictates if it's added or subtracted later
+    try:
+        amount = abs(float(amount))
+    except (TypeError, ValueError):
+        return "Invalid amount. Must be a number."
+    if amount != amount or amount == float('inf'): # Reject NaN and infinity
+        return "Invalid amount. Must be a finite number."
+
+    return {
+        'user_id': user_id,
+        'amount': amount, # Store as positive
+        'currency': currency.upper(),
+        'category': category,
+        'type': type.lower(),
+        'description': description,
+        'date': transaction_datetime
+    }
+
+
+def insert_transaction_batch(user_id: int, rows: list) -> int:
+    """
+    Inserts validated transaction rows (from validate_transaction) for one user in a single DB transaction.
+    Rows go in with one executemany INSERT; rollups and the ledger version are updated in the same
+    transaction, and there is exactly one commit. Returns the number of rows inserted; raises on failure
+    after rolling back.
+    """
+    if not rows:
+        return 0
+    try:
+        db.session.execute(insert(Transaction), rows)
+        # Update the daily/monthly rollups in the same DB transaction as the new rows
+        apply_to_rollups(rows)
+        bump_ledger_version(user_id) # Invalidates this user's cached summaries
+        # The version this write creates, read before commit: afterwards another writer may already have moved it on
+        new_version = get_ledger_version(user_id)
+        db.session.commit()
+    except Exception:
         db.session.rollback()
-        return f"Failed to add transaction: {str(e)}"
+        raise
 
+    # Patch this process's in-memory range index instead of rebuilding it on the next read
+    if current_app.config.get('RANGE_INDEX_ENABLED'):
+        record_in_range_index(user_id, rows, new_version)
+    return len(rows)
 
+
+@read_only()
 def get_total_by_type(user_id: int, transaction_type: str, start_date: str, end_date: str, target_currency: str = 'USD') -> float | str:
     """Calculates the total amount for a given transaction type and date range, converted to a target currency."""
+    # Served from the summary cache until the user's ledger changes
+    return cached_summary(
+        user_id, ('total', transaction_type.lower(), start_date, end_date, target_currency.upper()),
+        lambda: _compute_total_by_type(user_id, transaction_type, start_date, end_date, target_currency)
+    )
+
+
+def _compute_total_by_type(user_id: int, transaction_type: str, start_date: str, end_date: str, target_currency: str) -> float | str:
+    """Computes get_total_by_type without the summary cache."""
     try:
         # Parse dates
         start_date_dt = datetime.strptime(start_date, "%Y-%m-%d")
@@ -83,33 +184,21 @@ def get_total_by_type(user_id: int, transaction_type: str, start_date: str, end_
         end_date_dt = end_date_dt + timedelta(days=1)
         
         logging.info(f"Calculating {transaction_type} from {start_date} to {end_date} (inclusive) for user {user_id}")
-        
-        transactions = Transaction.query.filter(
-            Transaction.user_id == user_id,
-            Transaction.type == transaction_type.lower(),
-            Transaction.date >= start_date_dt,
-            Transaction.date < end_date_dt  # Using < with end_date_dt + 1 day to include the entire end date
-        ).all()
 
-        if not transactions:
+        # Let the database do the summing: one row per currency and month instead of one ORM object per transaction
+        transaction_type = transaction_type.lower()
+        totals_by_currency = _sum_by_type_and_currency(user_id, start_date_dt, end_date_dt, transaction_type, by_month=True).get(transaction_type)
+
+        if not totals_by_currency:
             logging.info(f"No {transaction_type} transactions found for user {user_id} in the specified date range")
             return 0.0
 
-        total_in_target_currency = 0.0
         target_currency = target_currency.upper()
-
-        for tx in transactions:
-            if tx.currency.upper() == target_currency:
-                total_in_target_currency += tx.amount
-            else:
-                # Use the imported exchange rate service
-                rate = get_exchange_rate(tx.currency, target_currency)
-                if isinstance(rate, float) and rate > 0:
-                    total_in_target_currency += tx.amount * rate
-                else:
-                    logging.warning(f"Could not convert {tx.amount} {tx.currency} to {target_currency} for user {user_id}. Exchange rate service returned: {rate}")
-                    error_detail = f" (Exchange service message: {rate})" if isinstance(rate, str) else ""
-                    return f"Could not calculate total in {target_currency} because conversion for {tx.currency} failed.{error_detail}"
+        rates = _lookup_period_rates(totals_by_currency, target_currency, end_date_dt.date())
+        if isinstance(rates, str):
+            logging.warning(f"Could not convert {transaction_type} totals to {target_currency} for user {user_id}. Exchange rate service returned: {rates}")
+            return f"Could not calculate total in {target_currency} because currency conversion failed. (Exchange service message: {rates})"
+        total_in_target_currency = _apply_period_rates(totals_by_currency, rates)
 
         logging.info(f"Total {transaction_type} for user {user_id}: {total_in_target_currency} {target_currency}")
         return total_in_target_currency
@@ -122,6 +211,216 @@ def get_total_by_type(user_id: int, transaction_type: str, start_date: str, end_
         return f"An error occurred while calculating the total: {str(e)}"
 
 
+@read_only()
+def get_financial_overview(user_id: int, start_date: str = None, end_date: str = None, target_currency: str = 'USD') -> dict | str:
+    """
+    Calculates income, expenses and net balance for a date range (inclusive) in a single grouped query.
+    start_date defaults to the beginning of the records and end_date to today.
+    Returns a dict with converted totals and per-currency breakdowns, or an error message string.
+    """
+    # Resolve the default end date first so a cached "up to today" result never outlives the day
+    end_date = end_date or now_in_app_timezone().strftime("%Y-%m-%d")
+    return cached_summary(
+        user_id, ('overview', start_date, end_date, target_currency.upper()),
+        lambda: _compute_financial_overview(user_id, start_date, end_date, target_currency)
+    )
+
+
+def _compute_financial_overview(user_id: int, start_date: str | None, end_date: str, target_currency: str) -> dict | str:
+    """Computes get_financial_overview without the summary cache."""
+    try:
+        start_date_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        # Include the entire end date (compare with < end + 1 day)
+        end_date_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        target_currency = target_currency.upper()
+
+        logging.info(f"Calculating financial overview from {start_date or 'the beginning'} to {end_date} for user {user_id}")
+
+        # One grouped read covers both income and expenses, split per currency and month
+        totals = _sum_by_type_and_currency(user_id, start_date_dt, end_date_dt, by_month=True)
+        income_by_month = totals.get('income', {})
+        expense_by_month = totals.get('expense', {})
+
+        # One conversion pass for every (currency, month) that appears on either side
+        buckets = {}
+        for by_month in (income_by_month, expense_by_month):
+            for currency, months in by_month.items():
+                buckets.setdefault(currency, {}).update(months)
+        rates = _lookup_period_rates(buckets, target_currency, end_date_dt.date())
+        if isinstance(rates, str):
+            logging.warning(f"Could not convert overview to {target_currency} for user {user_id}. Exchange rate service returned: {rates}")
+            return f"Could not calculate totals in {target_currency} because currency conversion failed. (Exchange service message: {rates})"
+
+        total_income = _apply_period_rates(income_by_month, rates)
+        total_expense = _apply_period_rates(expense_by_month, rates)
+        income_by_currency = {currency: sum(months.values()) for currency, months in income_by_month.items()}
+        expense_by_currency = {currency: sum(months.values()) for currency, months in expense_by_month.items()}
+
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'currency': target_currency,
+            'income': total_income,
+            'expense': total_expense,
+            'net': total_income - total_expense,
+            'breakdown': {
+                'income': income_by_currency,
+                'expense': expense_by_currency
+            }
+        }
+
+    except ValueError as e:
+        logging.error(f"Date parsing error in get_financial_overview for user {user_id}: {str(e)}")
+        return "Invalid date format. Please use YYYY-MM-DD for start and end dates."
+    except Exception as e:
+        logging.error(f"Error in get_financial_overview for user {user_id}: {str(e)}", exc_info=True)
+        return f"An error occurred while calculating the overview: {str(e)}"
+
+
+def _sum_by_type_and_currency(user_id: int, start_dt: datetime | None, end_dt: datetime, transaction_type: str = None, by_month: bool = False) -> dict:
+    """
+    Returns {type: {CURRENCY: summed amount}} over [start_dt, end_dt), bounds being whole days (midnight).
+    A start_dt of None means no lower bound; transaction_type restricts the query to one type.
+    With by_month each amount is split into {month start: amount} (for per-month exchange rates).
+    The rollup table is the primary source. RANGE_INDEX_ENABLED (opt-in) puts the in-memory range index in
+    front of it; with ROLLUPS_ENABLED off the ledger itself is summed with SUM ... GROUP BY, which is also
+    the reference the rollups are rebuilt from. Columnar ledger frames (analytics_service) serve the
+    per-category/month breakdowns only.
+    """
+    start_day = start_dt.date() if start_dt else None
+    # The in-memory prefix-sum index answers any range with two binary searches per (type, currency)
+    if current_app.config.get('RANGE_INDEX_ENABLED'):
+        return get_range_index(user_id).sum_by_type_and_currency(start_day, end_dt.date(), transaction_type, by_month)
+
+    if current_app.config.get('ROLLUPS_ENABLED'):
+        return sum_rollups(user_id, start_day, end_dt.date(), transaction_type, by_month)
+
+    # Rollups disabled: aggregate the ledger in SQL, one row per currency instead of one ORM object per transaction
+    query = db.session.query(Transaction.type, Transaction.currency, func.sum(Transaction.amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date < end_dt
+    )
+    if start_dt is not None:
+        query = query.filter(Transaction.date >= start_dt)
+    if transaction_type:
+        query = query.filter(Transaction.type == transaction_type)
+
+    totals = {}
+    if by_month:
+        day_column = func.date(Transaction.date)
+        for tx_type, currency, amount, day in query.add_columns(day_column).group_by(Transaction.type, Transaction.currency, day_column).all():
+            if isinstance(day, str): # SQLite returns DATE() results as text
+                day = datetime.strptime(day, "%Y-%m-%d").date()
+            months = totals.setdefault(tx_type, {}).setdefault(currency.upper(), {})
+            months[day.replace(day=1)] = months.get(day.replace(day=1), 0.0) + (amount or 0.0)
+        return totals
+
+    for tx_type, currency, amount in query.group_by(Transaction.type, Transaction.currency).all():
+        bucket = totals.setdefault(tx_type, {})
+        bucket[currency.upper()] = bucket.get(currency.upper(), 0.0) + (amount or 0.0)
+    return totals
+
+
+def _lookup_rates(currencies, target_currency: str) -> dict | str:
+    """Returns {CURRENCY: rate into target_currency} for every currency (1.0 for the target itself)."""
+    foreign_currencies = set(currencies) - {target_currency}
+    # Look up every foreign currency in one go (a single rate-table fetch in 'table' mode)
+    rates = get_exchange_rates(foreign_currencies, target_currency) if foreign_currencies else {}
+    if isinstance(rates, str):
+        return rates
+    rates[target_currency] = 1.0
+    return rates
+
+
+def _lookup_period_rates(totals_by_currency: dict, target_currency: str, end_day: date) -> dict | str:
+    """
+    Returns {(CURRENCY, month start): rate into target_currency} for {CURRENCY: {month start: amount}} totals
+    of a range ending before end_day. Each month is converted on its last day in the range with the stored
+    snapshot for that day, so past totals do not move with today's rate; months ending today or later, and
+    months with no stored snapshot, use the current rate.
+    """
+    today = now_in_app_timezone().date()
+    rates = {}
+    needs_current_rate = set()
+    for currency, months in totals_by_currency.items():
+        rate_days = {month: min(_month_end(month), end_day - timedelta(days=1)) for month in months}
+        past_days = {day for day in rate_days.values() if day < today}
+        stored = get_stored_rates(currency, target_currency, past_days) if past_days else {}
+        for month, day in rate_days.items():
+            rate = stored.get(day)
+            if rate is None:
+                needs_current_rate.add(currency)
+            else:
+                rates[(currency, month)] = rate
+
+    if needs_current_rate:
+        current_rates = _lookup_rates(needs_current_rate, target_currency)
+        if isinstance(current_rates, str):
+            return current_rates
+        for currency, months in totals_by_currency.items():
+            for month in months:
+                if (currency, month) not in rates:
+                    rates[(currency, month)] = current_rates[currency]
+    return rates
+
+
+def _apply_period_rates(totals_by_currency: dict, rates: dict) -> float:
+    """Converts {CURRENCY: {month start: amount}} totals into one total (one multiplication per bucket)."""
+    return sum(
+        (amount * rates[(currency, month)] for currency, months in totals_by_currency.items() for month, amount in months.items()),
+        0.0
+    )
+
+
+def _month_end(month: date) -> date:
+    """Returns the last day of the month starting on month."""
+    next_month = date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+@read_only()
+def list_transactions(user_id: int, limit: int, cursor: str = None, type: str = None, category: str = None, currency: str = None, start_date: str = None, end_date: str = None) -> dict | str:
+    """
+    Lists a user's transactions newest first, one keyset page at a time, optionally filtered by
+    type, category, currency and an inclusive date range. Returns the page and the cursor for the next one.
+    """
+    decoded = decode_cursor(cursor) if cursor else None
+    if isinstance(decoded, str):
+        return decoded
+
+    query = Transaction.query.filter(Transaction.user_id == user_id)
+    if type:
+        if type.lower() not in ['income', 'expense']:
+            return "Invalid transaction type. Must be 'income' or 'expense'."
+        query = query.filter(Transaction.type == type.lower())
+    if currency:
+        query = query.filter(Transaction.currency == currency.upper())
+    if category:
+        query = query.filter(func.lower(Transaction.category) == category.lower())
+    try:
+        if start_date:
+            query = query.filter(Transaction.date >= datetime.strptime(start_date, "%Y-%m-%d"))
+        if end_date:
+            query = query.filter(Transaction.date < datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)) # Inclusive end date
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD for start and end dates."
+
+    transactions, next_cursor = keyset_page(query, Transaction.date, Transaction.id, limit, decoded)
+    return {
+        'transactions': [{
+            'id': tx.id,
+            'date': tx.date.strftime('%Y-%m-%d %H:%M'),
+            'type': tx.type,
+            'amount': tx.amount,
+            'currency': tx.currency.upper(),
+            'category': tx.category,
+            'description': tx.description
+        } for tx in transactions],
+        'next_cursor': next_cursor
+    }
+
+
+@read_only()
 def generate_pdf_report(user_id: int) -> str:
     """Generates a PDF financial report for the user and returns the filename."""
     try:
@@ -157,44 +456,26 @@ def generate_pdf_report(user_id: int) -> str:
         c.drawString(72, y_position, "Financial Summary (approximated in USD - All Time)")
         y_position -= 20
 
-        # Get financial data
-        # Find the earliest transaction date for a true "all time" report
-        earliest_tx = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.date.asc()).first()
-        all_time_start_str = earliest_tx.date.strftime('%Y-%m-%d') if earliest_tx else "1900-01-01" # Use a very early date if no transactions
-        today_str = datetime.now().strftime("%Y-%m-%d")
-
-        logging.info(f"Fetching financial data for period {all_time_start_str} to {today_str}")
-        total_income_usd = get_total_by_type(user_id, 'income', all_time_start_str, today_str, 'USD')
-        total_expense_usd = get_total_by_type(user_id, 'expense', all_time_start_str, today_str, 'USD')
+        # Get financial data: all-time income, expenses and net from one grouped query
+        logging.info(f"Fetching all-time financial overview for user {user_id}")
+        overview = get_financial_overview(user_id, target_currency='USD')
 
         # Format and display financial data
         c.setFont("Helvetica", 11)
 
-        # Income
-        if isinstance(total_income_usd, (int, float)):
-            income_str = f"{total_income_usd:.2f} USD"
+        if isinstance(overview, dict):
+            income_str = f"{overview['income']:.2f} USD"
+            expense_str = f"{overview['expense']:.2f} USD"
+            net_balance_str = f"{overview['net']:.2f} USD"
         else:
-            income_str = f"Error: {total_income_usd}"
-            logging.error(f"Invalid income value for user {user_id}: {total_income_usd}")
+            income_str = expense_str = f"Error: {overview}"
+            net_balance_str = "N/A (calculation error)"
+            logging.error(f"Could not calculate financial overview for user {user_id}: {overview}")
+
         c.drawString(72, y_position, f"Total Income: {income_str}")
         y_position -= 18
-
-        # Expenses
-        if isinstance(total_expense_usd, (int, float)):
-            expense_str = f"{total_expense_usd:.2f} USD"
-        else:
-            expense_str = f"Error: {total_expense_usd}"
-            logging.error(f"Invalid expense value for user {user_id}: {total_expense_usd}")
         c.drawString(72, y_position, f"Total Expenses: {expense_str}")
         y_position -= 18
-
-        # Net Balance
-        if isinstance(total_income_usd, (int, float)) and isinstance(total_expense_usd, (int, float)):
-            net_balance = total_income_usd - total_expense_usd
-            net_balance_str = f"{net_balance:.2f} USD"
-        else:
-            net_balance_str = "N/A (calculation error)"
-            logging.error(f"Could not calculate net balance for user {user_id} due to invalid income/expense values")
         c.drawString(72, y_position, f"Net Balance: {net_balance_str}")
         y_position -= 30
 
@@ -263,6 +544,7 @@ def generate_pdf_report(user_id: int) -> str:
         raise
 
 
+@read_only()
 def generate_csv_data(user_id: int) -> io.BytesIO | None:
     """Generates CSV data for all transactions for a user and returns it as a BytesIO buffer."""
     transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.date.desc()).all()
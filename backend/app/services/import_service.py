@@ -0,0 +1,122 @@
+# app/services/import_service.py
+import csv
+import io
+import json
+import logging
+import time as time_module
+
+from .financial_service import validate_transaction, insert_transaction_batch
+from .datetime_service import now_in_app_timezone
+
+# Rejected rows reported back in detail (the rest are only counted)
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_csv_records(text_stream):
+    """
+    Yields (line_number, record dict) from a CSV stream with a header row, one row at a time.
+    Expects the columns generate_csv_data() writes, so an exported CSV can be re-imported as-is.
+    """
+    reader = csv.DictReader(text_stream)
+    for record in reader:
+        # Header names are matched case-insensitively (Date/date both work)
+        yield reader.line_num, {(key or '').strip().lower(): value for key, value in record.items()}
+
+
+def iter_ndjson_records(text_stream):
+    """Yields (line_number, record dict or error string) from a newline-delimited JSON stream."""
+    for line_number, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Each line must be a JSON object."
+            continue
+        yield line_number, {str(key).lower(): value for key, value in record.items()}
+
+
+def import_transactions(user_id: int, records, chunk_size: int = 1000) -> dict:
+    """
+    Validates (line_number, record) pairs as they stream in and inserts valid rows in chunks,
+    one executemany INSERT and one commit per chunk. Invalid rows are rejected and reported
+    without aborting the load. Returns a summary report.
+    """
+    started = time_module.perf_counter()
+    now = now_in_app_timezone() # One default timestamp for rows without a date/time
+    inserted = 0
+    rejected = 0
+    errors = []
+    chunk, chunk_lines = [], []
+
+    def reject(line_number, message):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_number, 'error': message})
+
+    def flush():
+        nonlocal inserted
+        if not chunk:
+            return
+        try:
+            inserted += insert_transaction_batch(user_id, chunk)
+        except Exception as e:
+            logging.error(f"Import chunk of {len(chunk)} rows failed for user {user_id}: {str(e)}", exc_info=True)
+            for line_number in chunk_lines:
+                reject(line_number, f"Database error: {str(e)}")
+        chunk.clear()
+        chunk_lines.clear()
+
+    for line_number, record in records:
+        if isinstance(record, str):
+            reject(line_number, record)
+            continue
+
+        row = validate_transaction(
+            user_id,
+            amount=record.get('amount'),
+            currency=_text(record.get('currency')),
+            category=_text(record.get('category')) or None,
+            type=_text(record.get('type')),
+            description=_text(record.get('description')) or None,
+            date=_text(record.get('date')) or None,
+            time=_text(record.get('time')) or None,
+            now=now
+        )
+        if isinstance(row, str):
+            reject(line_number, row)
+            continue
+
+        chunk.append(row)
+        chunk_lines.append(line_number)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    elapsed = time_module.perf_counter() - started
+    report = {
+        'inserted': inserted,
+        'rejected': rejected,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(inserted / elapsed, 1) if elapsed > 0 else None
+    }
+    logging.info(f"Imported transactions for user {user_id}: {inserted} inserted, {rejected} rejected in {elapsed:.3f}s")
+    return report
+
+
+def open_text_stream(binary_stream):
+    """Wraps a binary request stream so it can be read line by line as UTF-8 text."""
+    if not isinstance(binary_stream, io.BufferedIOBase):
+        binary_stream = io.BufferedReader(binary_stream)
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+def _text(value) -> str:
+    """Normalizes a CSV/JSON field to a stripped string ('' for missing values)."""
+    return str(value).strip() if value is not None else ''
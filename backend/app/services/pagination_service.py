@@ -0,0 +1,60 @@
+# app/services/pagination_service.py
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Encodes the (timestamp, id) of the last row on a page as an opaque URL-safe cursor."""
+    raw = json.dumps([sort_value.isoformat(), row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int] | str:
+    """Decodes a cursor from encode_cursor(). Returns (timestamp, id) or an error message string."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        return "Invalid cursor. Use the next_cursor value from a previous page."
+
+
+def parse_page_size(value) -> int | str:
+    """Validates a ?limit= value, defaulting to DEFAULT_PAGE_SIZE and capping at MAX_PAGE_SIZE."""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return "Invalid limit. Must be a whole number."
+    if limit < 1:
+        return "Invalid limit. Must be at least 1."
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_page(query, sort_column, id_column, limit: int, cursor: tuple[datetime, int] | None = None):
+    """
+    Returns (rows, next_cursor) for one newest-first page of query, ordered by (sort_column, id_column) descending.
+    Rows after the cursor are found with a range condition instead of OFFSET, so with an index on
+    (..., sort_column) every page costs O(page size) no matter how deep it is.
+    """
+    if cursor is not None:
+        sort_value, row_id = cursor
+        # sort <= value narrows the index range; the OR breaks ties on id for rows sharing a timestamp
+        query = query.filter(
+            sort_column <= sort_value,
+            or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id))
+        )
+
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
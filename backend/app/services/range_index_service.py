@@ -0,0 +1,186 @@
+# app/services/range_index_service.py
+import threading
+import logging
+from bisect import bisect_left
+from datetime import datetime, date
+from flask import current_app # To access app.config
+from sqlalchemy import func
+
+from .. import db # Import the db instance
+from ..models import Transaction, TransactionRollup # Import models
+from .cache_service import TTLCache
+from .summary_cache_service import get_ledger_version
+
+# Resident per-user indexes keyed by user_id (LRU-bounded; evicted users are rebuilt lazily)
+_index_cache = TTLCache(maxsize=256, ttl=None, name='range_indexes')
+
+
+class PrefixSumSeries:
+    """
+    Daily totals for one (type, currency) as sorted day numbers plus running (prefix) sums.
+    The total for any [start, end) range is the difference of two prefix sums found by binary search.
+    """
+
+    def __init__(self, days=None, totals=None):
+        self.days = [] # Sorted ordinal day numbers
+        self.prefix = [] # prefix[i] = sum of daily totals for days[0..i]
+        running = 0.0
+        for day, total in zip(days or [], totals or []):
+            running += total
+            self.days.append(day)
+            self.prefix.append(running)
+
+    def _prefix_before(self, day: int) -> float:
+        """Sum of all daily totals strictly before day."""
+        i = bisect_left(self.days, day)
+        return self.prefix[i - 1] if i else 0.0
+
+    def range_sum(self, start_day: int | None, end_day: int) -> float:
+        """Total for days in [start_day, end_day); start_day None means from the first day."""
+        start_sum = self._prefix_before(start_day) if start_day is not None else 0.0
+        return self._prefix_before(end_day) - start_sum
+
+    def monthly_sums(self, start_day: int | None, end_day: int) -> dict:
+        """{month start: total} for days in [start_day, end_day), two binary searches per month that has data."""
+        months = {}
+        i = bisect_left(self.days, start_day) if start_day is not None else 0
+        end = bisect_left(self.days, end_day)
+        while i < end:
+            month = date.fromordinal(self.days[i]).replace(day=1)
+            next_month = date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+            j = min(bisect_left(self.days, next_month.toordinal()), end)
+            months[month] = self.prefix[j - 1] - (self.prefix[i - 1] if i else 0.0)
+            i = j
+        return months
+
+    def add(self, day: int, amount: float) -> None:
+        """Adds an amount on a day. Appending at the end (the common case) is O(1)."""
+        i = bisect_left(self.days, day)
+        if i == len(self.days):
+            self.days.append(day)
+            self.prefix.append((self.prefix[-1] if self.prefix else 0.0) + amount)
+            return
+        if self.days[i] != day:
+            self.days.insert(i, day)
+            self.prefix.insert(i, self.prefix[i - 1] if i else 0.0)
+        # Every prefix from this day onwards includes the new amount
+        for j in range(i, len(self.prefix)):
+            self.prefix[j] += amount
+
+
+class UserRangeIndex:
+    """All prefix-sum series for one user, tagged with the ledger version they reflect."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.series = {} # (type, CURRENCY) -> PrefixSumSeries
+        self.lock = threading.Lock()
+
+    def sum_by_type_and_currency(self, start_day: date | None, end_day: date, transaction_type: str = None, by_month: bool = False) -> dict:
+        """
+        Returns {type: {CURRENCY: total}} for [start_day, end_day) with two binary searches per series.
+        With by_month each total is split into {month start: total} instead.
+        """
+        start = start_day.toordinal() if start_day is not None else None
+        end = end_day.toordinal()
+        totals = {}
+        with self.lock:
+            for (tx_type, currency), series in self.series.items():
+                if transaction_type and tx_type != transaction_type:
+                    continue
+                # Skip series with no days in range so absent currencies do not show up as 0 buckets
+                if bisect_left(series.days, end) == (bisect_left(series.days, start) if start is not None else 0):
+                    continue
+                totals.setdefault(tx_type, {})[currency] = series.monthly_sums(start, end) if by_month else series.range_sum(start, end)
+        return totals
+
+    def add(self, transaction_type: str, currency: str, day: date, amount: float) -> None:
+        """Applies one new transaction to the matching series."""
+        with self.lock:
+            series = self.series.setdefault((transaction_type.lower(), currency.upper()), PrefixSumSeries())
+            series.add(day.toordinal(), amount)
+
+
+def init_range_index(app):
+    """Applies the configured number of resident per-user indexes."""
+    _index_cache.configure(maxsize=app.config.get('RANGE_INDEX_MAX_USERS', 256))
+
+
+def get_range_index_stats() -> dict:
+    """Returns hit/miss/eviction counters for the resident range indexes."""
+    return _index_cache.stats()
+
+
+def get_range_index(user_id: int) -> UserRangeIndex:
+    """
+    Returns the user's index for the current ledger version, rebuilding it if missing or stale.
+    An index built while another write committed is returned for this read but not kept.
+    """
+    version = get_ledger_version(user_id)
+    index = _index_cache.get(user_id)
+    if index is not None and index.version == version:
+        return index
+
+    index = _build_index(user_id, version)
+    # A write committed while the rows were read would be in the index under the old version, and
+    # record_in_range_index would then apply it a second time: only keep the index if the version held still
+    if get_ledger_version(user_id) != version:
+        logging.info(f"Ledger of user {user_id} changed while its range index was built; not keeping it")
+        return index
+    _index_cache.set(user_id, index)
+    return index
+
+
+def record_in_range_index(user_id: int, transactions, new_version: int) -> None:
+    """
+    Applies just-committed transactions (mappings with type, currency, date and amount) to a resident index.
+    The index is only patched if it was exactly one ledger version behind; otherwise another writer got in
+    between and it is dropped, to be rebuilt lazily on the next read.
+    """
+    index = _index_cache.get(user_id)
+    if index is None:
+        return
+    with index.lock:
+        in_step = index.version == new_version - 1
+    if not in_step:
+        _index_cache.pop(user_id)
+        return
+
+    for tx in transactions:
+        tx_day = tx['date'].date() if isinstance(tx['date'], datetime) else tx['date']
+        index.add(tx['type'], tx['currency'], tx_day, float(tx['amount']))
+    with index.lock:
+        index.version = new_version
+
+
+def _build_index(user_id: int, version: int) -> UserRangeIndex:
+    """Builds a user's index from daily rollups when enabled, otherwise from a GROUP BY over the ledger."""
+    started = datetime.now()
+    if current_app.config.get('ROLLUPS_ENABLED'):
+        rows = db.session.query(
+            TransactionRollup.type, TransactionRollup.currency, TransactionRollup.period_start, TransactionRollup.total
+        ).filter(
+            TransactionRollup.user_id == user_id,
+            TransactionRollup.period == 'day'
+        ).order_by(TransactionRollup.type, TransactionRollup.currency, TransactionRollup.period_start).all()
+    else:
+        day_column = func.date(Transaction.date)
+        currency_column = func.upper(Transaction.currency)
+        rows = db.session.query(
+            Transaction.type, currency_column, day_column, func.sum(Transaction.amount)
+        ).filter(
+            Transaction.user_id == user_id
+        ).group_by(Transaction.type, currency_column, day_column).order_by(Transaction.type, currency_column, day_column).all()
+
+    grouped = {}
+    for tx_type, currency, day, total in rows:
+        if isinstance(day, str): # SQLite returns DATE() results as text
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        days, totals = grouped.setdefault((tx_type.lower(), currency.upper()), ([], []))
+        days.append(day.toordinal())
+        totals.append(total or 0.0)
+
+    index = UserRangeIndex(version)
+    index.series = {key: PrefixSumSeries(days, totals) for key, (days, totals) in grouped.items()}
+    logging.info(f"Built range index for user {user_id} (v{version}): {len(rows)} day buckets in {(datetime.now() - started).total_seconds():.3f}s")
+    return index
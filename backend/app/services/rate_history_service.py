@@ -0,0 +1,183 @@
+# app/services/rate_history_service.py
+from .. import db # Import the db instance
+from ..models import ExchangeRate # Daily exchange rate snapshots
+from flask import current_app # To access app.config
+from sqlalchemy import func
+from datetime import datetime, date, timedelta
+from bisect import bisect_right
+import logging
+
+
+def record_rates(base_currency: str, rates: dict, on_date: date = None) -> None:
+    """
+    Stores fetched rates (1 base = rate quote) as the snapshot for on_date (defaults to today).
+    Uses its own connection so the caller's session and pending changes are never committed.
+    Failures are logged and swallowed: rate history is best effort.
+    """
+    base_currency = base_currency.upper()
+    on_date = on_date or date.today()
+    rows = [
+        {'base': base_currency, 'quote': quote.upper(), 'date': on_date, 'rate': float(rate), 'fetched_at': datetime.utcnow()}
+        for quote, rate in rates.items()
+        if quote.upper() != base_currency and rate
+    ]
+    if not rows:
+        return
+
+    table = ExchangeRate.__table__
+    try:
+        with db.engine.begin() as conn:
+            # Replace today's snapshot for these quotes (portable alternative to an upsert)
+            conn.execute(table.delete().where(
+                table.c.base == base_currency,
+                table.c.date == on_date,
+                table.c.quote.in_([row['quote'] for row in rows])
+            ))
+            conn.execute(table.insert(), rows)
+        logging.info(f"Recorded {len(rows)} exchange rate snapshot(s) for base {base_currency} on {on_date}")
+    except Exception as e:
+        logging.error(f"Could not record exchange rates for base {base_currency}: {str(e)}", exc_info=True)
+
+
+def get_stored_rate_table(base_currency: str, on_date: date = None, max_age_seconds: float = None) -> dict | None:
+    """
+    Returns the most recent complete stored {QUOTE: rate} snapshot for a base currency on or before on_date.
+    A snapshot is complete when it has every quote currency ever stored for the base; days that only hold
+    a few pairs (recorded by pair lookups) are skipped. If max_age_seconds is given, a snapshot with any rate
+    fetched longer ago than that is ignored.
+    """
+    base_currency = base_currency.upper()
+    on_date = on_date or date.today()
+    try:
+        expected_quotes = db.session.query(func.count(func.distinct(ExchangeRate.quote))).filter(
+            ExchangeRate.base == base_currency
+        ).scalar()
+        if not expected_quotes:
+            return None
+
+        # (base, quote, date) is unique, so a day with as many rows as there are known quotes has all of them
+        snapshot_query = db.session.query(ExchangeRate.date).filter(
+            ExchangeRate.base == base_currency,
+            ExchangeRate.date <= on_date
+        ).group_by(ExchangeRate.date).having(func.count(ExchangeRate.id) >= expected_quotes)
+        if max_age_seconds:
+            snapshot_query = snapshot_query.having(func.min(ExchangeRate.fetched_at) >= datetime.utcnow() - timedelta(seconds=max_age_seconds))
+        snapshot_date = snapshot_query.order_by(ExchangeRate.date.desc()).limit(1).scalar()
+        if snapshot_date is None:
+            return None
+
+        rows = db.session.query(ExchangeRate.quote, ExchangeRate.rate).filter(
+            ExchangeRate.base == base_currency,
+            ExchangeRate.date == snapshot_date
+        ).all()
+        rates = {row.quote: row.rate for row in rows}
+        rates[base_currency] = 1.0
+        return rates
+    except Exception as e:
+        logging.error(f"Could not read stored exchange rates for base {base_currency}: {str(e)}", exc_info=True)
+        return None
+
+
+def get_stored_rate(from_currency: str, to_currency: str, on_date: date = None, max_age_seconds: float = None) -> float | None:
+    """
+    Answers a conversion rate from stored snapshots only (no network I/O).
+    Tries the direct pair, then the inverse pair, then a cross rate via the configured base currency.
+    Uses the snapshot on or nearest before on_date; a later snapshot is never substituted for a past date.
+    Returns None when no usable snapshot exists.
+    """
+    from_currency = from_currency.upper()
+    to_currency = to_currency.upper()
+    on_date = on_date or date.today()
+
+    if from_currency == to_currency:
+        return 1.0
+
+    try:
+        direct = _find_snapshot(from_currency, to_currency, on_date, max_age_seconds)
+        if direct is not None:
+            return direct
+
+        inverse = _find_snapshot(to_currency, from_currency, on_date, max_age_seconds)
+        if inverse:
+            return 1.0 / inverse
+
+        base_currency = current_app.config.get('EXCHANGE_RATE_BASE_CURRENCY', 'USD')
+        if base_currency not in (from_currency, to_currency):
+            base_to_from = _find_snapshot(base_currency, from_currency, on_date, max_age_seconds)
+            base_to_to = _find_snapshot(base_currency, to_currency, on_date, max_age_seconds)
+            if base_to_from and base_to_to is not None:
+                return base_to_to / base_to_from
+    except Exception as e:
+        logging.error(f"Could not read stored exchange rate {from_currency}->{to_currency}: {str(e)}", exc_info=True)
+
+    return None
+
+
+def get_stored_rates(from_currency: str, to_currency: str, on_dates) -> dict:
+    """
+    Batch form of get_stored_rate for many dates of one pair: returns {on_date: rate or None}.
+    Reads the history of each candidate pair once (at most four queries) instead of once per date.
+    """
+    from_currency = from_currency.upper()
+    to_currency = to_currency.upper()
+    on_dates = set(on_dates)
+    if from_currency == to_currency:
+        return {on_date: 1.0 for on_date in on_dates}
+
+    rates = {on_date: None for on_date in on_dates}
+    if not on_dates:
+        return rates
+
+    try:
+        latest = max(on_dates)
+        direct = _snapshot_history(from_currency, to_currency, latest)
+        inverse = _snapshot_history(to_currency, from_currency, latest)
+        base_currency = current_app.config.get('EXCHANGE_RATE_BASE_CURRENCY', 'USD')
+        cross = None
+        if base_currency not in (from_currency, to_currency):
+            cross = (_snapshot_history(base_currency, from_currency, latest), _snapshot_history(base_currency, to_currency, latest))
+
+        for on_date in on_dates:
+            rate = _rate_on(direct, on_date)
+            if rate is None:
+                inverse_rate = _rate_on(inverse, on_date)
+                rate = 1.0 / inverse_rate if inverse_rate else None
+            if rate is None and cross is not None:
+                base_to_from, base_to_to = _rate_on(cross[0], on_date), _rate_on(cross[1], on_date)
+                if base_to_from and base_to_to is not None:
+                    rate = base_to_to / base_to_from
+            rates[on_date] = rate
+    except Exception as e:
+        logging.error(f"Could not read stored exchange rates {from_currency}->{to_currency}: {str(e)}", exc_info=True)
+
+    return rates
+
+
+def _snapshot_history(base_currency: str, quote_currency: str, until: date) -> tuple:
+    """Returns (dates, rates) of every stored base->quote snapshot up to until, oldest first."""
+    rows = db.session.query(ExchangeRate.date, ExchangeRate.rate).filter(
+        ExchangeRate.base == base_currency,
+        ExchangeRate.quote == quote_currency,
+        ExchangeRate.date <= until
+    ).order_by(ExchangeRate.date).all()
+    return [row.date for row in rows], [row.rate for row in rows]
+
+
+def _rate_on(history: tuple, on_date: date) -> float | None:
+    """Returns the rate of the latest snapshot in history on or before on_date, or None."""
+    dates, rates = history
+    i = bisect_right(dates, on_date)
+    return rates[i - 1] if i else None
+
+
+def _find_snapshot(base_currency: str, quote_currency: str, on_date: date, max_age_seconds: float = None) -> float | None:
+    """Returns the stored base->quote rate from the latest snapshot on or before on_date, or None."""
+    query = ExchangeRate.query.filter(
+        ExchangeRate.base == base_currency,
+        ExchangeRate.quote == quote_currency
+    )
+    if max_age_seconds:
+        query = query.filter(ExchangeRate.fetched_at >= datetime.utcnow() - timedelta(seconds=max_age_seconds))
+
+    row = query.filter(ExchangeRate.date <= on_date).order_by(ExchangeRate.date.desc()).first()
+    return row.rate if row is not None else None
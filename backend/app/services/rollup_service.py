@@ -0,0 +1,176 @@
+# app/services/rollup_service.py
+from .. import db # Import the db instance
+from ..models import Transaction, TransactionRollup # Import models
+from .summary_cache_service import bump_ledger_version
+from sqlalchemy import func, or_, and_, insert, select
+from sqlalchemy.dialects import sqlite, postgresql
+from datetime import datetime, date
+import logging
+
+# Rows per INSERT when rebuilding rollups
+REBUILD_CHUNK_SIZE = 1000
+
+
+def apply_to_rollups(transactions) -> None:
+    """
+    Adds transactions to their daily and monthly rollup rows.
+    Each transaction is a mapping with user_id, type, currency, date (datetime) and amount.
+    Runs in the caller's session and does not commit, so the rollups change in the same DB transaction as the ledger.
+    """
+    deltas = {}
+    for tx in transactions:
+        day = tx['date'].date() if isinstance(tx['date'], datetime) else tx['date']
+        for period, period_start in (('day', day), ('month', day.replace(day=1))):
+            key = (tx['user_id'], tx['type'].lower(), tx['currency'].upper(), period, period_start)
+            total, count = deltas.get(key, (0.0, 0))
+            deltas[key] = (total + float(tx['amount']), count + 1)
+
+    if not deltas:
+        return
+
+    rows = [
+        {'user_id': user_id, 'type': tx_type, 'currency': currency, 'period': period,
+         'period_start': period_start, 'total': total, 'tx_count': count}
+        for (user_id, tx_type, currency, period, period_start), (total, count) in deltas.items()
+    ]
+
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name in ('sqlite', 'postgresql'):
+        # Atomic upsert: concurrent writers cannot race between "find row" and "insert row"
+        dialect_insert = sqlite.insert if dialect_name == 'sqlite' else postgresql.insert
+        table = TransactionRollup.__table__
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'period', 'type', 'currency', 'period_start'],
+            set_={'total': table.c.total + stmt.excluded.total, 'tx_count': table.c.tx_count + stmt.excluded.tx_count}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    # Generic fallback: read-modify-write each affected rollup row
+    for row in rows:
+        rollup = TransactionRollup.query.filter_by(
+            user_id=row['user_id'], period=row['period'], type=row['type'],
+            currency=row['currency'], period_start=row['period_start']
+        ).first()
+        if rollup is None:
+            db.session.add(TransactionRollup(**row))
+        else:
+            rollup.total += row['total']
+            rollup.tx_count += row['tx_count']
+
+
+def sum_rollups(user_id: int, start_day: date | None, end_day: date, transaction_type: str = None, by_month: bool = False) -> dict:
+    """
+    Returns {type: {CURRENCY: total}} for whole days in [start_day, end_day) from rollup rows.
+    Whole months inside the range are read from monthly rows and the partial months at either edge
+    from daily rows, so even multi-year ranges touch at most a few hundred rows.
+    A start_day of None means no lower bound. With by_month each total is split into
+    {month start: total} so callers can convert every month at its own exchange rate.
+    """
+    if start_day is None:
+        month_start = None
+    elif start_day.day == 1:
+        month_start = start_day
+    else:
+        month_start = _next_month(start_day)
+    month_end = end_day.replace(day=1) # Months starting before this end before end_day
+
+    period_start = TransactionRollup.period_start
+    ranges = []
+    if month_start is not None and month_start >= month_end:
+        # No whole month inside the range: daily rows only
+        ranges.append(and_(TransactionRollup.period == 'day', period_start >= start_day, period_start < end_day))
+    else:
+        month_filter = [TransactionRollup.period == 'month', period_start < month_end]
+        if month_start is not None:
+            month_filter.append(period_start >= month_start)
+            ranges.append(and_(TransactionRollup.period == 'day', period_start >= start_day, period_start < month_start))
+        ranges.append(and_(*month_filter))
+        ranges.append(and_(TransactionRollup.period == 'day', period_start >= month_end, period_start < end_day))
+
+    query = db.session.query(TransactionRollup.type, TransactionRollup.currency, func.sum(TransactionRollup.total)).filter(
+        TransactionRollup.user_id == user_id,
+        or_(*ranges)
+    )
+    if transaction_type:
+        query = query.filter(TransactionRollup.type == transaction_type)
+
+    totals = {}
+    if by_month:
+        # Monthly and daily rows never overlap in the range, so each row folds into exactly one month
+        query = query.add_columns(period_start).group_by(TransactionRollup.type, TransactionRollup.currency, period_start)
+        for tx_type, currency, amount, row_start in query.all():
+            months = totals.setdefault(tx_type, {}).setdefault(currency, {})
+            month = row_start.replace(day=1)
+            months[month] = months.get(month, 0.0) + (amount or 0.0)
+        return totals
+
+    for tx_type, currency, amount in query.group_by(TransactionRollup.type, TransactionRollup.currency).all():
+        totals.setdefault(tx_type, {})[currency] = amount or 0.0
+    return totals
+
+
+def rebuild_rollups(user_id: int = None) -> int:
+    """
+    Recomputes rollup rows from the raw ledger (for one user, or everyone) and commits.
+    Repairs rollups that drifted from the ledger. Returns the number of rollup rows written.
+    """
+    try:
+        count = rebuild_rollup_rows(db.session, user_id)
+        # Summaries cached from the old rollups must not be served again
+        bump_ledger_version(user_id)
+        db.session.commit()
+        logging.info(f"Rebuilt {count} transaction rollup rows for {'user ' + str(user_id) if user_id is not None else 'all users'}")
+        return count
+
+    except Exception as e:
+        logging.error(f"Error rebuilding transaction rollups: {str(e)}", exc_info=True)
+        db.session.rollback()
+        raise
+
+
+def rebuild_rollup_rows(connection, user_id: int = None) -> int:
+    """
+    Replaces the rollup rows of one user (or everyone) with totals recomputed from the ledger, on the given
+    session or connection, without committing or bumping ledger versions. Also used by the schema migration
+    that backfills rollups. Returns the number of rollup rows written.
+    """
+    table = TransactionRollup.__table__
+    delete_stmt = table.delete()
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(table.c.user_id == user_id)
+    connection.execute(delete_stmt)
+
+    day_column = func.date(Transaction.date)
+    currency_column = func.upper(Transaction.currency)
+    daily_query = select(
+        Transaction.user_id, Transaction.type, currency_column, day_column,
+        func.sum(Transaction.amount), func.count(Transaction.id)
+    )
+    if user_id is not None:
+        daily_query = daily_query.where(Transaction.user_id == user_id)
+    daily_query = daily_query.group_by(Transaction.user_id, Transaction.type, currency_column, day_column)
+
+    rows = {}
+    for row_user_id, tx_type, currency, day, total, count in connection.execute(daily_query):
+        if isinstance(day, str): # SQLite returns DATE() results as text
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        for period, period_start in (('day', day), ('month', day.replace(day=1))):
+            key = (row_user_id, tx_type.lower(), currency, period, period_start)
+            current_total, current_count = rows.get(key, (0.0, 0))
+            rows[key] = (current_total + (total or 0.0), current_count + count)
+
+    values = [
+        {'user_id': row_user_id, 'type': tx_type, 'currency': currency, 'period': period,
+         'period_start': period_start, 'total': total, 'tx_count': count}
+        for (row_user_id, tx_type, currency, period, period_start), (total, count) in rows.items()
+    ]
+    for i in range(0, len(values), REBUILD_CHUNK_SIZE):
+        connection.execute(insert(table), values[i:i + REBUILD_CHUNK_SIZE])
+    return len(values)
+
+
+def _next_month(day: date) -> date:
+    """Returns the first day of the month after day."""
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
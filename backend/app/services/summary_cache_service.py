@@ -0,0 +1,77 @@
+# app/services/summary_cache_service.py
+from .. import db # Import the db instance
+from ..models import LedgerVersion, User # Per-user ledger version counter
+from .cache_service import TTLCache
+from sqlalchemy import update, insert, select, literal
+from sqlalchemy.dialects import sqlite, postgresql
+import logging
+
+# Process-wide cache of computed summaries keyed by (user_id, ledger version, *summary key).
+# Entries for old versions are never served again and simply age out of the LRU.
+_summary_cache = TTLCache(maxsize=1024, ttl=300, name='summaries')
+
+
+def init_summary_cache(app):
+    """Applies the configured max size and TTL to the process-wide summary cache."""
+    _summary_cache.configure(
+        maxsize=app.config.get('SUMMARY_CACHE_MAXSIZE', 1024),
+        ttl=app.config.get('SUMMARY_CACHE_TTL', 300) # 0 disables expiry
+    )
+
+
+def get_summary_cache_stats() -> dict:
+    """Returns hit/miss/eviction counters for the summary cache."""
+    return _summary_cache.stats()
+
+
+def get_ledger_version(user_id: int) -> int:
+    """Returns the current ledger version for a user (0 if they have never written)."""
+    version = db.session.query(LedgerVersion.version).filter(LedgerVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def bump_ledger_version(user_id: int = None, connection=None) -> None:
+    """
+    Increments a user's ledger version (or every user's, if user_id is None).
+    Runs in the caller's session (or the given connection) and does not commit, so the bump lands atomically
+    with the write it describes.
+    """
+    executor = connection if connection is not None else db.session
+    stmt = update(LedgerVersion).values(version=LedgerVersion.version + 1)
+    if user_id is None:
+        executor.execute(stmt)
+        # Users who never wrote are at version 0 without a row; give them one so their cached summaries go too
+        has_version = select(LedgerVersion.user_id).where(LedgerVersion.user_id == User.id).exists()
+        executor.execute(insert(LedgerVersion).from_select(['user_id', 'version'], select(User.id, literal(1)).where(~has_version)))
+        return
+
+    dialect_name = (connection if connection is not None else db.engine).dialect.name
+    if dialect_name in ('sqlite', 'postgresql'):
+        # Atomic upsert: concurrent first writes cannot both insert the row, and no bump is lost
+        dialect_insert = sqlite.insert if dialect_name == 'sqlite' else postgresql.insert
+        upsert = dialect_insert(LedgerVersion).values(user_id=user_id, version=1)
+        executor.execute(upsert.on_conflict_do_update(index_elements=['user_id'], set_={'version': LedgerVersion.version + 1}))
+        return
+
+    # Generic fallback: update, then create the row if the user had none
+    result = executor.execute(stmt.where(LedgerVersion.user_id == user_id))
+    if result.rowcount == 0:
+        executor.execute(insert(LedgerVersion).values(user_id=user_id, version=1))
+
+
+def cached_summary(user_id: int, key: tuple, compute):
+    """
+    Returns compute() for (user_id, key), reusing the result until the user's ledger version changes.
+    Error strings are never cached. If the version cannot be read, the summary is computed uncached.
+    """
+    try:
+        version = get_ledger_version(user_id)
+    except Exception as e:
+        logging.error(f"Could not read ledger version for user {user_id}; computing summary uncached: {str(e)}", exc_info=True)
+        return compute()
+
+    return _summary_cache.get_or_load(
+        (user_id, version) + tuple(key),
+        compute,
+        should_cache=lambda result: not isinstance(result, str)
+    )
@@ -0,0 +1,156 @@
+# app/services/tool_executor_service.py
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+
+from .deadline_service import request_deadline, remaining_time, deadline_expired
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model turn, overlapping independent ones on a bounded thread pool.
+    Calls marked parallel-safe (read-only) that are next to each other run concurrently, each in its own app
+    context and therefore its own DB session; any other call is a barrier and runs alone on the request thread,
+    after everything before it and before everything after it, so writes keep the order the model asked for.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.app = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Counters
+        self.calls = 0
+        self.parallel_calls = 0 # Calls run on the pool as part of a concurrent batch
+        self.parallel_batches = 0
+        self.tool_seconds = 0.0 # Sum of each parallel call's own duration
+        self.wall_seconds = 0.0 # Elapsed time of the parallel batches
+        self.timeouts = 0 # Calls skipped or abandoned because the request deadline passed
+
+    def configure(self, app, max_workers: int = None):
+        """Binds the executor to an app (for the workers' app contexts) and sets the pool size."""
+        with self._lock:
+            self.app = app
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                    self._pool = None
+
+    def run(self, calls, deadline: float = None):
+        """
+        Runs calls, a list of (function, parallel_safe) pairs where function takes no arguments.
+        Yields (index, result) as each call finishes: in completion order within a concurrent batch,
+        in list order otherwise. Exceptions raised by a call propagate.
+        Each call runs under the request deadline (a time.monotonic() value, see deadline_service). Calls not
+        started, or not finished, by then are yielded with a TimeoutError instance as their result; pool calls
+        that overrun keep running in the background but are no longer waited for.
+        """
+        batch = []
+        for index, (function, parallel_safe) in enumerate(calls):
+            if parallel_safe and self.max_workers > 1:
+                batch.append((index, function))
+                continue
+            yield from self._run_batch(batch, deadline)
+            batch = []
+            yield index, self._run_inline(function, deadline)
+        yield from self._run_batch(batch, deadline)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'calls': self.calls,
+                'parallel_calls': self.parallel_calls,
+                'parallel_batches': self.parallel_batches,
+                'timeouts': self.timeouts,
+                'saved_seconds': round(self.tool_seconds - self.wall_seconds, 3)
+            }
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        return TimeoutError("The request's time budget ran out before this call finished")
+
+    def _run_inline(self, function, deadline: float = None):
+        if deadline_expired(deadline):
+            return self._timed_out()
+        with self._lock:
+            self.calls += 1
+        with request_deadline(deadline):
+            return function()
+
+    def _run_batch(self, batch, deadline: float = None):
+        if len(batch) == 1:
+            index, function = batch[0]
+            yield index, self._run_inline(function, deadline)
+            return
+        if not batch:
+            return
+        if deadline_expired(deadline):
+            for index, _ in batch:
+                yield index, self._timed_out()
+            return
+
+        started = time.perf_counter()
+        pool = self._get_pool()
+        futures = {pool.submit(self._run_in_context, function, deadline): index for index, function in batch}
+        durations = 0.0
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=remaining_time(deadline)):
+                pending.discard(future)
+                result, elapsed = future.result()
+                durations += elapsed
+                yield futures[future], result
+        except FutureTimeoutError:
+            for future in pending:
+                future.cancel() # Only stops calls still queued behind busy workers
+                yield futures[future], self._timed_out()
+
+        wall = time.perf_counter() - started
+        with self._lock:
+            self.calls += len(batch)
+            self.parallel_calls += len(batch)
+            self.parallel_batches += 1
+            if not pending: # A batch cut short by the deadline says nothing about time saved
+                self.tool_seconds += durations
+                self.wall_seconds += wall
+        logging.info(f"Ran {len(batch)} tool calls concurrently in {wall:.3f}s (sequential estimate {durations:.3f}s)")
+
+    def _run_in_context(self, function, deadline: float = None):
+        # Pool threads have no app context; a fresh one gives the call its own scoped DB session,
+        # removed again when the context is torn down
+        started = time.perf_counter()
+        with self.app.app_context(), request_deadline(deadline):
+            result = function()
+        return result, time.perf_counter() - started
+
+    def _get_pool(self):
+        # Created lazily, and again in a forked worker (threads do not survive fork)
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-tool')
+                self._pid = os.getpid()
+            return self._pool
+
+
+_executor = ToolExecutor()
+
+
+def init_tool_executor(app):
+    """Applies the configured pool size to the tool executor (AI_TOOL_WORKERS; 1 runs every call in turn)."""
+    _executor.configure(app, max_workers=max(1, app.config.get('AI_TOOL_WORKERS', 4)))
+
+
+def get_tool_executor_stats() -> dict:
+    """Returns call counts and the time saved by running tool calls concurrently."""
+    return _executor.stats()
+
+
+def run_tool_calls(calls, deadline: float = None):
+    """Runs one turn's tool calls (see ToolExecutor.run), yielding (index, result) as each finishes."""
+    return _executor.run(calls, deadline)
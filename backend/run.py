@@ -3,6 +3,8 @@ import os
 from app import create_app
 from app import db # Need db instance to create tables and add demo data
 from app.models import User, Transaction, ChatHistory # Need models for demo data
+from app.migrations import run_migrations # Bring existing databases up to the current schema
+from app.services.rollup_service import rebuild_rollups # Demo rows are added directly, without rollups
 from datetime import datetime, timedelta, time
 
 # Create the Flask app using the factory pattern
@@ -13,6 +15,9 @@ if __name__ == '__main__':
     # and also handles the demo data creation.
     with app.app_context():
         db.create_all()
+        # create_all() never alters existing tables; versioned migrations add indexes/columns to older databases
+        # and backfill the transaction rollups once
+        run_migrations()
 
         # Create demo user and data if database is empty
         if not User.query.first():
@@ -45,6 +50,7 @@ if __name__ == '__main__':
                 db.session.add(Transaction(**tx_data))
 
             db.session.commit()
+            rebuild_rollups() # Build the rollups for the demo transactions added above
             print("Demo user and sample transactions created.")
 
     # Run the Flask development server
@@ -0,0 +1,171 @@
+# tests/conftest.py
+# Shared fixtures: a fresh app on a temporary SQLite database per test, with the exchange rate API and
+# Gemini replaced by in-process fakes. Run with `python -m pytest` from the backend directory.
+import logging
+import time
+
+import pytest
+import requests
+
+# create_app() only sets up file logging (app.log) when the root logger has no handlers yet
+logging.getLogger().addHandler(logging.NullHandler())
+
+from app import create_app, db
+from app.models import User
+from app.migrations import run_migrations
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeRatesAPI:
+    """Stands in for requests.get against the exchange rate API. Rates are 1 USD = rate CURRENCY."""
+
+    def __init__(self):
+        self.rates = {'USD': 1.0, 'EUR': 0.5, 'GBP': 0.25, 'ETB': 100.0}
+        self.calls = [] # Every URL requested
+        self.fail = False # Simulate an unreachable API
+        self.delay = 0.0 # Seconds each request takes
+
+    def __call__(self, url, timeout=None):
+        self.calls.append(url)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise requests.ConnectionError("exchange rate API unreachable")
+        if '/latest/' in url:
+            base = url.rsplit('/', 1)[1]
+            if base not in self.rates:
+                return FakeResponse({'result': 'error', 'error-type': 'unsupported-code'})
+            return FakeResponse({'result': 'success', 'conversion_rates': {
+                code: rate / self.rates[base] for code, rate in self.rates.items()
+            }})
+        from_currency, to_currency = url.rsplit('/', 2)[1:]
+        if from_currency not in self.rates or to_currency not in self.rates:
+            return FakeResponse({'result': 'error', 'error-type': 'unknown-code'})
+        return FakeResponse({'result': 'success', 'conversion_rate': self.rates[to_currency] / self.rates[from_currency]})
+
+
+class FakeGemini:
+    """
+    Stands in for the Gemini API client. Each scripted reply is a list of parts (a str is answer text,
+    a (name, args) tuple a function call), an exception to raise, or a callable taking the request.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = [] # Every GenerateContentRequest sent
+        self.request_options = [] # Keyword arguments (timeout, ...) sent with each request
+
+    def reply(self, *replies):
+        self.script.extend(replies)
+
+    def _next(self, request, options):
+        self.requests.append(request)
+        self.request_options.append(options)
+        item = self.script.pop(0)
+        if callable(item):
+            item = item(request)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def generate_content(self, request, **options):
+        return _model_response(self._next(request, options))
+
+    def stream_generate_content(self, request, **options):
+        return iter([_model_response([part]) for part in self._next(request, options)])
+
+
+def _model_response(parts):
+    from google.generativeai import protos
+    proto_parts = []
+    for part in parts:
+        if isinstance(part, str):
+            proto_parts.append(protos.Part(text=part))
+        else:
+            name, args = part
+            proto_parts.append(protos.Part(function_call=protos.FunctionCall(name=name, args=args)))
+    return protos.GenerateContentResponse(candidates=[
+        protos.Candidate(content=protos.Content(role='model', parts=proto_parts), finish_reason=1)
+    ])
+
+
+def reset_process_state():
+    """Clears the process-wide caches, stores and counters that outlive a single app instance."""
+    from app.database import _routing, _last_write_at
+    from app.services.exchange_service import clear_rate_cache
+    from app.services.summary_cache_service import _summary_cache
+    from app.services.range_index_service import _index_cache
+    from app.services.analytics_service import _frame_cache
+    from app.services.chat_session_service import _session_store
+    clear_rate_cache()
+    _summary_cache.clear()
+    _index_cache.clear()
+    _frame_cache.clear()
+    with _session_store._lock:
+        _session_store._sessions.clear()
+    _last_write_at.set(float('-inf'))
+    _routing.replica_down_until = 0.0
+
+
+@pytest.fixture
+def rates_api(monkeypatch):
+    api = FakeRatesAPI()
+    monkeypatch.setattr(requests, 'get', api)
+    return api
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """Environment for create_app(); tests can add settings before requesting the app fixture."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('EXCHANGE_RATE_API_KEY', 'test-key')
+    monkeypatch.setenv('GEMINI_API_KEY', '') # AI disabled unless a test enables it
+    monkeypatch.setenv('EXCHANGE_RATE_MODE', 'table')
+    return monkeypatch
+
+
+@pytest.fixture
+def app(app_env, rates_api):
+    app = create_app()
+    app.config['TESTING'] = True
+    reset_process_state()
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        db.session.add(User(id=1, username='demouser', email='demo@example.com'))
+        db.session.commit()
+
+    with app.app_context():
+        yield app
+        from app.services.chat_history_service import flush_chat_history
+        flush_chat_history()
+        db.session.remove()
+        db.engine.dispose()
+    reset_process_state()
+
+
+@pytest.fixture
+def gemini(app, monkeypatch):
+    """Enables the AI features with the models talking to a FakeGemini."""
+    import google.generativeai.client as genai_client
+    from app.services.ai_service import init_ai
+    fake = FakeGemini()
+    monkeypatch.setattr(genai_client, 'get_default_generative_client', lambda: fake)
+    app.config['AI_ENABLED'] = True
+    init_ai(app) # Fresh models, so none holds a client from an earlier test
+    return fake
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,49 @@
+# tests/test_add_transactions.py
+from sqlalchemy import event
+
+from app import db
+from app.models import Transaction
+from app.services.financial_service import add_transactions
+
+ITEMS = [
+    {'amount': 20, 'currency': 'usd', 'category': 'Coffee', 'type': 'expense', 'description': 'coffee', 'date': '2024-01-05'},
+    {'amount': 45, 'currency': 'USD', 'category': 'Transport', 'type': 'expense', 'description': 'gas', 'date': '2024-01-05'},
+    {'amount': 300, 'currency': 'EUR', 'category': 'Salary', 'type': 'income', 'description': 'bonus', 'date': '2024-01-06', 'time': '18:00'},
+]
+
+
+def test_batch_is_inserted_with_one_commit(app):
+    commits = []
+    count_commit = lambda conn: commits.append(conn)
+    event.listen(db.engine, 'commit', count_commit)
+    try:
+        result = add_transactions(1, ITEMS)
+    finally:
+        event.remove(db.engine, 'commit', count_commit)
+
+    assert result.startswith("Added 3 transactions")
+    assert "Totals: expense 65.00 USD, income 300.00 EUR" in result
+    assert Transaction.query.count() == 3
+    assert len(commits) == 1
+
+
+def test_one_invalid_item_rejects_the_whole_batch(app):
+    items = ITEMS + [{'amount': 5, 'currency': 'DOLLARS', 'category': 'x', 'type': 'expense', 'description': 'bad'}]
+
+    result = add_transactions(1, items)
+
+    assert result.startswith("No transactions were added")
+    assert "#4:" in result
+    assert Transaction.query.count() == 0
+
+
+def test_items_without_date_share_one_timestamp(app):
+    add_transactions(1, [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense', 'description': 'a'},
+                         {'amount': 2, 'currency': 'USD', 'category': 'x', 'type': 'expense', 'description': 'b'}])
+
+    dates = {tx.date for tx in Transaction.query.all()}
+    assert len(dates) == 1
+
+
+def test_empty_batch(app):
+    assert add_transactions(1, []) == "No transactions provided."
@@ -0,0 +1,67 @@
+# tests/test_analytics.py
+from datetime import datetime
+
+import pytest
+
+from app.services.analytics_service import get_transaction_breakdown, get_frame_cache_stats
+from app.services.financial_service import add_transaction, _sum_by_type_and_currency
+
+
+@pytest.fixture
+def ledger(app):
+    for amount, currency, category, day in [(30, 'USD', 'Food', '2024-01-05'), (10, 'EUR', 'Food', '2024-01-20'),
+                                            (50, 'USD', 'Rent', '2024-02-01'), (4, 'GBP', 'Books', '2024-02-15')]:
+        add_transaction(1, amount, currency, category, 'expense', 'x', day)
+    add_transaction(1, 900, 'USD', 'Salary', 'income', 'pay', '2024-01-01')
+    return app
+
+
+def test_breakdown_by_category_in_target_currency(ledger):
+    breakdown = get_transaction_breakdown(1, 'expense', '2024-01-01', '2024-02-29', 'category', 'USD')
+
+    assert breakdown['total'] == pytest.approx(116.0)
+    assert breakdown['groups'] == [
+        {'category': 'Food', 'total': 50.0},
+        {'category': 'Rent', 'total': 50.0},
+        {'category': 'Books', 'total': 16.0},
+    ]
+
+
+def test_breakdown_by_month_includes_empty_months(ledger):
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'x', '2024-04-02')
+
+    breakdown = get_transaction_breakdown(1, 'expense', '2024-01-01', '2024-12-31', 'month', 'EUR')
+
+    assert breakdown['groups'] == [
+        {'month': '2024-01', 'total': 25.0},
+        {'month': '2024-02', 'total': 33.0},
+        {'month': '2024-03', 'total': 0.0},
+        {'month': '2024-04', 'total': 2.5},
+    ]
+
+
+def test_frame_is_reloaded_after_a_write(ledger):
+    first = get_transaction_breakdown(1, 'income', '2024-01-01', '2024-01-31', 'category', 'USD')
+    loads = get_frame_cache_stats()['misses']
+    add_transaction(1, 100, 'USD', 'Gift', 'income', 'x', '2024-01-10')
+
+    second = get_transaction_breakdown(1, 'income', '2024-01-01', '2024-01-31', 'category', 'USD')
+
+    assert first['total'] == 900.0 and second['total'] == 1000.0
+    assert get_frame_cache_stats()['misses'] == loads + 1
+
+
+def test_breakdown_rejects_bad_arguments(ledger):
+    assert isinstance(get_transaction_breakdown(1, 'spending', '2024-01-01', '2024-01-31', 'category', 'USD'), str)
+    assert isinstance(get_transaction_breakdown(1, 'expense', '2024-01-01', '2024-01-31', 'week', 'USD'), str)
+    assert isinstance(get_transaction_breakdown(1, 'expense', 'Jan 1', '2024-01-31', 'category', 'USD'), str)
+
+
+@pytest.mark.parametrize('range_index, rollups', [(True, True), (False, True), (False, False)])
+def test_every_totals_source_agrees(ledger, range_index, rollups):
+    ledger.config['RANGE_INDEX_ENABLED'] = range_index
+    ledger.config['ROLLUPS_ENABLED'] = rollups
+
+    totals = _sum_by_type_and_currency(1, datetime(2024, 1, 5), datetime(2024, 2, 15))
+
+    assert totals == {'expense': {'USD': 80.0, 'EUR': 10.0}}
@@ -0,0 +1,73 @@
+# tests/test_app_timezone.py
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.models import Transaction
+from app.services.ai_service import handle_ai_query, get_ai_stats
+from app.services.datetime_service import get_current_datetime, now_in_app_timezone
+from app.services.financial_service import add_transaction, get_financial_overview
+
+# UTC+14: on a UTC server its date is a day ahead for ten hours of every day
+ZONE = 'Pacific/Kiritimati'
+
+
+@pytest.fixture
+def zoned_app(app):
+    app.config['APP_TIMEZONE'] = ZONE
+    return app
+
+
+def _today():
+    return datetime.now(ZoneInfo(ZONE)).strftime('%Y-%m-%d')
+
+
+def test_now_follows_the_app_timezone(zoned_app):
+    now = now_in_app_timezone()
+
+    assert now.tzinfo is None
+    assert now.strftime('%Y-%m-%d') == _today() == get_current_datetime()['date']
+
+
+def test_invalid_timezone_falls_back_to_server_time(app):
+    app.config['APP_TIMEZONE'] = 'Mars/Olympus_Mons'
+
+    assert abs((now_in_app_timezone() - datetime.now()).total_seconds()) < 5
+
+
+def test_default_transaction_date_is_today_in_the_app_timezone(zoned_app):
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'no date given')
+
+    assert Transaction.query.one().date.strftime('%Y-%m-%d') == _today()
+
+
+def test_imported_rows_without_a_date_use_the_app_timezone(zoned_app, client):
+    client.post('/api/transactions/import', data="type,amount,currency\nexpense,3,USD\n", content_type='text/csv')
+
+    assert Transaction.query.one().date.strftime('%Y-%m-%d') == _today()
+
+
+def test_overview_runs_up_to_today_in_the_app_timezone(zoned_app):
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'today', _today())
+
+    assert get_financial_overview(1)['expense'] == 5.0
+
+
+@pytest.mark.parametrize('call, counted', [
+    (('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR'}), False),
+    (('get_financial_overview', {'target_currency': 'EUR'}), False),
+    (('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR', 'date': '2024-01-05'}), True),
+    (('get_financial_summary', {'transaction_type': 'expense', 'start_date': '2024-01-01', 'end_date': '2024-01-31'}), True),
+    (('add_transactions', {'transactions': [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense',
+                                             'description': 'a', 'date': '2024-01-05'}]}), True),
+    (('add_transactions', {'transactions': [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense',
+                                             'description': 'a'}]}), False),
+])
+def test_saved_round_trips_count_only_calls_with_dates(gemini, call, counted):
+    gemini.reply([call], ['Done.'])
+    before = get_ai_stats()['saved_round_trips']
+
+    handle_ai_query(1, 'do it')
+
+    assert get_ai_stats()['saved_round_trips'] - before == int(counted)
@@ -0,0 +1,69 @@
+# tests/test_chat_archive.py
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ChatHistory, ChatHistoryArchive
+from app.services.chat_archive_service import archive_chat_history, get_archived_chat_history, MAX_ARCHIVE_FETCH_DAYS
+
+
+def _add_entries(day, count, first=0):
+    db.session.add_all([ChatHistory(user_id=1, message=f"question {n} " * 20, response=f"answer {n} " * 40,
+                                    timestamp=day + timedelta(minutes=n)) for n in range(first, first + count)])
+    db.session.commit()
+
+
+def _day(days_ago):
+    return datetime.combine(datetime.utcnow().date() - timedelta(days=days_ago), datetime.min.time())
+
+
+def test_old_entries_move_into_one_compressed_row_per_day(app):
+    _add_entries(_day(100), 30)
+    _add_entries(_day(99), 5)
+    _add_entries(_day(1), 3) # Inside the retention window
+
+    report = archive_chat_history(older_than_days=90, batch_size=7)
+
+    assert report['archived'] == 35 and report['archive_days'] == 2
+    assert report['compression_ratio'] > 5
+    assert ChatHistory.query.count() == 3
+    archive = ChatHistoryArchive.query.filter_by(day=_day(100).date()).one()
+    assert archive.entry_count == 30 # Merged across the batches that split the day
+    assert len(archive.payload) < archive.raw_bytes
+
+
+def test_rerun_merges_late_entries_in_order(app):
+    _add_entries(_day(100), 4, first=2)
+    archive_chat_history(older_than_days=90)
+    _add_entries(_day(100), 2) # Older timestamps on an already archived day
+
+    assert archive_chat_history(older_than_days=90)['archived'] == 2
+    assert archive_chat_history(older_than_days=90)['archived'] == 0
+
+    day = _day(100).strftime('%Y-%m-%d')
+    history = get_archived_chat_history(1, day, day)['history']
+    assert [entry['message'].split()[1] for entry in history] == ['0', '1', '2', '3', '4', '5']
+
+
+def test_fetch_by_date_range(app, client):
+    _add_entries(_day(120), 2)
+    _add_entries(_day(100), 3)
+    archive_chat_history(older_than_days=90)
+
+    start, end = _day(125).strftime('%Y-%m-%d'), _day(110).strftime('%Y-%m-%d')
+    response = client.get(f"/api/chat-history/archive?start_date={start}&end_date={end}")
+
+    assert response.status_code == 200
+    assert len(response.get_json()['history']) == 2
+
+
+def test_fetch_rejects_bad_ranges(app, client):
+    assert client.get('/api/chat-history/archive?start_date=2024-02-01&end_date=2024-01-01').status_code == 400
+    assert client.get('/api/chat-history/archive?start_date=yesterday&end_date=2024-01-01').status_code == 400
+    end = (datetime(2024, 1, 1) + timedelta(days=MAX_ARCHIVE_FETCH_DAYS)).strftime('%Y-%m-%d')
+    assert client.get(f"/api/chat-history/archive?start_date=2024-01-01&end_date={end}").status_code == 400
+
+
+def test_archival_releases_free_pages(app):
+    _add_entries(_day(100), 400)
+
+    assert archive_chat_history(older_than_days=90)['freed_pages'] > 0
@@ -0,0 +1,86 @@
+# tests/test_chat_history_writer.py
+import threading
+
+import pytest
+
+from app.models import ChatHistory
+from app.services import chat_history_service
+from app.services.chat_history_service import ChatHistoryWriter, record_chat, flush_chat_history, get_chat_history_writer_stats
+
+
+@pytest.fixture
+def writer(app, monkeypatch):
+    """A private writer, so tests can size its queue and stall it without touching the shared one."""
+    writer = ChatHistoryWriter(maxsize=2, batch_size=10, flush_interval=0.01)
+    writer.configure(app)
+    monkeypatch.setattr(chat_history_service, '_writer', writer)
+    yield writer
+    writer.stop()
+
+
+def test_entries_are_written_in_the_background(app):
+    record_chat(1, 'hi', 'hello', [{'role': 'model', 'parts': []}])
+
+    assert flush_chat_history()
+    entry = ChatHistory.query.one()
+    assert (entry.message, entry.response, entry.tool_parts) == ('hi', 'hello', '[{"role":"model","parts":[]}]')
+
+
+def test_concurrent_writers_are_group_committed(app):
+    before = get_chat_history_writer_stats()
+
+    def chat(worker):
+        with app.app_context():
+            for turn in range(25):
+                record_chat(1, f"{worker}-{turn}", 'ok')
+
+    threads = [threading.Thread(target=chat, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert flush_chat_history()
+
+    stats = get_chat_history_writer_stats()
+    assert ChatHistory.query.count() == 200
+    assert len({entry.message for entry in ChatHistory.query.all()}) == 200
+    written = stats['written'] - before['written']
+    flushes = stats['flushes'] - before['flushes']
+    assert written + stats['sync_writes'] - before['sync_writes'] == 200
+    assert flushes < written # Several entries per transaction
+
+
+def test_full_queue_falls_back_to_a_synchronous_write(app, writer, monkeypatch):
+    writer.batch_size = 1
+    release = threading.Event()
+    real_write = writer._write
+    monkeypatch.setattr(writer, '_write', lambda batch: (release.wait(5), real_write(batch)))
+
+    for turn in range(6):
+        record_chat(1, f"turn {turn}", 'ok')
+
+    assert writer.stats()['sync_writes'] >= 3 # At most one entry in flight plus two queued
+    release.set()
+    assert writer.flush()
+    assert ChatHistory.query.count() == 6
+
+
+def test_write_behind_can_be_disabled(app, writer):
+    app.config['CHAT_HISTORY_WRITE_BEHIND'] = False
+
+    record_chat(1, 'hi', 'hello')
+
+    assert ChatHistory.query.count() == 1
+    assert writer.stats()['enqueued'] == 0
+
+
+def test_stop_drains_the_queue(app, writer):
+    writer.maxsize = 100
+    writer._queue.maxsize = 100
+    for turn in range(20):
+        record_chat(1, f"turn {turn}", 'ok')
+
+    writer.stop()
+
+    assert ChatHistory.query.count() == 20
+    assert writer.stats()['written'] == 20
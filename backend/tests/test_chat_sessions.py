@@ -0,0 +1,203 @@
+# tests/test_chat_sessions.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ChatHistory
+from app.services.ai_service import handle_ai_query
+from app.services.chat_history_service import flush_chat_history
+from app.services.chat_session_service import ChatSessionStore
+
+
+class FakeChat:
+    def __init__(self, name=None):
+        self.name = name
+        self.history = []
+        self._history = []
+
+
+class Tracker:
+    """Records how many requests are inside a session block at once, per user."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+
+    def enter(self, user_id):
+        with self.lock:
+            self.active[user_id] = self.active.get(user_id, 0) + 1
+            self.max_active[user_id] = max(self.max_active.get(user_id, 0), self.active[user_id])
+
+    def leave(self, user_id):
+        with self.lock:
+            self.active[user_id] -= 1
+
+
+def test_requests_for_one_user_are_serialized_and_share_a_session():
+    store, tracker, built = ChatSessionStore(), Tracker(), []
+
+    def request():
+        with store.session(1, lambda: built.append(1) or FakeChat()):
+            tracker.enter(1)
+            time.sleep(0.01)
+            tracker.leave(1)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert tracker.max_active[1] == 1
+    assert len(built) == 1
+    assert (store.hits, store.misses) == (7, 1)
+
+
+def test_different_users_proceed_in_parallel():
+    store = ChatSessionStore()
+    both_inside = threading.Barrier(2, timeout=5)
+    errors = []
+
+    def request(user_id):
+        with store.session(user_id, FakeChat):
+            try:
+                both_inside.wait()
+            except threading.BrokenBarrierError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(user_id,)) for user_id in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert errors == []
+
+
+def test_waiter_moves_to_the_replacement_when_its_entry_is_dropped():
+    store, tracker = ChatSessionStore(), Tracker()
+    holding, release = threading.Event(), threading.Event()
+    seen = []
+
+    def first():
+        with store.session(1, FakeChat):
+            holding.set()
+            release.wait(5)
+
+    def request():
+        with store.session(1, FakeChat) as entry:
+            tracker.enter(1)
+            seen.append(store._sessions.get(1) is entry)
+            time.sleep(0.02)
+            tracker.leave(1)
+
+    holder = threading.Thread(target=first)
+    holder.start()
+    holding.wait(5)
+    waiter = threading.Thread(target=request) # Blocks on the first request's entry
+    waiter.start()
+    time.sleep(0.02)
+    store.reset(1) # The entry the waiter is queued on leaves the store
+    newcomer = threading.Thread(target=request) # Gets a fresh entry straight away
+    newcomer.start()
+    time.sleep(0.005)
+    release.set()
+    for thread in (holder, waiter, newcomer):
+        thread.join(10)
+
+    assert seen == [True, True]
+    assert tracker.max_active[1] == 1
+
+
+def test_busy_session_times_out():
+    store, outcome = ChatSessionStore(lock_timeout=0.05), []
+
+    def second_request():
+        try:
+            with store.session(1, FakeChat):
+                outcome.append('entered')
+        except TimeoutError:
+            outcome.append('timed out')
+
+    with store.session(1, FakeChat):
+        thread = threading.Thread(target=second_request)
+        thread.start()
+        thread.join(5)
+
+    assert outcome == ['timed out']
+
+
+def test_newer_stored_turn_rebuilds_the_session_under_the_lock():
+    store, order = ChatSessionStore(), []
+    now = datetime(2024, 1, 1, 12)
+
+    with store.session(1, lambda: FakeChat('first'), now) as entry:
+        pass
+
+    def latest_turn_at():
+        order.append('latest')
+        return now + timedelta(seconds=1)
+
+    with store.session(1, lambda: order.append('build') or FakeChat('second'), latest_turn_at) as entry:
+        assert entry.chat.name == 'second'
+        assert entry.synced_at == now + timedelta(seconds=1)
+
+    assert order == ['latest', 'build']
+    assert store.stale_reloads == 1
+
+
+def test_idle_session_expires():
+    store = ChatSessionStore(idle_ttl=0.01)
+    with store.session(1, lambda: FakeChat('first')):
+        pass
+    time.sleep(0.03)
+
+    with store.session(1, lambda: FakeChat('second')) as entry:
+        assert entry.chat.name == 'second'
+    assert store.expirations == 1
+
+
+def test_failed_build_leaves_the_store_usable():
+    store = ChatSessionStore()
+
+    def broken():
+        raise RuntimeError("history unavailable")
+
+    with pytest.raises(RuntimeError):
+        with store.session(1, broken):
+            pass
+    assert store.stats()['sessions'] == 1 # Empty entry, built by the next request
+
+    with store.session(1, lambda: FakeChat('retry')) as entry:
+        assert entry.chat.name == 'retry'
+
+
+def test_lru_limit_keeps_busy_sessions():
+    store = ChatSessionStore(max_sessions=2)
+    with store.session(1, FakeChat):
+        for user_id in (2, 3, 4):
+            with store.session(user_id, FakeChat):
+                pass
+
+        assert list(store._sessions) == [1, 4]
+    assert store.evictions == 2
+
+
+def test_turn_from_another_worker_is_picked_up(gemini):
+    gemini.reply(['First answer'])
+    handle_ai_query(1, 'first question')
+    flush_chat_history()
+    # Another worker answers a message for the same user
+    db.session.add(ChatHistory(user_id=1, message='question elsewhere', response='answer elsewhere',
+                               timestamp=datetime.utcnow() + timedelta(seconds=1)))
+    db.session.commit()
+    gemini.reply(['Second answer'])
+
+    assert handle_ai_query(1, 'second question') == 'Second answer'
+
+    sent = [part.text for content in gemini.requests[-1].contents for part in content.parts]
+    assert 'question elsewhere' in sent and 'answer elsewhere' in sent
@@ -0,0 +1,69 @@
+# tests/test_chat_stream.py
+import json
+
+from app.models import ChatHistory
+from app.services.chat_history_service import flush_chat_history
+
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event_line, data_line = block.split('\n')
+        events.append((event_line.removeprefix('event: '), json.loads(data_line.removeprefix('data: '))))
+    return events
+
+
+def test_answer_chunks_arrive_as_text_events(gemini, client):
+    gemini.reply(['Hello ', 'there, ', 'how can I help?'])
+
+    response = client.post('/api/chat/stream', json={'message': 'hi'})
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert _events(response) == [
+        ('text', {'text': 'Hello '}), ('text', {'text': 'there, '}), ('text', {'text': 'how can I help?'}),
+        ('done', {'response': 'Hello there, how can I help?'}),
+    ]
+    flush_chat_history()
+    assert ChatHistory.query.one().response == 'Hello there, how can I help?'
+
+
+def test_tool_calls_are_reported_with_status_events(gemini, client):
+    gemini.reply([('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR'})], ['1 USD = 0.5 EUR'])
+
+    events = _events(client.post('/api/chat/stream', json={'message': 'usd to eur'}))
+
+    assert events == [
+        ('status', {'tool': 'get_exchange_rate', 'state': 'running'}),
+        ('status', {'tool': 'get_exchange_rate', 'state': 'done'}),
+        ('text', {'text': '1 USD = 0.5 EUR'}),
+        ('done', {'response': '1 USD = 0.5 EUR'}),
+    ]
+
+
+def test_failed_tool_is_reported_as_an_error(gemini, client):
+    gemini.reply([('delete_everything', {})], ['I cannot do that.'])
+
+    events = _events(client.post('/api/chat/stream', json={'message': 'delete it all'}))
+
+    assert ('status', {'tool': 'delete_everything', 'state': 'error'}) in events
+    assert events[-1] == ('done', {'response': 'I cannot do that.'})
+
+
+def test_stream_and_plain_endpoints_store_the_same_response(gemini, client):
+    gemini.reply(['Same answer'], ['Same answer'])
+
+    streamed = _events(client.post('/api/chat/stream', json={'message': 'q'}))[-1][1]['response']
+    plain = client.post('/api/chat', json={'message': 'q'}).get_json()['response']
+
+    assert streamed == plain == 'Same answer'
+
+
+def test_disabled_assistant_still_ends_the_stream(client):
+    events = _events(client.post('/api/chat/stream', json={'message': 'hi'}))
+
+    assert events == [('done', {'response': 'AI Assistant is not available: API key not configured.'})]
+
+
+def test_missing_message_is_rejected(client):
+    assert client.post('/api/chat/stream', json={}).status_code == 400
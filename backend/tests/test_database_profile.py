@@ -0,0 +1,57 @@
+# tests/test_database_profile.py
+import logging
+
+import pytest
+
+from app import create_app, db
+from app.database import build_engine_options, get_sqlite_pragmas, _engines
+
+CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///ledger.db',
+    'DB_POOL_SIZE': 10, 'DB_MAX_OVERFLOW': 20, 'DB_POOL_TIMEOUT': 30, 'DB_POOL_RECYCLE': 1800,
+    'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'normal', 'SQLITE_TEMP_STORE': 'memory',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000, 'SQLITE_CACHE_SIZE': -64000, 'SQLITE_MMAP_SIZE': 1024,
+}
+
+
+def test_every_connection_gets_the_sqlite_profile(app):
+    with db.engine.connect() as conn:
+        applied = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                   for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store')}
+
+    assert applied == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -64000, 'temp_store': 2}
+
+
+def test_creating_the_app_opens_no_connection(app_env, tmp_path, caplog):
+    app = create_app()
+
+    assert not (tmp_path / 'test.db').exists() # SQLite creates the file on the first connection
+    with app.app_context(), caplog.at_level(logging.INFO):
+        assert db.engine in _engines # Reset in forked children
+        db.engine.connect().close()
+        db.engine.dispose()
+    assert "SQLite profile for engine 'default'" in caplog.text and "journal_mode=wal" in caplog.text
+
+
+def test_pool_options_for_file_and_server_databases():
+    assert build_engine_options(CONFIG) == {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30}
+
+    options = build_engine_options(CONFIG, 'postgresql://db/ledger')
+    assert options['pool_recycle'] == 1800 and options['pool_pre_ping'] is True
+
+
+def test_in_memory_sqlite_has_no_pool_options():
+    assert build_engine_options(CONFIG, 'sqlite://') == {}
+    assert build_engine_options(CONFIG, 'sqlite:///:memory:') == {}
+
+
+def test_profile_values_are_normalised():
+    pragmas = get_sqlite_pragmas(CONFIG)
+
+    assert (pragmas['journal_mode'], pragmas['synchronous'], pragmas['temp_store']) == ('WAL', 'NORMAL', 'MEMORY')
+
+
+@pytest.mark.parametrize('setting', ['SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_TEMP_STORE'])
+def test_invalid_profile_values_are_rejected(setting):
+    with pytest.raises(ValueError, match=setting):
+        get_sqlite_pragmas({**CONFIG, setting: 'fast'})
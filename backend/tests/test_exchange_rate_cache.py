@@ -0,0 +1,144 @@
+# tests/test_exchange_rate_cache.py
+import threading
+import time
+
+import pytest
+
+from app.services.cache_service import TTLCache
+from app.services.exchange_service import get_exchange_rate, get_rate_cache_stats
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1 # 'b' is now the least recently used
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_configure_keeps_limits_that_are_not_passed():
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    cache.configure(maxsize=5)
+    assert (cache.maxsize, cache.ttl) == (5, 60)
+    cache.configure(ttl=30)
+    assert (cache.maxsize, cache.ttl) == (5, 30)
+    cache.configure(ttl=0) # Disables expiry
+    assert cache.ttl is None
+
+
+def test_rejected_results_are_not_cached():
+    cache = TTLCache()
+    results = iter(["error", 1.5])
+    loader = lambda: next(results)
+    should_cache = lambda value: isinstance(value, float)
+
+    assert cache.get_or_load('k', loader, should_cache) == "error"
+    assert cache.get_or_load('k', loader, should_cache) == 1.5
+    assert cache.get_or_load('k', loader, should_cache) == 1.5 # Served from the cache
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    loads = []
+    release = threading.Event()
+
+    def loader():
+        loads.append(1)
+        release.wait(5)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced_misses'] < 7:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads == [1]
+    assert results == [42] * 8
+
+
+def test_loader_error_reaches_every_waiter():
+    cache = TTLCache()
+    started = threading.Event()
+
+    def loader():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("upstream failed")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load('k', loader)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert cache.get('k') is None
+
+
+def test_repeated_pair_lookups_hit_the_cache(app, rates_api):
+    app.config['EXCHANGE_RATE_MODE'] = 'pair'
+    hits_before = get_rate_cache_stats()['hits']
+
+    rates = [get_exchange_rate('EUR', 'USD') for _ in range(50)]
+
+    assert rates == [pytest.approx(2.0)] * 50
+    assert len(rates_api.calls) == 1
+    assert get_rate_cache_stats()['hits'] - hits_before == 49
+
+
+def test_concurrent_pair_lookups_make_one_upstream_request(app, rates_api):
+    app.config['EXCHANGE_RATE_MODE'] = 'pair'
+    rates_api.delay = 0.1
+    results = []
+
+    def lookup():
+        with app.app_context():
+            results.append(get_exchange_rate('GBP', 'USD'))
+
+    threads = [threading.Thread(target=lookup) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [pytest.approx(4.0)] * 6
+    assert len(rates_api.calls) == 1
+
+
+def test_api_errors_are_not_cached(app, rates_api):
+    app.config['EXCHANGE_RATE_MODE'] = 'pair'
+    rates_api.fail = True
+    assert isinstance(get_exchange_rate('EUR', 'USD'), str)
+
+    rates_api.fail = False
+    assert get_exchange_rate('EUR', 'USD') == pytest.approx(2.0)
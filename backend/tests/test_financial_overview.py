@@ -0,0 +1,55 @@
+# tests/test_financial_overview.py
+from datetime import date
+
+import pytest
+
+from app.services.financial_service import add_transaction, get_financial_overview
+from app.services.rate_history_service import record_rates
+
+
+@pytest.fixture
+def ledger(app):
+    add_transaction(1, 500, 'USD', 'Salary', 'income', 'pay', '2024-01-02')
+    add_transaction(1, 100, 'EUR', 'Freelance', 'income', 'gig', '2024-01-20')
+    add_transaction(1, 40, 'USD', 'Food', 'expense', 'groceries', '2024-01-05')
+    add_transaction(1, 10, 'GBP', 'Books', 'expense', 'novel', '2024-02-10')
+    return app
+
+
+def test_overview_totals_both_sides_in_one_pass(ledger, rates_api):
+    overview = get_financial_overview(1, '2024-01-01', '2024-01-31', 'USD')
+
+    assert overview['income'] == pytest.approx(700.0)
+    assert overview['expense'] == pytest.approx(40.0)
+    assert overview['net'] == pytest.approx(660.0)
+    assert overview['breakdown'] == {'income': {'USD': 500.0, 'EUR': 100.0}, 'expense': {'USD': 40.0}}
+    assert len(rates_api.calls) == 1
+
+
+def test_overview_without_start_date_covers_all_records(ledger):
+    overview = get_financial_overview(1, end_date='2024-12-31', target_currency='EUR')
+
+    assert overview['start_date'] is None
+    assert overview['income'] == pytest.approx(350.0)
+    assert overview['expense'] == pytest.approx(40.0) # 20 EUR + 10 GBP (20 EUR)
+
+
+def test_overview_end_date_defaults_to_today(ledger):
+    overview = get_financial_overview(1, start_date='2024-01-01')
+
+    assert overview['end_date'] >= '2024-02-10'
+    assert overview['expense'] == pytest.approx(80.0)
+
+
+def test_past_months_are_converted_at_their_stored_rate(ledger, rates_api):
+    record_rates('USD', {'EUR': 0.8, 'GBP': 0.5, 'ETB': 100}, on_date=date(2024, 1, 31)) # Today 1 EUR = 2 USD, 1 GBP = 4 USD
+
+    overview = get_financial_overview(1, '2024-01-01', '2024-02-29', 'USD')
+
+    assert overview['income'] == pytest.approx(625.0) # 100 EUR at 1.25
+    assert overview['expense'] == pytest.approx(60.0) # 10 GBP at 2 (February falls back to the January 31 snapshot)
+    assert overview['breakdown']['income'] == {'USD': 500.0, 'EUR': 100.0}
+
+
+def test_overview_reports_bad_dates(ledger):
+    assert isinstance(get_financial_overview(1, '01/01/2024', '2024-01-31'), str)
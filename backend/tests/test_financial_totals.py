@@ -0,0 +1,52 @@
+# tests/test_financial_totals.py
+from datetime import date
+
+import pytest
+
+from app.services.financial_service import add_transaction, get_total_by_type
+from app.services.rate_history_service import record_rates
+
+
+@pytest.fixture
+def ledger(app):
+    app.config['ROLLUPS_ENABLED'] = False # Sum straight from the transaction table
+    app.config['RANGE_INDEX_ENABLED'] = False
+    for amount, currency, day in [(10, 'USD', '2024-01-05'), (10, 'eur', '2024-01-06'), (1, 'GBP', '2024-01-31'),
+                                  (100, 'ETB', '2024-02-01'), (7, 'USD', '2023-12-31')]:
+        add_transaction(1, amount, currency, 'Food', 'expense', 'meal', day)
+    add_transaction(1, 500, 'USD', 'Salary', 'income', 'pay', '2024-01-02')
+    return app
+
+
+def test_totals_are_grouped_by_currency_and_converted_once(ledger, rates_api):
+    # 10 USD + 10 EUR (x2) + 1 GBP (x4)
+    assert get_total_by_type(1, 'expense', '2024-01-01', '2024-01-31', 'USD') == pytest.approx(34.0)
+    assert len(rates_api.calls) == 1
+
+
+def test_past_months_are_converted_at_their_stored_rate(ledger, rates_api):
+    record_rates('USD', {'EUR': 0.8, 'GBP': 0.5, 'ETB': 100}, on_date=date(2024, 1, 31)) # Today 1 EUR = 2 USD, 1 GBP = 4 USD
+
+    # 10 USD + 10 EUR (x1.25) + 1 GBP (x2), at the rates stored on the last day of January
+    assert get_total_by_type(1, 'expense', '2024-01-01', '2024-01-31', 'USD') == pytest.approx(24.5)
+
+
+def test_end_date_is_inclusive(ledger):
+    assert get_total_by_type(1, 'expense', '2024-02-01', '2024-02-01', 'USD') == pytest.approx(1.0)
+    assert get_total_by_type(1, 'income', '2024-01-02', '2024-01-02', 'EUR') == pytest.approx(250.0)
+
+
+def test_empty_range_totals_zero(ledger):
+    assert get_total_by_type(1, 'expense', '2022-01-01', '2022-12-31', 'USD') == 0.0
+
+
+def test_invalid_date_is_reported(ledger):
+    assert isinstance(get_total_by_type(1, 'expense', '2024/01/01', '2024-01-31'), str)
+
+
+def test_conversion_failure_is_reported(ledger, rates_api):
+    rates_api.fail = True
+
+    result = get_total_by_type(1, 'expense', '2024-01-01', '2024-01-31', 'USD')
+
+    assert isinstance(result, str) and 'conversion failed' in result
@@ -0,0 +1,51 @@
+# tests/test_migrations.py
+from sqlalchemy import inspect, text
+
+from app import db
+from app.migrations import MIGRATIONS, get_applied_versions, run_migrations
+from app.models import SchemaMigration
+
+
+def _index_names(table):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+
+def test_every_migration_is_recorded_once(app):
+    assert get_applied_versions() == {version for version, _, _ in MIGRATIONS}
+    assert run_migrations() == []
+
+
+def test_versions_are_unique_and_ascending():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_older_database_gains_indexes_and_columns(app):
+    # Roll the schema back to what a database from before migrations 1 and 4 looked like
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_transaction_user_type_date"))
+        conn.execute(text("DROP INDEX ix_chat_history_user_timestamp"))
+        conn.execute(text("ALTER TABLE chat_history DROP COLUMN tool_parts"))
+    SchemaMigration.query.filter(SchemaMigration.version.in_([1, 4])).delete()
+    db.session.commit()
+    db.session.remove()
+
+    assert run_migrations() == [1, 4]
+
+    assert 'ix_transaction_user_type_date' in _index_names('transaction')
+    assert 'ix_chat_history_user_timestamp' in _index_names('chat_history')
+    assert 'tool_parts' in {column['name'] for column in inspect(db.engine).get_columns('chat_history')}
+
+
+def test_range_query_uses_the_composite_index(app):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT currency, SUM(amount) FROM \"transaction\" "
+        "WHERE user_id = 1 AND type = 'expense' AND date >= '2024-01-01' AND date < '2024-02-01' GROUP BY currency"
+    )).all()
+
+    assert any('ix_transaction_user_type_date' in row[-1] for row in plan)
+
+
+def test_incremental_vacuum_is_enabled(app):
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
@@ -0,0 +1,48 @@
+# tests/test_model_registry.py
+import json
+
+import google.generativeai as genai
+
+from app.services import ai_service
+from app.services.ai_service import handle_ai_query, ingest_statement, get_chat_model, get_statement_model, TOOL_DECLARATIONS
+
+
+def test_requests_reuse_the_models_built_at_startup(gemini, monkeypatch):
+    built = []
+    real_model = genai.GenerativeModel
+    monkeypatch.setattr(genai, 'GenerativeModel', lambda *args, **kwargs: built.append(kwargs) or real_model(*args, **kwargs))
+    chat_model, statement_model = get_chat_model(), get_statement_model()
+    gemini.reply(['Hello!'], ['Hello again!'], ['[]'], ['[]'])
+
+    assert handle_ai_query(1, 'hi') == 'Hello!'
+    assert handle_ai_query(1, 'hi') == 'Hello again!'
+    ingest_statement(1, 'nothing here')
+    ingest_statement(1, 'nothing here either')
+
+    assert built == []
+    assert get_chat_model() is chat_model and get_statement_model() is statement_model
+
+
+def test_chat_requests_carry_the_prebuilt_tools(gemini):
+    gemini.reply(['Hello!'])
+
+    handle_ai_query(1, 'hi')
+
+    request = gemini.requests[0]
+    assert {declaration.name for tool in request.tools for declaration in tool.function_declarations} == \
+        {declaration['name'] for declaration in TOOL_DECLARATIONS}
+    assert request.system_instruction.parts[0].text == ai_service.SYSTEM_INSTRUCTION
+
+
+def test_statement_requests_ask_for_json(gemini):
+    gemini.reply([json.dumps([])])
+
+    ingest_statement(1, 'nothing here')
+
+    assert gemini.requests[0].generation_config.response_mime_type == 'application/json'
+
+
+def test_models_are_built_on_demand_without_init(app, monkeypatch):
+    monkeypatch.setattr(ai_service, '_chat_model', None)
+
+    assert get_chat_model() is get_chat_model()
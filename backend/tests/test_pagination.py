@@ -0,0 +1,67 @@
+# tests/test_pagination.py
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ChatHistory
+from app.services.financial_service import add_transactions
+from app.services.pagination_service import MAX_PAGE_SIZE, decode_cursor, encode_cursor, parse_page_size
+
+
+def _walk(client, url, key, cursor_param):
+    pages, cursor = [], None
+    while True:
+        page = client.get(url + (f"&{cursor_param}={cursor}" if cursor else '')).get_json()
+        pages.append(page[key])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_chat_history_pages_cover_every_entry_once(app, client):
+    start = datetime(2024, 1, 1)
+    # Pairs of entries share a timestamp, so pages must break ties on id
+    db.session.add_all([ChatHistory(user_id=1, message=f"m{n}", response='r', timestamp=start + timedelta(minutes=n // 2))
+                        for n in range(11)])
+    db.session.commit()
+
+    pages = _walk(client, '/api/chat-history?limit=4', 'history', 'before')
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [entry['message'] for entry in pages[0]] == ['m7', 'm8', 'm9', 'm10'] # Newest page, oldest entry first
+    messages = [entry['message'] for page in reversed(pages) for entry in page]
+    assert messages == [f"m{n}" for n in range(11)]
+
+
+def test_transaction_pages_with_filters(app, client):
+    add_transactions(1, [{'amount': n, 'currency': 'USD', 'category': 'Food' if n % 2 else 'Rent', 'type': 'expense',
+                          'description': f"t{n}", 'date': f"2024-01-{n:02d}"} for n in range(1, 21)])
+
+    pages = _walk(client, '/api/transactions?limit=3&category=food&start_date=2024-01-05&end_date=2024-01-15', 'transactions', 'cursor')
+
+    amounts = [tx['amount'] for page in pages for tx in page]
+    assert amounts == [15, 13, 11, 9, 7, 5] # Newest first, end date inclusive
+    assert [len(page) for page in pages] == [3, 3]
+
+
+def test_last_full_page_has_no_cursor(app, client):
+    add_transactions(1, [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense', 'description': 'a', 'date': '2024-01-01'}])
+
+    page = client.get('/api/transactions?limit=1').get_json()
+
+    assert len(page['transactions']) == 1 and page['next_cursor'] is None
+
+
+def test_bad_page_arguments_are_rejected(client):
+    assert client.get('/api/transactions?limit=0').status_code == 400
+    assert client.get('/api/transactions?limit=ten').status_code == 400
+    assert client.get('/api/transactions?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/transactions?type=spending').status_code == 400
+    assert client.get('/api/chat-history?before=%%%').status_code == 400
+
+
+def test_cursor_round_trip_and_page_size_cap():
+    moment = datetime(2024, 5, 6, 7, 8, 9)
+
+    assert decode_cursor(encode_cursor(moment, 42)) == (moment, 42)
+    assert parse_page_size(None) == 50
+    assert parse_page_size(str(MAX_PAGE_SIZE * 10)) == MAX_PAGE_SIZE
@@ -0,0 +1,131 @@
+# tests/test_range_index.py
+import threading
+from datetime import date
+
+import pytest
+
+from app.services import financial_service, range_index_service
+from app.services.financial_service import add_transaction, add_transactions
+from app.services.range_index_service import PrefixSumSeries, get_range_index, _index_cache
+from app.services.summary_cache_service import get_ledger_version
+
+
+@pytest.fixture
+def app(app):
+    app.config['RANGE_INDEX_ENABLED'] = True # The index is opt-in
+    return app
+
+
+def _expense_total(user_id=1):
+    return get_range_index(user_id).sum_by_type_and_currency(None, date(2100, 1, 1), 'expense').get('expense', {}).get('USD', 0.0)
+
+
+def test_prefix_sums_answer_ranges():
+    series = PrefixSumSeries([10, 12, 15], [1.0, 2.0, 4.0])
+
+    assert series.range_sum(None, 16) == 7.0
+    assert series.range_sum(11, 15) == 2.0
+    assert series.range_sum(12, 13) == 2.0
+    assert series.range_sum(16, 20) == 0.0
+
+
+def test_prefix_sums_split_ranges_by_month():
+    series = PrefixSumSeries([d.toordinal() for d in (date(2024, 1, 5), date(2024, 1, 31), date(2024, 3, 1))], [1.0, 2.0, 4.0])
+
+    assert series.monthly_sums(date(2024, 1, 10).toordinal(), date(2024, 3, 2).toordinal()) == {date(2024, 1, 1): 2.0, date(2024, 3, 1): 4.0}
+    assert series.monthly_sums(None, date(2024, 1, 31).toordinal()) == {date(2024, 1, 1): 1.0}
+
+
+def test_prefix_sums_accept_out_of_order_days():
+    series = PrefixSumSeries()
+    for day, amount in [(20, 1.0), (10, 2.0), (20, 4.0), (15, 8.0), (30, 16.0)]:
+        series.add(day, amount)
+
+    assert series.days == [10, 15, 20, 30]
+    assert series.range_sum(None, 31) == 31.0
+    assert series.range_sum(15, 21) == 13.0
+
+
+def test_writes_patch_the_resident_index(app):
+    add_transaction(1, 10, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+    index = get_range_index(1)
+
+    add_transactions(1, [{'amount': 5, 'currency': 'USD', 'category': 'Food', 'type': 'expense', 'description': 'y', 'date': '2023-12-01'},
+                         {'amount': 2, 'currency': 'EUR', 'category': 'Food', 'type': 'expense', 'description': 'z', 'date': '2024-02-01'}])
+
+    assert get_range_index(1) is index # Patched in place, not rebuilt
+    assert index.version == get_ledger_version(1)
+    assert index.sum_by_type_and_currency(date(2023, 12, 1), date(2024, 2, 2)) == {'expense': {'USD': 15.0, 'EUR': 2.0}}
+
+
+def test_index_from_rollups_matches_index_from_ledger(app):
+    for amount, day in [(1, '2024-01-01'), (2, '2024-01-31'), (4, '2024-03-15')]:
+        add_transaction(1, amount, 'usd', 'Food', 'expense', 'x', day)
+    from_rollups = _expense_total()
+
+    _index_cache.clear()
+    app.config['ROLLUPS_ENABLED'] = False
+
+    assert _expense_total() == from_rollups == 7.0
+
+
+def test_write_committed_during_a_rebuild_is_not_counted_twice(app, monkeypatch):
+    add_transaction(1, 100, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+    _index_cache.clear()
+
+    # The writer commits while the reader is building the index, and patches the index only afterwards
+    committed, release = threading.Event(), threading.Event()
+    real_record = financial_service.record_in_range_index
+
+    def delayed_record(*args):
+        committed.set()
+        release.wait(5)
+        real_record(*args)
+
+    def writer():
+        with app.app_context():
+            add_transaction(1, 1, 'USD', 'Food', 'expense', 'y', '2024-01-06')
+
+    real_build = range_index_service._build_index
+    writer_thread = threading.Thread(target=writer)
+
+    def build_during_write(user_id, version):
+        if not writer_thread.is_alive() and not committed.is_set():
+            writer_thread.start()
+            committed.wait(5)
+        return real_build(user_id, version)
+
+    monkeypatch.setattr(financial_service, 'record_in_range_index', delayed_record)
+    monkeypatch.setattr(range_index_service, '_build_index', build_during_write)
+
+    assert _expense_total() == 101.0 # The rebuild already sees the new row
+    release.set()
+    writer_thread.join(5)
+
+    assert _expense_total() == 101.0
+
+
+def test_concurrent_writers_and_readers_agree_with_the_ledger(app):
+    errors = []
+
+    def write(amount):
+        with app.app_context():
+            for _ in range(10):
+                result = add_transaction(1, amount, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+                if 'successfully' not in result:
+                    errors.append(result)
+
+    def read():
+        with app.app_context():
+            for _ in range(20):
+                _expense_total()
+
+    threads = [threading.Thread(target=write, args=(amount,)) for amount in (1, 2, 4)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+
+    assert errors == []
+    assert _expense_total() == pytest.approx(70.0)
@@ -0,0 +1,78 @@
+# tests/test_rate_history.py
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ExchangeRate
+from app.services.exchange_service import get_exchange_rate, get_exchange_rate_on
+from app.services.rate_history_service import record_rates, get_stored_rate, get_stored_rates, get_stored_rate_table
+
+TABLE = {'EUR': 0.5, 'GBP': 0.25, 'ETB': 100.0}
+
+
+def test_fetched_table_is_recorded_and_reused_offline(app, rates_api):
+    assert get_exchange_rate('EUR', 'USD') == pytest.approx(2.0)
+    assert db.session.query(ExchangeRate).filter_by(base='USD', date=date.today()).count() == 3
+
+    # A new process (empty in-memory cache) with the API down still converts from the stored table
+    from app.services.exchange_service import clear_rate_cache
+    clear_rate_cache()
+    rates_api.fail = True
+    assert get_exchange_rate('GBP', 'USD') == pytest.approx(4.0)
+
+
+def test_historical_rate_comes_from_that_days_snapshot(app, rates_api):
+    record_rates('USD', {'EUR': 0.8}, on_date=date(2024, 1, 5))
+    record_rates('USD', {'EUR': 0.9}, on_date=date(2024, 3, 1))
+
+    assert get_exchange_rate_on('EUR', 'USD', '2024-02-10') == pytest.approx(1 / 0.8)
+    assert get_exchange_rate_on('USD', 'EUR', '2024-03-01') == pytest.approx(0.9)
+    assert rates_api.calls == []
+
+
+def test_batch_lookup_matches_single_lookups(app, rates_api):
+    record_rates('USD', {'EUR': 0.8}, on_date=date(2024, 1, 5))
+    record_rates('USD', {'EUR': 0.9}, on_date=date(2024, 3, 1))
+    days = [date(2024, 1, 1), date(2024, 1, 31), date(2024, 3, 15)]
+
+    rates = get_stored_rates('EUR', 'USD', days)
+
+    assert rates == {day: get_stored_rate('EUR', 'USD', day) for day in days}
+    assert rates[date(2024, 1, 1)] is None
+    assert rates[date(2024, 3, 15)] == pytest.approx(1 / 0.9)
+
+
+def test_later_snapshot_is_not_substituted_for_an_earlier_date(app, rates_api):
+    record_rates('USD', {'EUR': 0.9}, on_date=date(2024, 3, 1))
+    db.session.query(ExchangeRate).update({'fetched_at': datetime(2024, 3, 1)}) # Fetched back then
+    db.session.commit()
+
+    assert get_stored_rate('EUR', 'USD', date(2024, 1, 5)) is None
+    # The dated lookup falls back to the current rate (from the API) instead
+    assert get_exchange_rate_on('EUR', 'USD', '2024-01-05') == pytest.approx(2.0)
+
+
+def test_cross_rate_via_base_currency(app, rates_api):
+    record_rates('USD', TABLE, on_date=date(2024, 1, 5))
+
+    assert get_stored_rate('EUR', 'GBP', date(2024, 1, 5)) == pytest.approx(0.5)
+
+
+def test_partial_snapshot_is_not_returned_as_a_table(app, rates_api):
+    yesterday = date.today() - timedelta(days=1)
+    record_rates('USD', TABLE, on_date=yesterday)
+    record_rates('USD', {'EUR': 0.6}) # A single pair lookup today
+
+    table = get_stored_rate_table('USD')
+
+    assert table == {'USD': 1.0, **TABLE} # Yesterday's complete table, not today's one pair
+
+
+def test_stale_table_is_ignored_with_max_age(app, rates_api):
+    record_rates('USD', TABLE)
+    db.session.query(ExchangeRate).filter_by(quote='GBP').update({'fetched_at': datetime.utcnow() - timedelta(hours=2)})
+    db.session.commit()
+
+    assert get_stored_rate_table('USD', max_age_seconds=3600) is None
+    assert get_stored_rate_table('USD')['GBP'] == pytest.approx(0.25)
@@ -0,0 +1,44 @@
+# tests/test_rate_table.py
+import pytest
+
+from app.services.exchange_service import get_exchange_rate, get_exchange_rates, get_rate_table
+
+
+def test_every_pair_is_derived_from_one_table_request(app, rates_api):
+    assert get_exchange_rate('EUR', 'USD') == pytest.approx(2.0)
+    assert get_exchange_rate('USD', 'ETB') == pytest.approx(100.0)
+    assert get_exchange_rate('GBP', 'EUR') == pytest.approx(2.0)
+    assert get_exchange_rate('ETB', 'GBP') == pytest.approx(0.0025)
+
+    assert rates_api.calls == ['https://v6.exchangerate-api.com/v6/test-key/latest/USD']
+
+
+def test_get_exchange_rates_converts_several_currencies_at_once(app, rates_api):
+    rates = get_exchange_rates(['eur', 'GBP', 'ETB'], 'usd')
+
+    assert rates == {'EUR': pytest.approx(2.0), 'GBP': pytest.approx(4.0), 'ETB': pytest.approx(0.01)}
+    assert len(rates_api.calls) == 1
+
+
+def test_unknown_currency_is_reported(app, rates_api):
+    result = get_exchange_rate('XYZ', 'USD')
+
+    assert isinstance(result, str)
+    assert 'XYZ' in result
+
+
+def test_configured_base_currency_is_used(app, rates_api):
+    app.config['EXCHANGE_RATE_BASE_CURRENCY'] = 'EUR'
+
+    table = get_rate_table()
+
+    assert table['EUR'] == pytest.approx(1.0)
+    assert table['USD'] == pytest.approx(2.0)
+    assert rates_api.calls[-1].endswith('/latest/EUR')
+
+
+def test_table_fetch_failure_is_returned_as_message(app, rates_api):
+    rates_api.fail = True
+
+    assert isinstance(get_exchange_rate('EUR', 'USD'), str)
+    assert isinstance(get_exchange_rates(['EUR'], 'USD'), str)
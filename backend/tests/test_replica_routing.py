@@ -0,0 +1,132 @@
+# tests/test_replica_routing.py
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.database import _last_write_at, get_db_routing_stats, read_only
+from app.models import Transaction
+from app.services.chat_history_service import record_chat, flush_chat_history, get_chat_history_page
+from app.services.financial_service import add_transactions
+
+
+@pytest.fixture
+def replica_app(app_env, tmp_path, request):
+    app_env.setenv('DATABASE_REPLICA_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    app = request.getfixturevalue('app')
+    db.metadata.create_all(db.engines['replica'])
+    _last_write_at.set(float('-inf')) # Forget the fixture's own seeding commit
+    yield app
+    db.metadatas.pop('replica', None) # init_app() registered the bind on the shared db; later apps have no replica
+
+
+def _routed_read():
+    """Runs one read-only query and returns which bind served it."""
+    before = get_db_routing_stats()
+    get_chat_history_page(1, 10)
+    after = get_db_routing_stats()
+    return 'replica' if after['replica_reads'] > before['replica_reads'] else 'primary'
+
+
+def test_reads_go_to_the_replica_without_recent_writes(replica_app):
+    assert _routed_read() == 'replica'
+
+
+def test_queued_chat_write_keeps_reads_on_the_primary(replica_app):
+    record_chat(1, 'hi', 'hello') # Core insert on the writer thread, outside db.session
+    assert flush_chat_history()
+
+    assert _last_write_at.get() > float('-inf')
+    assert _routed_read() == 'primary'
+    assert get_chat_history_page(1, 10)['history'][0]['message'] == 'hi'
+
+
+def test_session_execute_insert_counts_as_a_write(replica_app):
+    add_transactions(1, [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense', 'description': 'a', 'date': '2024-01-05'}])
+
+    assert _last_write_at.get() > float('-inf')
+    assert _routed_read() == 'primary'
+
+
+def test_uncommitted_session_insert_stays_on_the_primary(replica_app):
+    db.session.execute(Transaction.__table__.insert(), [{'user_id': 1, 'amount': 1, 'currency': 'USD', 'category': 'x',
+                                                         'type': 'expense', 'description': 'a'}])
+
+    with read_only():
+        assert db.session.query(Transaction).count() == 1 # Only the primary has the pending row
+    db.session.rollback()
+    assert _last_write_at.get() == float('-inf')
+
+
+def test_raw_sql_write_counts_and_rollback_does_not(replica_app):
+    with db.engine.connect() as conn:
+        conn.execute(text("UPDATE user SET username = 'x' WHERE id = 1"))
+        conn.rollback()
+    assert _last_write_at.get() == float('-inf')
+
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE user SET username = 'demo' WHERE id = 1"))
+    assert _last_write_at.get() > float('-inf')
+
+
+def test_a_write_only_pins_the_client_that_made_it(replica_app):
+    writer, other = replica_app.test_client(), replica_app.test_client()
+    reads = lambda: get_db_routing_stats()['replica_reads']
+
+    response = writer.post('/api/transactions/import?format=ndjson', data='{"date": "2024-01-05", "type": "expense", '
+                           '"amount": 1, "currency": "USD", "category": "x", "description": "a"}')
+    assert response.status_code == 200
+
+    before = reads()
+    assert len(writer.get('/api/transactions').get_json()['transactions']) == 1 # Own write, from the primary
+    assert reads() == before
+    assert other.get('/api/transactions').get_json()['transactions'] == [] # The replica has not caught up
+    assert reads() > before
+
+
+def test_writes_on_another_thread_do_not_pin_this_one(replica_app):
+    def write():
+        with replica_app.app_context():
+            add_transactions(1, [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense', 'description': 'a', 'date': '2024-01-05'}])
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join(10)
+
+    assert _routed_read() == 'replica'
+
+
+def test_failing_replica_is_taken_out_of_rotation(replica_app):
+    with db.engines['replica'].begin() as conn:
+        conn.execute(text("DROP TABLE chat_history"))
+
+    with pytest.raises(Exception):
+        get_chat_history_page(1, 10)
+    db.session.rollback()
+
+    assert get_db_routing_stats()['replica_available'] is False
+    assert _routed_read() == 'primary'
+
+
+def test_concurrent_writes_and_reads_see_their_own_writes(replica_app):
+    # The replica never receives rows, so any read that reached it would miss the writer's own entries
+    errors = []
+
+    def chat(worker):
+        with replica_app.app_context():
+            for turn in range(5):
+                add_transactions(1, [{'amount': 1, 'currency': 'USD', 'category': 'x', 'type': 'expense',
+                                      'description': f"{worker}-{turn}", 'date': '2024-01-05'}])
+                with read_only():
+                    if not db.session.query(Transaction).filter_by(description=f"{worker}-{turn}").count():
+                        errors.append((worker, turn))
+                db.session.remove()
+
+    threads = [threading.Thread(target=chat, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
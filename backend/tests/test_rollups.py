@@ -0,0 +1,95 @@
+# tests/test_rollups.py
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.migrations import run_migrations
+from app.models import Transaction, TransactionRollup, LedgerVersion, SchemaMigration, User
+from app.services.financial_service import add_transaction, get_financial_overview
+from app.services.rollup_service import sum_rollups, rebuild_rollups
+from app.services.range_index_service import get_range_index_stats
+from app.services.summary_cache_service import get_ledger_version
+
+
+def _rollup(period, period_start, tx_type='expense', currency='USD'):
+    return TransactionRollup.query.filter_by(user_id=1, period=period, period_start=period_start, type=tx_type, currency=currency).one()
+
+
+def _add_directly(user_id, amount, day, currency='USD', tx_type='expense'):
+    # Bypasses the financial service, like rows written before rollups existed
+    db.session.add(Transaction(user_id=user_id, amount=amount, currency=currency, category='Misc', type=tx_type,
+                               description='legacy', date=datetime.strptime(day, "%Y-%m-%d")))
+    db.session.commit()
+
+
+def test_writes_update_daily_and_monthly_rollups(app):
+    add_transaction(1, 10, 'usd', 'Food', 'expense', 'lunch', '2024-01-05')
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'coffee', '2024-01-05')
+    add_transaction(1, 20, 'USD', 'Food', 'expense', 'dinner', '2024-01-20')
+
+    day = _rollup('day', date(2024, 1, 5))
+    month = _rollup('month', date(2024, 1, 1))
+    assert (day.total, day.tx_count) == (15.0, 2)
+    assert (month.total, month.tx_count) == (35.0, 3)
+
+
+def test_rollup_sums_match_the_ledger_across_month_edges(app):
+    for day, amount in [('2023-12-31', 1), ('2024-01-01', 2), ('2024-01-15', 4), ('2024-02-29', 8), ('2024-03-01', 16)]:
+        add_transaction(1, amount, 'USD', 'Food', 'expense', 'x', day)
+
+    def total(start, end):
+        return sum_rollups(1, start, end).get('expense', {}).get('USD', 0.0)
+
+    assert total(date(2024, 1, 1), date(2024, 3, 1)) == 14.0 # Whole January and February
+    assert total(date(2024, 1, 15), date(2024, 3, 2)) == 28.0 # Partial month on both edges
+    assert total(None, date(2024, 1, 2)) == 3.0
+    assert total(date(2024, 1, 2), date(2024, 1, 15)) == 0.0
+
+
+def test_migration_backfills_rollups_for_every_user(app):
+    db.session.add(User(id=2, username='second', email='second@example.com'))
+    db.session.commit()
+    add_transaction(1, 10, 'USD', 'Food', 'expense', 'tracked', '2024-01-05')
+    # Older rows the rollups never saw: user 1 already has some rollups, user 2 none at all
+    _add_directly(1, 7, '2023-06-01')
+    _add_directly(2, 3, '2023-06-02')
+
+    SchemaMigration.query.filter_by(version=2).delete()
+    db.session.commit()
+    assert run_migrations() == [2]
+
+    assert _rollup('month', date(2023, 6, 1)).total == 7.0
+    assert sum_rollups(2, None, date(2024, 1, 1)) == {'expense': {'USD': 3.0}}
+    assert _rollup('day', date(2024, 1, 5)).total == 10.0 # Existing rollups are not doubled
+
+
+def test_totals_come_from_rollups_by_default(app):
+    add_transaction(1, 10, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+    _rollup('month', date(2024, 1, 1)).total = 12.0 # Only the rollups know this amount
+    db.session.commit()
+
+    assert get_financial_overview(1, '2024-01-01', '2024-01-31')['expense'] == pytest.approx(12.0)
+    assert get_range_index_stats()['size'] == 0 # The range index is opt-in
+
+
+def test_rebuild_for_all_users_invalidates_unversioned_summaries(app):
+    _add_directly(1, 7, '2024-01-05')
+    assert db.session.get(LedgerVersion, 1) is None
+    assert get_financial_overview(1, '2024-01-01', '2024-01-31')['expense'] == 0.0 # Cached at version 0
+
+    rebuild_rollups()
+
+    assert get_ledger_version(1) == 1
+    assert get_financial_overview(1, '2024-01-01', '2024-01-31')['expense'] == pytest.approx(7.0)
+
+
+def test_rebuild_for_one_user_replaces_its_rows(app):
+    add_transaction(1, 10, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+    _rollup('day', date(2024, 1, 5)).total = 999.0 # Drifted
+    db.session.commit()
+    version = get_ledger_version(1)
+
+    assert rebuild_rollups(1) == 2
+    assert _rollup('day', date(2024, 1, 5)).total == 10.0
+    assert get_ledger_version(1) == version + 1
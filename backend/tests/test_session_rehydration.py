@@ -0,0 +1,76 @@
+# tests/test_session_rehydration.py
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ChatHistory, ChatHistoryArchive
+from app.services.ai_service import handle_ai_query
+from app.services.chat_archive_service import archive_chat_history, get_archived_chat_history
+from app.services.chat_history_service import flush_chat_history
+from app.services.chat_session_service import _session_store, build_session_history, estimate_tokens
+
+TOOL_PARTS = [
+    {'role': 'model', 'parts': [{'function_call': {'name': 'get_exchange_rate', 'args': {'from_currency': 'USD', 'to_currency': 'EUR'}}}]},
+    {'role': 'user', 'parts': [{'function_response': {'name': 'get_exchange_rate', 'response': {'result': 0.5}}}]},
+]
+
+
+def _turn(message, response, tool_parts=None, minutes=0):
+    return ChatHistory(user_id=1, message=message, response=response, tool_parts=json.dumps(tool_parts) if tool_parts else None,
+                       timestamp=datetime(2024, 1, 1) + timedelta(minutes=minutes))
+
+
+def test_tool_turn_is_stored_and_replayed_by_a_fresh_session(gemini):
+    gemini.reply([('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR'})], ['1 USD is 0.5 EUR.'])
+    assert handle_ai_query(1, 'usd to eur?') == '1 USD is 0.5 EUR.'
+    flush_chat_history()
+    stored = json.loads(ChatHistory.query.one().tool_parts)
+    assert [content['role'] for content in stored] == ['model', 'user']
+
+    _session_store.reset(1) # As if the next message reached another worker
+    gemini.reply(['Still 0.5.'])
+    handle_ai_query(1, 'and now?')
+
+    contents = gemini.requests[-1].contents
+    assert [content.parts[0].function_call.name for content in contents if content.parts[0].function_call] == ['get_exchange_rate']
+    assert contents[2].parts[0].function_response.response['result'] == 0.5
+
+
+def test_history_keeps_the_newest_whole_turns_within_the_budget():
+    turns = [_turn(f"question {n}", 'answer ' * 50, TOOL_PARTS, minutes=n) for n in range(5)]
+    one_turn = estimate_tokens(build_session_history(turns[:1], 10 ** 6))
+
+    history = build_session_history(list(reversed(turns)), one_turn * 2)
+
+    assert len(history) == 8 # Two turns of user, tool call, tool response, answer
+    assert history[0].parts[0].text == 'question 3'
+    assert history[1].parts[0].function_call.name == 'get_exchange_rate'
+
+
+def test_unreadable_tool_parts_are_skipped():
+    turn = _turn('q', 'a')
+    turn.tool_parts = '{broken'
+
+    assert [content.parts[0].text for content in build_session_history([turn], 10 ** 6)] == ['q', 'a']
+
+
+def test_archive_keeps_tool_parts(app):
+    db.session.add_all([_turn('with tools', 'a', TOOL_PARTS), _turn('plain', 'b', minutes=1)])
+    db.session.commit()
+
+    archive_chat_history(older_than_days=1)
+
+    history = get_archived_chat_history(1, '2024-01-01', '2024-01-01')['history']
+    assert history[0]['tool_parts'] == TOOL_PARTS
+    assert history[1]['tool_parts'] is None
+
+
+def test_archives_written_before_tool_parts_still_load(app):
+    payload = json.dumps([{'id': 1, 'message': 'q', 'response': 'a', 'timestamp': '2024-01-01T10:00:00'}]).encode()
+    db.session.add(ChatHistoryArchive(user_id=1, day=datetime(2024, 1, 1).date(), entry_count=1, raw_bytes=len(payload),
+                                      first_timestamp=datetime(2024, 1, 1, 10), last_timestamp=datetime(2024, 1, 1, 10),
+                                      payload=zlib.compress(payload)))
+    db.session.commit()
+
+    assert get_archived_chat_history(1, '2024-01-01', '2024-01-01')['history'][0]['tool_parts'] is None
@@ -0,0 +1,62 @@
+# tests/test_statement_ingestion.py
+import json
+
+from app.models import Transaction
+from app.services.ai_service import ingest_statement
+from app.services.exchange_service import validate_currency_code
+from app.services.rate_history_service import record_rates
+
+ROWS = [
+    {'date': '2024-01-05', 'amount': 12.5, 'currency': 'ETB', 'type': 'expense', 'category': 'Food', 'description': 'Cafe'},
+    {'date': '2024-01-06', 'time': '09:00', 'amount': 900, 'currency': 'USD', 'type': 'income', 'category': 'Salary', 'description': 'Pay'},
+    {'date': 'yesterday', 'amount': 3, 'currency': 'USD', 'type': 'expense', 'category': 'Food', 'description': 'Bad date'},
+]
+
+
+def test_statement_is_parsed_with_one_call_and_imported(gemini):
+    gemini.reply([json.dumps(ROWS)])
+
+    summary = ingest_statement(1, "05/01 Cafe 12.50\n06/01 Salary 900", 'etb')
+
+    assert summary.startswith("Imported 2 of 3 transactions")
+    assert "#3:" in summary
+    assert len(gemini.requests) == 1
+    assert "Default currency: ETB." in gemini.requests[0].contents[-1].parts[0].text
+    assert Transaction.query.count() == 2
+
+
+def test_unsupported_currency_codes_are_rejected(app):
+    for currency in ('XYZ', 'DOLLARS', '12A', ''):
+        assert validate_currency_code(currency) is not None
+    assert validate_currency_code('eur') is None
+
+
+def test_pair_mode_validates_without_fetching_the_rate_table(app, rates_api):
+    app.config['EXCHANGE_RATE_MODE'] = 'pair'
+
+    assert validate_currency_code('CHF') is None # No stored snapshot: format only
+    record_rates('USD', {'EUR': 0.5, 'GBP': 0.25})
+    assert validate_currency_code('EUR') is None
+    assert "not supported" in validate_currency_code('XYZ')
+    assert rates_api.calls == []
+
+
+def test_format_is_still_checked_when_the_rate_table_is_unavailable(app, rates_api):
+    rates_api.fail = True
+
+    assert validate_currency_code('CHF') is None
+    assert validate_currency_code('CH1') is not None
+
+
+def test_chat_endpoint_rejects_a_bad_default_currency(gemini, client):
+    response = client.post('/api/chat', json={'message': 'Cafe 12.50', 'mode': 'ingest', 'default_currency': 'ZZZ'})
+
+    assert response.status_code == 400
+    assert "not supported" in response.get_json()['error']
+    assert gemini.requests == []
+
+
+def test_unreadable_model_output(gemini):
+    gemini.reply(['not json'])
+
+    assert ingest_statement(1, "garbage", 'USD').startswith("I couldn't read any transactions")
@@ -0,0 +1,69 @@
+# tests/test_summary_cache.py
+import threading
+
+from app import db
+from app.services.financial_service import add_transaction, get_financial_overview
+from app.services.summary_cache_service import bump_ledger_version, cached_summary, get_ledger_version
+
+
+def test_summary_is_reused_until_the_ledger_changes(app):
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return {'total': len(computed)}
+
+    assert cached_summary(1, ('k',), compute) == {'total': 1}
+    assert cached_summary(1, ('k',), compute) == {'total': 1}
+
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+
+    assert cached_summary(1, ('k',), compute) == {'total': 2}
+    assert len(computed) == 2
+
+
+def test_error_messages_are_not_cached(app):
+    results = iter(["Could not convert", {'total': 1}])
+
+    assert cached_summary(1, ('k',), lambda: next(results)) == "Could not convert"
+    assert cached_summary(1, ('k',), lambda: next(results)) == {'total': 1}
+
+
+def test_new_transaction_shows_up_in_a_cached_overview(app):
+    add_transaction(1, 5, 'USD', 'Food', 'expense', 'x', '2024-01-05')
+    assert get_financial_overview(1, '2024-01-01', '2024-01-31')['expense'] == 5.0
+
+    add_transaction(1, 7, 'USD', 'Food', 'expense', 'y', '2024-01-06')
+
+    assert get_financial_overview(1, '2024-01-01', '2024-01-31')['expense'] == 12.0
+
+
+def test_first_bump_creates_the_version_row(app):
+    assert get_ledger_version(1) == 0
+    bump_ledger_version(1)
+    bump_ledger_version(1)
+    db.session.commit()
+
+    assert get_ledger_version(1) == 2
+
+
+def test_concurrent_bumps_are_not_lost(app):
+    errors = []
+
+    def bump():
+        with app.app_context():
+            try:
+                for _ in range(5):
+                    bump_ledger_version(1)
+                    db.session.commit()
+            except Exception as e: # An IntegrityError here would mean a racing insert
+                errors.append(e)
+
+    threads = [threading.Thread(target=bump) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    assert get_ledger_version(1) == 30
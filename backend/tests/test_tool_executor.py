@@ -0,0 +1,107 @@
+# tests/test_tool_executor.py
+import threading
+import time
+
+import pytest
+from flask import current_app
+
+from app.services.ai_service import handle_ai_query
+from app.services.deadline_service import remaining_time
+from app.services.tool_executor_service import ToolExecutor
+
+
+@pytest.fixture
+def executor(app):
+    executor = ToolExecutor(max_workers=4)
+    executor.configure(app)
+    return executor
+
+
+def _results(executor, calls, deadline=None):
+    return dict(executor.run(calls, deadline))
+
+
+def test_parallel_safe_calls_overlap(executor):
+    all_started = threading.Barrier(3, timeout=5)
+
+    def read(value):
+        all_started.wait() # Only passes if the three calls run at the same time
+        return value, current_app.name
+
+    results = _results(executor, [(lambda n=n: read(n), True) for n in range(3)])
+
+    assert results == {0: (0, 'app'), 1: (1, 'app'), 2: (2, 'app')}
+    assert executor.stats()['parallel_batches'] == 1
+
+
+def test_unsafe_call_is_a_barrier_on_the_request_thread(executor):
+    log, lock = [], threading.Lock()
+
+    def call(name, seconds=0.02):
+        with lock:
+            log.append(('start', name, threading.current_thread() is threading.main_thread()))
+        time.sleep(seconds)
+        with lock:
+            log.append(('end', name))
+        return name
+
+    calls = [(lambda: call('read1'), True), (lambda: call('read2'), True), (lambda: call('write'), False),
+             (lambda: call('read3'), True), (lambda: call('read4'), True)]
+    order = [index for index, _ in executor.run(calls)]
+
+    assert set(order[:2]) == {0, 1} and order[2] == 2 and set(order[3:]) == {3, 4}
+    write_start = log.index(('start', 'write', True))
+    assert {entry[1] for entry in log[:write_start] if entry[0] == 'end'} == {'read1', 'read2'}
+    assert log[write_start + 1] == ('end', 'write') # Nothing else ran while the write did
+
+
+def test_one_worker_runs_everything_in_turn(app):
+    executor = ToolExecutor(max_workers=1)
+    executor.configure(app)
+    threads = []
+
+    _results(executor, [(lambda: threads.append(threading.current_thread()), True) for _ in range(3)])
+
+    assert threads == [threading.main_thread()] * 3
+    assert executor.stats()['parallel_calls'] == 0
+
+
+def test_calls_see_the_request_deadline(executor):
+    deadline = time.monotonic() + 10
+
+    results = _results(executor, [(remaining_time, True), (remaining_time, True), (remaining_time, False)], deadline)
+
+    assert all(0 < left <= 10 for left in results.values())
+
+
+def test_overrunning_calls_time_out(executor):
+    release = threading.Event()
+    deadline = time.monotonic() + 0.1
+
+    started = time.monotonic()
+    results = _results(executor, [(lambda: 'fast', True), (lambda: release.wait(5), True), (lambda: 'never run', False)], deadline)
+    release.set()
+
+    assert time.monotonic() - started < 2
+    assert results[0] == 'fast'
+    assert isinstance(results[1], TimeoutError) and isinstance(results[2], TimeoutError)
+    assert executor.stats()['timeouts'] == 2
+
+
+def test_expired_budget_skips_every_call(executor):
+    ran = []
+
+    results = _results(executor, [(lambda: ran.append(1), True), (lambda: ran.append(2), True)], time.monotonic() - 1)
+
+    assert ran == [] and all(isinstance(result, TimeoutError) for result in results.values())
+
+
+def test_turn_sends_parallel_results_back_in_the_order_asked(gemini):
+    gemini.reply([('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR'}),
+                  ('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'GBP'}),
+                  ('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'ETB'})], ['Done.'])
+
+    assert handle_ai_query(1, 'rates please') == 'Done.'
+
+    responses = gemini.requests[-1].contents[-1].parts
+    assert [part.function_response.response['result'] for part in responses] == [0.5, 0.25, 100.0]
@@ -0,0 +1,74 @@
+# tests/test_transaction_import.py
+import json
+
+from app.models import Transaction
+from app.services.financial_service import add_transaction, get_financial_overview
+
+CSV_BODY = (
+    "Date,Time,Type,Amount,Currency,Category,Description\n"
+    "2024-01-05,09:30,Expense,12.5,USD,Food,Lunch\n"
+    "2024-01-06,,income,100,eur,Salary,Pay\n"
+    "2024-13-01,10:00,Expense,5,USD,Food,Bad date\n"
+    "2024-01-07,10:00,Expense,abc,USD,Food,Bad amount\n"
+)
+
+
+def test_csv_import_inserts_valid_rows_and_reports_the_rest(client):
+    response = client.post('/api/transactions/import', data=CSV_BODY, content_type='text/csv')
+
+    report = response.get_json()
+    assert response.status_code == 200
+    assert (report['inserted'], report['rejected']) == (2, 2)
+    assert [error['line'] for error in report['errors']] == [4, 5]
+    lunch = Transaction.query.filter_by(description='Lunch').one()
+    assert (lunch.amount, lunch.type, lunch.date.strftime('%Y-%m-%d %H:%M')) == (12.5, 'expense', '2024-01-05 09:30')
+
+
+def test_ndjson_import_with_malformed_lines(client):
+    lines = [
+        json.dumps({'amount': 3, 'currency': 'USD', 'category': 'Food', 'type': 'expense', 'description': 'a', 'date': '2024-01-05'}),
+        '{not json',
+        '[1, 2]',
+        '',
+        json.dumps({'Amount': 4, 'Currency': 'GBP', 'Type': 'expense', 'Date': '2024-01-06'}),
+    ]
+
+    response = client.post('/api/transactions/import?format=ndjson', data="\n".join(lines))
+
+    report = response.get_json()
+    assert (report['inserted'], report['rejected']) == (2, 2)
+    assert [error['line'] for error in report['errors']] == [2, 3]
+
+
+def test_rows_are_committed_in_chunks(app, client):
+    app.config['IMPORT_CHUNK_SIZE'] = 2
+    rows = "\n".join(f"2024-01-{day:02d},,expense,1,USD,Food,row {day}" for day in range(1, 8))
+
+    report = client.post('/api/transactions/import?format=csv', data="date,time,type,amount,currency,category,description\n" + rows).get_json()
+
+    assert report['inserted'] == 7
+    overview = get_financial_overview(1, '2024-01-01', '2024-01-31')
+    assert overview['expense'] == 7.0 # Rollups, range index and summary cache all saw every chunk
+
+
+def test_exported_csv_can_be_reimported(app, client):
+    add_transaction(1, 20, 'EUR', 'Travel', 'expense', 'Train, return', '2024-02-01', '08:15')
+    exported = client.get('/api/reports/csv').get_data()
+
+    report = client.post('/api/transactions/import', data=exported, content_type='text/csv').get_json()
+
+    assert report['inserted'] == 1
+    assert Transaction.query.filter_by(description='Train, return').count() == 2
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.post('/api/transactions/import', data='x', content_type='application/xml')
+
+    assert response.status_code == 415
+
+
+def test_only_invalid_rows_is_a_bad_request(client):
+    response = client.post('/api/transactions/import', data="type,amount\nexpense,1\n", content_type='text/csv')
+
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == 1
@@ -0,0 +1,109 @@
+# tests/test_turn_deadlines.py
+import time
+
+import google.api_core.exceptions
+import pytest
+
+from app.services import ai_service
+from app.services.ai_service import handle_ai_query, MIN_MODEL_SECONDS
+
+RATE_CALL = ('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'EUR'})
+
+
+def _assert_calls_answered(contents):
+    """Every model message with function calls is followed by a user message answering each of them."""
+    for position, content in enumerate(contents):
+        calls = [part.function_call.name for part in content.parts if part.function_call]
+        if calls:
+            answered = [part.function_response.name for part in contents[position + 1].parts if part.function_response]
+            assert answered == calls
+
+
+def _history_sent_next(gemini):
+    gemini.reply(['Next answer'])
+    handle_ai_query(1, 'next question')
+    contents = gemini.requests[-1].contents
+    _assert_calls_answered(contents)
+    return contents
+
+
+@pytest.fixture
+def slow_rates(monkeypatch):
+    def slow_rate(user_id, **args):
+        time.sleep(1.0)
+        return 0.5
+    monkeypatch.setitem(ai_service.TOOL_FUNCTIONS, 'get_exchange_rate', slow_rate)
+
+
+def test_model_timeouts_never_exceed_the_budget(gemini, app):
+    app.config['AI_TURN_BUDGET_SECONDS'] = 3
+    gemini.reply([RATE_CALL], ['Done.'])
+
+    handle_ai_query(1, 'rate?')
+
+    timeouts = [options['timeout'] for options in gemini.request_options]
+    assert len(timeouts) == 2 and all(MIN_MODEL_SECONDS <= timeout <= 3 for timeout in timeouts)
+    assert timeouts[1] < timeouts[0]
+
+
+def test_no_model_request_without_enough_budget_left(gemini, app, slow_rates):
+    app.config['AI_TURN_BUDGET_SECONDS'] = MIN_MODEL_SECONDS + 0.5
+    gemini.reply([RATE_CALL])
+
+    answer = handle_ai_query(1, 'rate?')
+
+    assert answer.startswith("I ran out of time") and 'get_exchange_rate' in answer
+    assert len(gemini.requests) == 1 # The tool results were not sent with a too-short timeout
+    contents = _history_sent_next(gemini)
+    assert contents[-2].parts[0].text == answer # The partial answer closes the turn
+
+
+def test_model_deadline_after_tools_keeps_a_valid_history(gemini):
+    gemini.reply([RATE_CALL], google.api_core.exceptions.DeadlineExceeded('too slow'))
+
+    assert handle_ai_query(1, 'rate?').startswith("I ran out of time")
+
+    contents = _history_sent_next(gemini)
+    assert contents[2].parts[0].function_response.response['result'] == 0.5
+
+
+def test_other_model_errors_after_tools_keep_a_valid_history(gemini):
+    gemini.reply([RATE_CALL], google.api_core.exceptions.InternalServerError('boom'))
+
+    assert handle_ai_query(1, 'rate?').startswith("An API error occurred")
+
+    _history_sent_next(gemini)
+
+
+def test_failed_wrap_up_request_keeps_a_valid_history(gemini, app):
+    app.config['AI_MAX_TOOL_ROUNDS'] = 1
+    gemini.reply([RATE_CALL], [RATE_CALL], google.api_core.exceptions.ServiceUnavailable('down'))
+
+    answer = handle_ai_query(1, 'rate?')
+
+    assert answer.startswith("I ran out of time")
+    contents = _history_sent_next(gemini)
+    responses = [part.function_response.response for content in contents for part in content.parts if part.function_response]
+    assert responses[0]['result'] == 0.5
+    assert responses[1]['error'] == 'Not executed: limit of 1 tool rounds reached.'
+
+
+def test_wrap_up_answers_without_tools(gemini, app):
+    app.config['AI_MAX_TOOL_ROUNDS'] = 0
+    gemini.reply([RATE_CALL], ['Rates are unavailable right now.'])
+
+    assert handle_ai_query(1, 'rate?') == 'Rates are unavailable right now.'
+    assert gemini.requests[1].tool_config.function_calling_config.mode == 3 # NONE
+    _history_sent_next(gemini)
+
+
+def test_slow_parallel_tools_are_cut_off_at_the_deadline(gemini, app, slow_rates):
+    app.config['AI_TURN_BUDGET_SECONDS'] = MIN_MODEL_SECONDS + 0.5
+    gemini.reply([RATE_CALL, ('get_exchange_rate', {'from_currency': 'USD', 'to_currency': 'GBP'})])
+
+    started = time.monotonic()
+    answer = handle_ai_query(1, 'rates?')
+
+    assert time.monotonic() - started < MIN_MODEL_SECONDS + 1.5
+    assert answer.startswith("I ran out of time")
+    _history_sent_next(gemini)